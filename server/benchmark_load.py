@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Measure review throughput and tail latency against an OpenAI-compatible endpoint
+
+Start the local stand-in first, then point the agent at it:
+    python fake_llm_server.py
+    OPENAI_BASE_URL=http://localhost:8001/v1 python benchmark_load.py
+
+LOAD_REQUESTS, LOAD_CONCURRENCY and LOAD_LINES set the number of reviews, how
+many run at once and the size of each snippet. Review caches are disabled so
+every review reaches the LLM.
+"""
+import asyncio
+import os
+import time
+
+os.environ.setdefault("REVIEW_CACHE_ENABLED", "false")
+os.environ.setdefault("SIMILARITY_CACHE_ENABLED", "false")
+
+from config import Config
+from models import CodeReviewRequest
+from services.llm_client import LLMClientRegistry
+from services.main_service import MainService
+
+REQUESTS = int(os.getenv("LOAD_REQUESTS", "100"))
+CONCURRENCY = int(os.getenv("LOAD_CONCURRENCY", "16"))
+LINES = int(os.getenv("LOAD_LINES", "40"))
+
+def build_snippet(index: int) -> str:
+    """Distinct Python snippet so requests are not coalesced"""
+    body = "\n".join(f"    total_{i} = value * {i} + {index}" for i in range(LINES))
+    return f"def compute_{index}(value):\n{body}\n    return total_0\n"
+
+def percentile(values, share: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(share * len(ordered)))] if ordered else 0.0
+
+async def run() -> None:
+    service = MainService()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    latencies = []
+    failures = 0
+
+    async def review(index: int) -> None:
+        nonlocal failures
+        async with semaphore:
+            started = time.perf_counter()
+            response = await service.review_code_snippet(
+                CodeReviewRequest(code=build_snippet(index), language="Python", file_path=f"load_{index}.py")
+            )
+            latencies.append((time.perf_counter() - started) * 1000)
+            if not response.success:
+                failures += 1
+
+    print(f"🧪 {REQUESTS} reviews, {CONCURRENCY} concurrent, against {Config.OPENAI_BASE_URL}")
+    started = time.perf_counter()
+    await asyncio.gather(*(review(index) for index in range(REQUESTS)))
+    elapsed = time.perf_counter() - started
+    await LLMClientRegistry.aclose()
+
+    print("=" * 60)
+    print(f"throughput:  {REQUESTS / elapsed:.2f} reviews/s ({elapsed:.1f}s total)")
+    print(f"latency ms:  p50 {percentile(latencies, 0.5):.0f}  p95 {percentile(latencies, 0.95):.0f}  "
+          f"p99 {percentile(latencies, 0.99):.0f}  max {max(latencies):.0f}")
+    print(f"failures:    {failures}")
+    limiter = LLMClientRegistry.limiter.stats()
+    print(f"limiter:     limit {limiter['limit']}, retries {limiter['retries']}, "
+          f"rate limited {limiter['rate_limited']}, max queue {limiter['max_queue_depth']}")
+    for tier, tier_stats in service.model_router.stats().items():
+        print(f"{tier + ':':<12} {tier_stats['calls']} calls, avg {tier_stats['avg_latency_ms']:.0f}ms, "
+              f"cache hit ratio {tier_stats['cache_hit_ratio']:.0%}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    asyncio.run(run())
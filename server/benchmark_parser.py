@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark the incremental JSON parser against the old regex parsing path
+"""
+import json
+import re
+import time
+from services.stream_parser import IncrementalJSONParser, parse_json_response
+
+SIZES = [10, 100, 1000, 5000]
+CHUNK_SIZE = 4  # roughly one streamed token
+REPEATS = 5
+
+def build_response(issue_count: int) -> str:
+    """Build an LLM-style response with prose and a fenced JSON body"""
+    issues = [
+        {
+            "title": f"Issue {i}",
+            "rule": "Naming Convention",
+            "description": "Variable names should use snake_case; found {camelCase} usage.",
+            "code": f"userName{i} = get_user({{'id': {i}}})",
+            "suggestion": "Rename the variable to user_name",
+            "lineNumber": i + 1,
+            "type": "critical" if i % 3 == 0 else "warning"
+        }
+        for i in range(issue_count)
+    ]
+    body = json.dumps({
+        "issues": issues,
+        "good_points": ["Clear function names", "Consistent indentation"],
+        "recommendations": ["Add type hints"],
+        "overall_score": 72
+    }, indent=2)
+    return f"Here is the review of your code:\n```json\n{body}\n```\nLet me know if you need anything else."
+
+def regex_parse(response: str):
+    """The previous parsing path: greedy regex followed by json.loads"""
+    json_match = re.search(r'\{.*\}', response, re.DOTALL)
+    if json_match:
+        try:
+            return json.loads(json_match.group())
+        except json.JSONDecodeError:
+            return None
+    return None
+
+def timed(func, *args):
+    best = float("inf")
+    result = None
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - started)
+    return best * 1000, result
+
+def stream(response: str):
+    """Feed the response in token-sized chunks, noting when the first issue appears"""
+    parser = IncrementalJSONParser(array_keys=("issues",))
+    first_issue_at = None
+    for offset in range(0, len(response), CHUNK_SIZE):
+        if parser.feed(response[offset:offset + CHUNK_SIZE]) and first_issue_at is None:
+            first_issue_at = offset + CHUNK_SIZE
+    return parser.finish(), first_issue_at
+
+def main():
+    print("🧪 Benchmarking LLM response parsing...")
+    print("=" * 90)
+    print(f"{'issues':>7} {'chars':>9} {'regex ms':>10} {'parse ms':>10} {'stream ms':>10} {'us/token':>9} {'1st issue':>10} {'truncated':>17}")
+
+    for size in SIZES:
+        response = build_response(size)
+        regex_ms, regex_result = timed(regex_parse, response)
+        parse_ms, parse_result = timed(parse_json_response, response)
+        stream_ms, (stream_result, first_issue_at) = timed(stream, response)
+        assert regex_result == parse_result == stream_result
+
+        # Simulate output cut off by max_tokens at 90% of the response
+        truncated = response[:int(len(response) * 0.9)]
+        regex_recovered = len((regex_parse(truncated) or {}).get("issues", []))
+        parse_recovered = len((parse_json_response(truncated) or {}).get("issues", []))
+
+        per_token_us = stream_ms * 1000 / (len(response) / CHUNK_SIZE)
+        first_issue = f"{first_issue_at / len(response):.1%}"
+        recovered = f"{regex_recovered} vs {parse_recovered}"
+        print(f"{size:>7} {len(response):>9} {regex_ms:>10.2f} {parse_ms:>10.2f} {stream_ms:>10.2f} {per_token_us:>9.2f} {first_issue:>10} {recovered:>17}")
+
+    print("=" * 90)
+    print("stream ms: total CPU spent parsing while the response streams in; us/token is the cost per chunk")
+    print("1st issue: share of the response streamed before the first issue was emitted")
+    print("truncated: issues recovered from a response cut at 90% (regex vs incremental parser)")
+
+if __name__ == "__main__":
+    main()
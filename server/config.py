@@ -6,6 +6,71 @@ load_dotenv()
 class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "sk-6yTz6d3DWObt-qZFvmbxPA")
     CHROMA_PERSIST_DIRECTORY = os.getenv("CHROMA_PERSIST_DIRECTORY", "./chroma_db")
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://aiportalapi.stu-platform.live/jpe")
     MODEL_NAME = os.getenv("MODEL_NAME", "GPT-4.1")
+    FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", "GPT-4.1-mini")
     TEMPERATURE = float(os.getenv("TEMPERATURE", "0.1"))
     MAX_TOKENS = int(os.getenv("MAX_TOKENS", "4000"))
+    CHROMA_MAX_WORKERS = int(os.getenv("CHROMA_MAX_WORKERS", "4"))
+    REVIEW_CACHE_ENABLED = os.getenv("REVIEW_CACHE_ENABLED", "true").lower() == "true"
+    REVIEW_CACHE_SIZE = int(os.getenv("REVIEW_CACHE_SIZE", "256"))
+    REVIEW_CACHE_DISK_SIZE = int(os.getenv("REVIEW_CACHE_DISK_SIZE", "10000"))
+    REVIEW_CACHE_PATH = os.getenv("REVIEW_CACHE_PATH", "./review_cache.db")
+    SUMMARY_STRATEGY = os.getenv("SUMMARY_STRATEGY", "template")
+    LANGUAGE_DETECTION_MIN_CONFIDENCE = float(os.getenv("LANGUAGE_DETECTION_MIN_CONFIDENCE", "0.6"))
+    ANALYSIS_DEADLINE_SECONDS = float(os.getenv("ANALYSIS_DEADLINE_SECONDS", "120"))
+    ANALYSIS_BRANCH_TIMEOUT_SECONDS = float(os.getenv("ANALYSIS_BRANCH_TIMEOUT_SECONDS", "90"))
+    TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "cl100k_base")
+    REVIEW_CHUNK_TOKENS = int(os.getenv("REVIEW_CHUNK_TOKENS", "3000"))
+    REVIEW_CHUNK_OVERLAP_LINES = int(os.getenv("REVIEW_CHUNK_OVERLAP_LINES", "5"))
+    REVIEW_CHUNK_CONCURRENCY = int(os.getenv("REVIEW_CHUNK_CONCURRENCY", "4"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LLM_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SECONDS", "60"))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+    LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+    LLM_INITIAL_CONCURRENCY = int(os.getenv("LLM_INITIAL_CONCURRENCY", "8"))
+    LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+    LLM_LATENCY_THRESHOLD_SECONDS = float(os.getenv("LLM_LATENCY_THRESHOLD_SECONDS", "60"))
+    LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "1"))
+    LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "30"))
+    BATCH_REVIEW_CONCURRENCY = int(os.getenv("BATCH_REVIEW_CONCURRENCY", "8"))
+    BATCH_REVIEW_MAX_CONCURRENCY = int(os.getenv("BATCH_REVIEW_MAX_CONCURRENCY", "32"))
+    BATCH_REVIEW_MAX_ITEMS = int(os.getenv("BATCH_REVIEW_MAX_ITEMS", "500"))
+    JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "./job_queue.db")
+    JOB_QUEUE_WORKERS = int(os.getenv("JOB_QUEUE_WORKERS", "4"))
+    JOB_QUEUE_RATE_PER_SECOND = float(os.getenv("JOB_QUEUE_RATE_PER_SECOND", "2"))
+    JOB_QUEUE_MAX_ATTEMPTS = int(os.getenv("JOB_QUEUE_MAX_ATTEMPTS", "3"))
+    JOB_QUEUE_RETRY_DELAY_SECONDS = float(os.getenv("JOB_QUEUE_RETRY_DELAY_SECONDS", "30"))
+    JOB_QUEUE_POLL_SECONDS = float(os.getenv("JOB_QUEUE_POLL_SECONDS", "1"))
+    JOB_QUEUE_MAX_ITEMS = int(os.getenv("JOB_QUEUE_MAX_ITEMS", "10000"))
+    LLM_RESPONSE_FORMAT = os.getenv("LLM_RESPONSE_FORMAT", "json_schema")
+    SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "true").lower() == "true"
+    SIMILARITY_CACHE_THRESHOLD = float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.9"))
+    SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", "1000"))
+    SIMILARITY_CACHE_NUM_PERM = int(os.getenv("SIMILARITY_CACHE_NUM_PERM", "128"))
+    SIMILARITY_CACHE_BANDS = int(os.getenv("SIMILARITY_CACHE_BANDS", "16"))
+    SIMILARITY_CACHE_SHINGLE_SIZE = int(os.getenv("SIMILARITY_CACHE_SHINGLE_SIZE", "5"))
+    ROUTER_FAST_MAX_TOKENS = int(os.getenv("ROUTER_FAST_MAX_TOKENS", "500"))
+    ROUTER_STRONG_LANGUAGES = os.getenv("ROUTER_STRONG_LANGUAGES", "")
+    OUTPUT_BUDGET_BASE_TOKENS = int(os.getenv("OUTPUT_BUDGET_BASE_TOKENS", "800"))
+    OUTPUT_BUDGET_INPUT_RATIO = float(os.getenv("OUTPUT_BUDGET_INPUT_RATIO", "0.5"))
+    OUTPUT_TOKENS_PER_ISSUE = int(os.getenv("OUTPUT_TOKENS_PER_ISSUE", "150"))
+    LLM_MAX_CONTINUATIONS = int(os.getenv("LLM_MAX_CONTINUATIONS", "2"))
+    REVIEW_MAX_ISSUES = int(os.getenv("REVIEW_MAX_ISSUES", "30"))
+    REVIEW_MAX_ISSUES_LIMIT = int(os.getenv("REVIEW_MAX_ISSUES_LIMIT", "100"))
+    RULE_COMPLIANCE_PACK_TOKENS = int(os.getenv("RULE_COMPLIANCE_PACK_TOKENS", "6000"))
+    RULE_COMPLIANCE_MAX_PAIRS = int(os.getenv("RULE_COMPLIANCE_MAX_PAIRS", "20"))
+    RULE_COMPLIANCE_CONCURRENCY = int(os.getenv("RULE_COMPLIANCE_CONCURRENCY", "8"))
+    RULE_COMPLIANCE_MAX_RULES = int(os.getenv("RULE_COMPLIANCE_MAX_RULES", "200"))
+    RULE_COMPLIANCE_MAX_SNIPPETS = int(os.getenv("RULE_COMPLIANCE_MAX_SNIPPETS", "100"))
+    RULE_SEARCH_CACHE_SIZE = int(os.getenv("RULE_SEARCH_CACHE_SIZE", "256"))
+    RULE_CACHE_PREWARM_LANGUAGES = os.getenv(
+        "RULE_CACHE_PREWARM_LANGUAGES", "Python,JavaScript,TypeScript,Java,C#,C++,Go"
+    )
+    RULE_CHUNK_MAX_TOKENS = int(os.getenv("RULE_CHUNK_MAX_TOKENS", "256"))
+    RULE_LIST_DEFAULT_LIMIT = int(os.getenv("RULE_LIST_DEFAULT_LIMIT", "100"))
+    RULE_LIST_MAX_LIMIT = int(os.getenv("RULE_LIST_MAX_LIMIT", "1000"))
+    SUMMARY_LLM_LATENCY_ESTIMATE_MS = float(os.getenv("SUMMARY_LLM_LATENCY_ESTIMATE_MS", "1500"))
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Local OpenAI-compatible chat completions server for offline load and latency testing
+
+Point the agent at it with OPENAI_BASE_URL=http://localhost:8001/v1. Answers are
+generated from the prompt: each PromptService prompt gets a response in its own
+format, so reviews, analyses and batched compliance checks run end to end.
+
+Behaviour is set with environment variables:
+    FAKE_LLM_PORT                   port to listen on (default: 8001)
+    FAKE_LLM_LATENCY_MS             median time to first token (default: 300)
+    FAKE_LLM_LATENCY_DISTRIBUTION   fixed, uniform, exponential or lognormal (default: lognormal)
+    FAKE_LLM_LATENCY_SPREAD         uniform: +/- fraction of the median; lognormal: sigma (default: 0.5)
+    FAKE_LLM_TOKENS_PER_SECOND      output token throughput, 0 for instant output (default: 80)
+    FAKE_LLM_ERROR_RATE             share of calls answered with a 500 (default: 0)
+    FAKE_LLM_RATE_LIMIT_RATE        share of calls answered with a 429 (default: 0)
+    FAKE_LLM_RETRY_AFTER_SECONDS    Retry-After sent with 429s (default: 1)
+    FAKE_LLM_ISSUES                 issues per generated code review (default: 3)
+    FAKE_LLM_SEED                   random seed, for reproducible runs (default: 42)
+"""
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import time
+import uuid
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from services.token_counter import count_tokens
+
+PORT = int(os.getenv("FAKE_LLM_PORT", "8001"))
+LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "300"))
+LATENCY_DISTRIBUTION = os.getenv("FAKE_LLM_LATENCY_DISTRIBUTION", "lognormal")
+LATENCY_SPREAD = float(os.getenv("FAKE_LLM_LATENCY_SPREAD", "0.5"))
+TOKENS_PER_SECOND = float(os.getenv("FAKE_LLM_TOKENS_PER_SECOND", "80"))
+ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+RATE_LIMIT_RATE = float(os.getenv("FAKE_LLM_RATE_LIMIT_RATE", "0"))
+RETRY_AFTER_SECONDS = float(os.getenv("FAKE_LLM_RETRY_AFTER_SECONDS", "1"))
+ISSUES = int(os.getenv("FAKE_LLM_ISSUES", "3"))
+SEED = int(os.getenv("FAKE_LLM_SEED", "42"))
+
+# Providers cache prompt prefixes in blocks; emulate 128-token blocks after the first 1024 tokens
+CACHE_MIN_TOKENS = 1024
+CACHE_BLOCK_TOKENS = 128
+CACHE_MAX_ENTRIES = 10000
+CHUNK_TOKENS = 4
+
+rng = random.Random(SEED)
+prefix_cache: "OrderedDict[str, None]" = OrderedDict()
+stats = {"requests": 0, "errors": 0, "rate_limited": 0, "truncated": 0}
+
+app = FastAPI(title="Fake LLM", description="OpenAI-compatible stand-in for load testing")
+
+
+def sample_latency() -> float:
+    """Seconds before the first token, drawn from the configured distribution"""
+    median = LATENCY_MS / 1000
+    if LATENCY_DISTRIBUTION == "fixed":
+        return median
+    if LATENCY_DISTRIBUTION == "uniform":
+        return max(0.0, rng.uniform(median * (1 - LATENCY_SPREAD), median * (1 + LATENCY_SPREAD)))
+    if LATENCY_DISTRIBUTION == "exponential":
+        return rng.expovariate(1 / median) if median > 0 else 0.0
+    # Lognormal has the long right tail real providers show
+    return rng.lognormvariate(math.log(median), LATENCY_SPREAD) if median > 0 else 0.0
+
+
+def cached_tokens(prompt: str, prompt_tokens: int) -> int:
+    """Tokens of the longest previously seen prompt prefix, in whole cache blocks"""
+    if prompt_tokens < CACHE_MIN_TOKENS:
+        return 0
+    chars_per_token = len(prompt) / prompt_tokens
+    cached = 0
+    for block_end in range(CACHE_MIN_TOKENS, prompt_tokens + 1, CACHE_BLOCK_TOKENS):
+        key = hashlib.sha256(prompt[:int(block_end * chars_per_token)].encode("utf-8")).hexdigest()
+        if key in prefix_cache:
+            prefix_cache.move_to_end(key)
+            cached = block_end
+        else:
+            prefix_cache[key] = None
+    while len(prefix_cache) > CACHE_MAX_ENTRIES:
+        prefix_cache.popitem(last=False)
+    return cached
+
+
+def code_lines(prompt: str) -> List[Tuple[int, str]]:
+    """Non-blank lines of the last fenced code block in the prompt"""
+    blocks = re.findall(r"```[^\n]*\n(.*?)```", prompt, re.DOTALL)
+    code = blocks[-1] if blocks else prompt
+    return [(number, line.strip()) for number, line in enumerate(code.splitlines(), start=1) if line.strip()]
+
+
+def review_response(prompt: str, max_issues: int, first: int = 0) -> Dict[str, Any]:
+    """Code review JSON whose issues point at evenly spaced lines of the reviewed code"""
+    lines = code_lines(prompt) or [(1, "")]
+    count = min(ISSUES, max_issues)
+    issues = []
+    for index in range(first, first + count):
+        number, line = lines[index * len(lines) // (first + count) % len(lines)]
+        issues.append({
+            "title": f"Generated issue {index + 1}",
+            "rule": "Naming Convention" if index % 2 else "Error Handling",
+            "description": f"Line {number} does not follow the coding rules.",
+            "code": line[:80],
+            "suggestion": "Rewrite this line to follow the rule.",
+            "lineNumber": number,
+            "type": "critical" if index % 3 == 0 else "warning"
+        })
+    return {
+        "issues": issues,
+        "good_points": ["Consistent formatting"],
+        "recommendations": ["Add tests for edge cases"],
+        "overall_score": max(0, 90 - 10 * len(issues))
+    }
+
+
+def generate(prompt: str, schema_name: Optional[str]) -> str:
+    """Answer in the format the matching PromptService prompt asks for"""
+    if "previous response was cut off" in prompt:
+        cap = re.search(r"at most (\d+)", prompt.rsplit("previous response was cut off", 1)[-1])
+        data = review_response(prompt, int(cap.group(1)) if cap else 1, first=ISSUES)
+        data["good_points"], data["recommendations"] = [], []
+        return json.dumps(data)
+    if schema_name == "CodeReviewOutput" or "expert code reviewer. Analyze the code" in prompt:
+        cap = re.search(r"Report at most (\d+) issues", prompt)
+        return json.dumps(review_response(prompt, int(cap.group(1)) if cap else ISSUES))
+    if schema_name == "SecurityAnalysisOutput" or "security vulnerabilities" in prompt:
+        number, line = (code_lines(prompt) or [(1, "")])[0]
+        return json.dumps({"security_issues": [{
+            "vulnerability": "Input validation",
+            "description": "Untrusted input reaches this statement without validation.",
+            "risk_level": "Medium",
+            "code_location": f"line {number}: {line[:60]}",
+            "recommendation": "Validate and sanitize the input."
+        }]})
+    if schema_name == "PerformanceAnalysisOutput" or "performance issues and optimization" in prompt:
+        return json.dumps({"performance_issues": [{
+            "issue": "Repeated work in a loop",
+            "description": "A value is recomputed on every iteration.",
+            "impact": "Linear extra work per iteration",
+            "optimization": "Hoist the computation out of the loop.",
+            "priority": "Low"
+        }]})
+    if schema_name == "RuleComplianceOutput" or "[Rule " in prompt:
+        rules = [int(number) for number in re.findall(r"\[Rule (\d+)\]", prompt)]
+        snippets = [int(number) for number in re.findall(r"\[Snippet (\d+)\]", prompt)]
+        return json.dumps({"results": [
+            {
+                "rule": rule,
+                "snippet": snippet,
+                "compliance": ("Yes", "No", "Partially")[(rule + snippet) % 3],
+                "violations": [] if (rule + snippet) % 3 == 0 else [f"Snippet {snippet} breaks rule {rule}"],
+                "suggestion": "" if (rule + snippet) % 3 == 0 else "Follow the rule."
+            }
+            for rule in rules for snippet in snippets
+        ]})
+    if "identify the programming language" in prompt:
+        return "Python"
+    if "friendly summary" in prompt:
+        return "🔍 Review complete. A few issues were found; fix the critical ones first, then the warnings. 💡"
+    if "follows the given coding rule" in prompt:
+        return "Partially. The snippet mostly follows the rule, but names and error handling should be tightened."
+    return json.dumps({"message": "ok"}) if schema_name else "OK"
+
+
+def truncate(content: str, max_tokens: Optional[int]) -> Tuple[str, int, str]:
+    """Cut the answer at max_tokens, as the provider does, returning (content, tokens, finish_reason)"""
+    tokens = count_tokens(content)
+    if not max_tokens or tokens <= max_tokens:
+        return content, tokens, "stop"
+    stats["truncated"] += 1
+    return content[:int(len(content) * max_tokens / tokens)], max_tokens, "length"
+
+
+def usage(prompt_tokens: int, completion_tokens: int, cached: int) -> Dict[str, Any]:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached}
+    }
+
+
+async def chat_completions(request: Request):
+    body = await request.json()
+    stats["requests"] += 1
+    await asyncio.sleep(sample_latency())
+
+    roll = rng.random()
+    if roll < RATE_LIMIT_RATE:
+        stats["rate_limited"] += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": str(RETRY_AFTER_SECONDS)}
+        )
+    if roll < RATE_LIMIT_RATE + ERROR_RATE:
+        stats["errors"] += 1
+        return JSONResponse({"error": {"message": "Injected server error", "type": "server_error"}}, status_code=500)
+
+    prompt = "\n\n".join(
+        message["content"] if isinstance(message.get("content"), str) else json.dumps(message.get("content"))
+        for message in body.get("messages", [])
+    )
+    response_format = body.get("response_format") or {}
+    schema_name = (response_format.get("json_schema") or {}).get("name") or (
+        "json" if response_format.get("type") == "json_object" else None
+    )
+    content, completion_tokens, finish_reason = truncate(
+        generate(prompt, schema_name), body.get("max_completion_tokens") or body.get("max_tokens")
+    )
+    prompt_tokens = count_tokens(prompt)
+    cached = cached_tokens(prompt, prompt_tokens)
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "fake-llm")
+
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        return StreamingResponse(
+            stream_chunks(completion_id, model, content, finish_reason,
+                          usage(prompt_tokens, completion_tokens, cached) if include_usage else None),
+            media_type="text/event-stream"
+        )
+
+    if TOKENS_PER_SECOND > 0:
+        await asyncio.sleep(completion_tokens / TOKENS_PER_SECOND)
+    return JSONResponse({
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": finish_reason
+        }],
+        "usage": usage(prompt_tokens, completion_tokens, cached)
+    })
+
+
+async def stream_chunks(completion_id: str, model: str, content: str, finish_reason: str,
+                        final_usage: Optional[Dict[str, Any]]) -> AsyncIterator[str]:
+    """Emit the answer as chat.completion.chunk events at the configured token rate"""
+    def chunk(delta: Dict[str, Any], reason: Optional[str] = None, chunk_usage=None) -> str:
+        payload = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": reason}] if delta is not None else [],
+        }
+        if chunk_usage is not None:
+            payload["usage"] = chunk_usage
+        return f"data: {json.dumps(payload)}\n\n"
+
+    yield chunk({"role": "assistant", "content": ""})
+    step = CHUNK_TOKENS * 4  # roughly four characters per token
+    for offset in range(0, len(content), step):
+        if TOKENS_PER_SECOND > 0:
+            await asyncio.sleep(CHUNK_TOKENS / TOKENS_PER_SECOND)
+        yield chunk({"content": content[offset:offset + step]})
+    yield chunk({}, finish_reason)
+    if final_usage is not None:
+        yield chunk(None, chunk_usage=final_usage)
+    yield "data: [DONE]\n\n"
+
+
+# Accept base URLs with or without the /v1 suffix
+app.add_api_route("/v1/chat/completions", chat_completions, methods=["POST"])
+app.add_api_route("/chat/completions", chat_completions, methods=["POST"])
+
+
+@app.get("/stats")
+async def get_stats():
+    """Requests served and faults injected so far"""
+    return {**stats, "cached_prefixes": len(prefix_cache)}
+
+
+if __name__ == "__main__":
+    print(f"🧪 Fake LLM listening on http://localhost:{PORT}/v1")
+    print(f"⏱️ Latency: {LATENCY_DISTRIBUTION} around {LATENCY_MS:.0f}ms, {TOKENS_PER_SECOND:.0f} tokens/s")
+    print(f"💥 Faults: {ERROR_RATE:.0%} errors, {RATE_LIMIT_RATE:.0%} rate limited")
+    uvicorn.run(app, host="0.0.0.0", port=PORT, log_level="warning")
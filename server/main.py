@@ -1,22 +1,36 @@
 from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
-from typing import Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Any, Optional
 import json
 
 from models import (
     CodeReviewRequest, 
+    BatchReviewRequest,
+    ReviewJobRequest,
     GitHubPRRequest, 
     RuleUploadRequest,
+    RuleComplianceBatchRequest,
     CodeReviewResponse
 )
 from services.main_service import MainService
+from services.llm_client import LLMClientRegistry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start the review job workers; stop them and release pooled LLM connections on shutdown"""
+    await main_service.job_queue.start()
+    yield
+    await main_service.job_queue.stop()
+    await LLMClientRegistry.aclose()
 
 app = FastAPI(
     title="AI Code Review Agent",
     description="An AI-powered code review agent using LangGraph and LangChain",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -31,6 +45,18 @@ app.add_middleware(
 # Initialize main service
 main_service = MainService()
 
+def _sse_response(events: AsyncIterator[Dict[str, Any]]) -> StreamingResponse:
+    """Wrap a service event stream as a Server-Sent Events response"""
+    async def encode():
+        async for event in events:
+            yield f"event: {event['event']}\ndata: {json.dumps(event['data'], ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(
+        encode(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.get("/")
 async def root():
     """Root endpoint"""
@@ -59,7 +85,7 @@ async def upload_rules(
             description=description
         )
         
-        result = main_service.upload_rules(request)
+        result = await main_service.upload_rules(request)
         
         if result["success"]:
             return JSONResponse(content=result, status_code=200)
@@ -89,7 +115,7 @@ async def upload_rules_file(
             description=description
         )
         
-        result = main_service.upload_rules(request)
+        result = await main_service.upload_rules(request)
         
         if result["success"]:
             return JSONResponse(content=result, status_code=200)
@@ -100,11 +126,20 @@ async def upload_rules_file(
         raise HTTPException(status_code=500, detail=f"Error uploading rules file: {str(e)}")
 
 @app.get("/api/rules")
-async def get_rules():
-    """Get all uploaded rules"""
+async def get_rules(limit: Optional[int] = None, offset: int = 0, rule_name: Optional[str] = None,
+                    language: Optional[str] = None, category: Optional[str] = None,
+                    include: str = "documents,metadatas"):
+    """Get a page of uploaded rules; ``include`` lists the fields to return (documents, metadatas)"""
     try:
-        result = main_service.get_all_rules()
-        return JSONResponse(content=result, status_code=200)
+        result = await main_service.get_all_rules(
+            limit=limit,
+            offset=offset,
+            rule_name=rule_name,
+            language=language,
+            category=category,
+            include=[field.strip() for field in include.split(",") if field.strip()]
+        )
+        return JSONResponse(content=result, status_code=200 if result["success"] else 400)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error retrieving rules: {str(e)}")
 
@@ -112,7 +147,7 @@ async def get_rules():
 async def search_rules(query: str, n_results: int = 10):
     """Search for specific rules"""
     try:
-        result = main_service.search_rules(query, n_results)
+        result = await main_service.search_rules(query, n_results)
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error searching rules: {str(e)}")
@@ -121,7 +156,7 @@ async def search_rules(query: str, n_results: int = 10):
 async def clear_rules():
     """Clear all rules from the system"""
     try:
-        result = main_service.clear_rules()
+        result = await main_service.clear_rules()
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error clearing rules: {str(e)}")
@@ -133,7 +168,7 @@ async def analyze_security(
 ):
     """Analyze code for security vulnerabilities"""
     try:
-        result = main_service.analyze_security(code, language)
+        result = await main_service.analyze_security(code, language)
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during security analysis: {str(e)}")
@@ -145,7 +180,7 @@ async def analyze_performance(
 ):
     """Analyze code for performance issues"""
     try:
-        result = main_service.analyze_performance(code, language)
+        result = await main_service.analyze_performance(code, language)
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during performance analysis: {str(e)}")
@@ -157,7 +192,7 @@ async def comprehensive_analysis(
 ):
     """Perform comprehensive code analysis"""
     try:
-        result = main_service.comprehensive_analysis(code, language)
+        result = await main_service.comprehensive_analysis(code, language)
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during comprehensive analysis: {str(e)}")
@@ -169,25 +204,85 @@ async def analyze_rule_compliance(
 ):
     """Analyze how well code follows a specific rule"""
     try:
-        result = main_service.analyze_rule_compliance(rule_text, code_snippet)
+        result = await main_service.analyze_rule_compliance(rule_text, code_snippet)
         return JSONResponse(content=result, status_code=200)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during rule compliance analysis: {str(e)}")
 
+@app.post("/api/analysis/rule-compliance/batch")
+async def analyze_rule_compliance_batch(request: RuleComplianceBatchRequest):
+    """Check many rules against many code snippets, returning a rule × snippet compliance matrix"""
+    try:
+        result = await main_service.analyze_rule_compliance_batch(request)
+        
+        if result["success"]:
+            return JSONResponse(content=result, status_code=200)
+        else:
+            return JSONResponse(content=result, status_code=400)
+            
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during rule compliance analysis: {str(e)}")
+
 @app.post("/api/review/code", response_model=CodeReviewResponse)
 async def review_code(request: CodeReviewRequest):
     """Review a code snippet"""
     try:
-        result = main_service.review_code_snippet(request)
+        result = await main_service.review_code_snippet(request)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during code review: {str(e)}")
 
+@app.post("/api/review/batch")
+async def review_batch(request: BatchReviewRequest):
+    """Review a list of code snippets with bounded parallelism"""
+    try:
+        result = await main_service.review_batch(request)
+        
+        if result["success"]:
+            return JSONResponse(content=result, status_code=200)
+        else:
+            return JSONResponse(content=result, status_code=400)
+            
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during batch review: {str(e)}")
+
+@app.post("/api/jobs")
+async def create_review_job(request: ReviewJobRequest):
+    """Queue a bulk review job processed by background workers"""
+    try:
+        result = await main_service.create_review_job(request)
+        
+        if result["success"]:
+            return JSONResponse(content=result, status_code=202)
+        else:
+            return JSONResponse(content=result, status_code=400)
+            
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error creating review job: {str(e)}")
+
+@app.get("/api/jobs/{job_id}")
+async def get_review_job(job_id: str):
+    """Get the progress of a review job"""
+    try:
+        result = await main_service.get_review_job(job_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving review job: {str(e)}")
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return JSONResponse(content=result, status_code=200)
+
+@app.get("/api/jobs/{job_id}/results")
+async def stream_review_job_results(job_id: str, after: int = 0):
+    """Stream a review job's finished items as Server-Sent Events; ``after`` resumes from a sequence number"""
+    if await main_service.get_review_job(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found")
+    return _sse_response(main_service.stream_review_job_results(job_id, after))
+
 @app.post("/api/review/github-pr")
 async def review_github_pr(request: GitHubPRRequest):
     """Review code from a GitHub PR"""
     try:
-        result = main_service.review_github_pr(request)
+        result = await main_service.review_github_pr(request)
         
         if result["success"]:
             return JSONResponse(content=result, status_code=200)
@@ -197,26 +292,51 @@ async def review_github_pr(request: GitHubPRRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during GitHub PR review: {str(e)}")
 
+@app.post("/api/review/code/stream")
+async def review_code_stream(request: CodeReviewRequest):
+    """Review a code snippet, streaming progress and issues as Server-Sent Events"""
+    return _sse_response(main_service.stream_code_review(request))
+
+@app.post("/api/review/github-pr/stream")
+async def review_github_pr_stream(request: GitHubPRRequest):
+    """Review code from a GitHub PR, streaming per-file progress as Server-Sent Events"""
+    return _sse_response(main_service.stream_github_pr_review(request))
+
 @app.post("/api/review/code-text")
 async def review_code_text(
     code: str = Form(...),
     language: Optional[str] = Form(None),
-    file_path: Optional[str] = Form(None)
+    file_path: Optional[str] = Form(None),
+    summary_mode: Optional[str] = Form(None),
+    model_hint: Optional[str] = Form(None),
+    max_issues: Optional[int] = Form(None)
 ):
     """Review code from text input"""
     try:
         request = CodeReviewRequest(
             code=code,
             language=language,
-            file_path=file_path
+            file_path=file_path,
+            summary_mode=summary_mode,
+            model_hint=model_hint,
+            max_issues=max_issues
         )
         
-        result = main_service.review_code_snippet(request)
+        result = await main_service.review_code_snippet(request)
         return result
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during code review: {str(e)}")
 
+@app.get("/api/metrics")
+async def get_metrics():
+    """Get runtime metrics such as review cache hit rates"""
+    try:
+        result = await main_service.get_metrics()
+        return JSONResponse(content=result, status_code=200)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error retrieving metrics: {str(e)}")
+
 if __name__ == "__main__":
     uvicorn.run(
         "main:app",
@@ -11,10 +11,65 @@ class ReviewRule(BaseModel):
     lineNumber: int
     type: Literal["critical", "warning"]
 
+class SecurityIssue(BaseModel):
+    vulnerability: str
+    description: str
+    risk_level: Literal["High", "Medium", "Low"]
+    code_location: str
+    recommendation: str
+
+class PerformanceIssue(BaseModel):
+    issue: str
+    description: str
+    impact: str
+    optimization: str
+    priority: Literal["High", "Medium", "Low"]
+
+class CodeReviewOutput(BaseModel):
+    """Shape the code review prompt asks the LLM to return"""
+    issues: List[ReviewRule]
+    good_points: List[str] = []
+    recommendations: List[str] = []
+    overall_score: int = 0
+
+class SecurityAnalysisOutput(BaseModel):
+    """Shape the security analysis prompt asks the LLM to return"""
+    security_issues: List[SecurityIssue]
+
+class PerformanceAnalysisOutput(BaseModel):
+    """Shape the performance analysis prompt asks the LLM to return"""
+    performance_issues: List[PerformanceIssue]
+
+class RuleComplianceResult(BaseModel):
+    rule: int
+    snippet: int
+    compliance: Literal["Yes", "No", "Partially"]
+    violations: List[str] = []
+    suggestion: str = ""
+
+class RuleComplianceOutput(BaseModel):
+    """Shape the batched rule compliance prompt asks the LLM to return"""
+    results: List[RuleComplianceResult]
+
 class CodeReviewRequest(BaseModel):
     code: str
     language: Optional[str] = None
     file_path: Optional[str] = None
+    summary_mode: Optional[Literal["template", "llm"]] = None
+    model_hint: Optional[Literal["fast", "strong"]] = None
+    max_issues: Optional[int] = None
+
+class BatchReviewRequest(BaseModel):
+    items: List[CodeReviewRequest]
+    concurrency: Optional[int] = None
+
+class ReviewJobRequest(BaseModel):
+    items: List[CodeReviewRequest]
+
+class RuleComplianceBatchRequest(BaseModel):
+    snippets: List[str]
+    rules: List[str] = []
+    rule_ids: List[str] = []
 
 class GitHubPRRequest(BaseModel):
     pr_url: str
@@ -34,6 +89,7 @@ class CodeReviewResponse(BaseModel):
     total_issues: int
     critical_count: int
     warning_count: int
+    metadata: Dict[str, Any] = {}
 
 class RuleUploadRequest(BaseModel):
     rules_text: str
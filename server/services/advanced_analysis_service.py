@@ -1,24 +1,95 @@
-from langchain_openai import ChatOpenAI
 from langchain.schema import HumanMessage
-from typing import Dict, List, Any
-import json
-import re
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import time
 from config import Config
 from services.prompt_service import PromptService
+from services.single_flight import SingleFlight
+from services.model_router import ModelRouter
+from services.code_review_service import cap_issues, continue_truncated_review
+from services.output_budget import output_budget
+from services.token_counter import count_tokens
+from models import CodeReviewOutput, SecurityAnalysisOutput, PerformanceAnalysisOutput, RuleComplianceOutput
 
 class AdvancedAnalysisService:
     """Service for advanced code analysis including security and performance"""
     
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model=Config.MODEL_NAME,
-            temperature=Config.TEMPERATURE,
-            max_tokens=Config.MAX_TOKENS,
-            api_key=Config.OPENAI_API_KEY
-        )
+    def __init__(self, router: Optional[ModelRouter] = None):
+        self.router = router or ModelRouter()
         self.prompts = PromptService.get_prompts()
+        self.single_flight = SingleFlight()
     
-    def analyze_security(self, code: str, language: str) -> Dict[str, Any]:
+    async def analyze_security(self, code: str, language: str) -> Dict[str, Any]:
+        """Analyze code for security vulnerabilities"""
+        return await self._coalesce("analyze_security", self._analyze_security, code, language)
+    
+    async def analyze_performance(self, code: str, language: str) -> Dict[str, Any]:
+        """Analyze code for performance issues and optimization opportunities"""
+        return await self._coalesce("analyze_performance", self._analyze_performance, code, language)
+    
+    async def analyze_rule_compliance(self, rule_text: str, code_snippet: str) -> Dict[str, Any]:
+        """Analyze how well code follows a specific rule"""
+        return await self._coalesce("analyze_rule_compliance", self._analyze_rule_compliance, rule_text, code_snippet)
+    
+    async def analyze_rule_compliance_batch(self, rules: List[Dict[str, Any]], snippets: List[str]) -> Dict[str, Any]:
+        """Check many rules against many snippets, returning a rule × snippet compliance matrix.
+        
+        Each rule is a dict with ``text`` and an optional stored ``id``. Rules
+        and snippets are packed into prompts bounded by
+        ``Config.RULE_COMPLIANCE_PACK_TOKENS`` and ``RULE_COMPLIANCE_MAX_PAIRS``,
+        and the packs run concurrently. ``matrix[r][s]`` is None when the pair
+        could not be evaluated.
+        """
+        started = time.perf_counter()
+        packs = self._pack_rule_compliance([rule["text"] for rule in rules], snippets)
+        semaphore = asyncio.Semaphore(Config.RULE_COMPLIANCE_CONCURRENCY)
+        
+        async def check(rule_indices, snippet_indices):
+            async with semaphore:
+                return await self._check_rule_pack(rules, snippets, rule_indices, snippet_indices)
+        
+        results = await asyncio.gather(*(check(*pack) for pack in packs), return_exceptions=True)
+        
+        matrix: List[List[Optional[Dict[str, Any]]]] = [[None] * len(snippets) for _ in rules]
+        failed_packs = []
+        for (rule_indices, snippet_indices), result in zip(packs, results):
+            if isinstance(result, Exception):
+                print(f"Error checking rules {rule_indices} against snippets {snippet_indices}: {result}")
+                failed_packs.append({"rules": rule_indices, "snippets": snippet_indices, "error": str(result)})
+                continue
+            for item in result:
+                matrix[item["rule"]][item["snippet"]] = {
+                    "compliance": item["compliance"],
+                    "violations": item["violations"],
+                    "suggestion": item["suggestion"]
+                }
+        
+        summary = {"Yes": 0, "No": 0, "Partially": 0, "missing": 0}
+        for row in matrix:
+            for cell in row:
+                summary[cell["compliance"] if cell else "missing"] += 1
+        
+        return {
+            "success": not packs or len(failed_packs) < len(packs),
+            "rules": [{"index": index, "id": rule.get("id"), "rule_text": rule["text"]} for index, rule in enumerate(rules)],
+            "snippet_count": len(snippets),
+            "matrix": matrix,
+            "summary": summary,
+            "packs": len(packs),
+            "failed_packs": failed_packs,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1)
+        }
+    
+    async def comprehensive_analysis(self, code: str, language: str) -> Dict[str, Any]:
+        """Perform comprehensive analysis including security, performance, and general review"""
+        return await self._coalesce("comprehensive_analysis", self._comprehensive_analysis, code, language)
+    
+    async def _coalesce(self, name: str, func, *args) -> Dict[str, Any]:
+        """Share one in-flight analysis between identical concurrent requests"""
+        key = SingleFlight.make_key(name, *args)
+        return await self.single_flight.do(key, lambda: func(*args))
+    
+    async def _analyze_security(self, code: str, language: str) -> Dict[str, Any]:
         """Analyze code for security vulnerabilities"""
         try:
             # Get security analysis prompt
@@ -27,10 +98,12 @@ class AdvancedAnalysisService:
                 code=code
             )
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            
-            # Parse response
-            security_data = self._parse_security_response(response.content)
+            # Security findings always go to the strong model
+            result = await self.router.invoke(
+                self.router.choose("security", code, language), [HumanMessage(content=prompt)],
+                schema=SecurityAnalysisOutput, max_tokens=output_budget("security_analysis", count_tokens(code))
+            )
+            security_data = result["data"]
             
             return {
                 "success": True,
@@ -50,7 +123,7 @@ class AdvancedAnalysisService:
                 "summary": "Security analysis could not be completed"
             }
     
-    def analyze_performance(self, code: str, language: str) -> Dict[str, Any]:
+    async def _analyze_performance(self, code: str, language: str) -> Dict[str, Any]:
         """Analyze code for performance issues and optimization opportunities"""
         try:
             # Get performance analysis prompt
@@ -59,10 +132,11 @@ class AdvancedAnalysisService:
                 code=code
             )
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            
-            # Parse response
-            performance_data = self._parse_performance_response(response.content)
+            result = await self.router.invoke(
+                self.router.choose("performance", code, language), [HumanMessage(content=prompt)],
+                schema=PerformanceAnalysisOutput, max_tokens=output_budget("performance_analysis", count_tokens(code))
+            )
+            performance_data = result["data"]
             
             return {
                 "success": True,
@@ -82,7 +156,7 @@ class AdvancedAnalysisService:
                 "summary": "Performance analysis could not be completed"
             }
     
-    def analyze_rule_compliance(self, rule_text: str, code_snippet: str) -> Dict[str, Any]:
+    async def _analyze_rule_compliance(self, rule_text: str, code_snippet: str) -> Dict[str, Any]:
         """Analyze how well code follows a specific rule"""
         try:
             # Get rule analysis prompt
@@ -91,11 +165,14 @@ class AdvancedAnalysisService:
                 code_snippet=code_snippet
             )
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
+            result = await self.router.invoke(
+                self.router.choose("rule_compliance", code_snippet), [HumanMessage(content=prompt)],
+                max_tokens=output_budget("rule_analysis", count_tokens(code_snippet))
+            )
             
             return {
                 "success": True,
-                "analysis": response.content.strip(),
+                "analysis": result["response"].content.strip(),
                 "rule_text": rule_text,
                 "code_snippet": code_snippet
             }
@@ -109,37 +186,95 @@ class AdvancedAnalysisService:
                 "code_snippet": code_snippet
             }
     
-    def comprehensive_analysis(self, code: str, language: str) -> Dict[str, Any]:
-        """Perform comprehensive analysis including security, performance, and general review"""
+    def _pack_rule_compliance(self, rule_texts: List[str], snippets: List[str]) -> List[Tuple[List[int], List[int]]]:
+        """Split rule and snippet indices into (rules, snippets) packs that fit one prompt.
+        
+        Snippets are grouped first, each group taking at most half the token
+        budget; every snippet group is then paired with runs of rules that fill
+        the rest, keeping rules x snippets within the pair limit.
+        """
+        budget = Config.RULE_COMPLIANCE_PACK_TOKENS
+        max_pairs = max(1, Config.RULE_COMPLIANCE_MAX_PAIRS)
+        rule_tokens = [count_tokens(text) for text in rule_texts]
+        snippet_tokens = [count_tokens(snippet) for snippet in snippets]
+        
+        packs = []
+        for snippet_group in _greedy_groups(snippet_tokens, budget // 2, max_pairs):
+            rule_budget = budget - sum(snippet_tokens[index] for index in snippet_group)
+            for rule_group in _greedy_groups(rule_tokens, rule_budget, max_pairs // len(snippet_group)):
+                packs.append((rule_group, snippet_group))
+        return packs
+    
+    async def _check_rule_pack(self, rules: List[Dict[str, Any]], snippets: List[str],
+                               rule_indices: List[int], snippet_indices: List[int]) -> List[Dict[str, Any]]:
+        """Evaluate one pack, returning its results with 0-based rule and snippet indices"""
+        # Rules come before snippets so packs sharing a rule run share a prompt prefix
+        rules_text = "\n\n".join(f"[Rule {index + 1}]\n{rules[index]['text']}" for index in rule_indices)
+        snippets_text = "\n\n".join(f"[Snippet {index + 1}]\n```\n{snippets[index]}\n```" for index in snippet_indices)
+        prompt = self.prompts["rule_compliance_batch"].format(rules_text=rules_text, snippets_text=snippets_text)
+        
+        pairs = len(rule_indices) * len(snippet_indices)
+        result = await self.router.invoke(
+            self.router.choose("rule_compliance", "\n".join(snippets[index] for index in snippet_indices)),
+            [HumanMessage(content=prompt)],
+            schema=RuleComplianceOutput,
+            max_tokens=output_budget("rule_compliance_batch", count_tokens(rules_text + snippets_text), pairs)
+        )
+        
+        # Drop pairs the model invented outside this pack
+        wanted_rules, wanted_snippets = set(rule_indices), set(snippet_indices)
+        checked = []
+        for item in result["data"]["results"]:
+            rule, snippet = item["rule"] - 1, item["snippet"] - 1
+            if rule in wanted_rules and snippet in wanted_snippets:
+                checked.append({**item, "rule": rule, "snippet": snippet})
+        return checked
+    
+    async def _comprehensive_analysis(self, code: str, language: str) -> Dict[str, Any]:
+        """Perform comprehensive analysis including security, performance, and general review.
+        
+        The three analyses are independent, so they run concurrently under a shared
+        deadline. A branch that fails or times out is reported without failing the others.
+        """
         try:
-            # Get code review prompt
-            prompt = self.prompts["code_review"].format(
-                language=language,
-                rules_text="General coding best practices, security guidelines, and performance considerations",
-                code=code
+            branches = await self._run_branches(
+                {
+                    "general_review": self._general_review(code, language),
+                    "security_analysis": self.analyze_security(code, language),
+                    "performance_analysis": self.analyze_performance(code, language)
+                },
+                deadline=Config.ANALYSIS_DEADLINE_SECONDS,
+                branch_timeout=Config.ANALYSIS_BRANCH_TIMEOUT_SECONDS
             )
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            
-            # Parse response
-            review_data = self._parse_llm_response(response.content)
-            
-            # Perform additional analyses
-            security_analysis = self.analyze_security(code, language)
-            performance_analysis = self.analyze_performance(code, language)
+            general_review = branches["general_review"]["result"] or {
+                "issues": [], "total_issues": 0, "critical_count": 0, "warning_count": 0
+            }
+            security_analysis = branches["security_analysis"]["result"] or {
+                "success": False,
+                "error": branches["security_analysis"]["error"],
+                "security_issues": []
+            }
+            performance_analysis = branches["performance_analysis"]["result"] or {
+                "success": False,
+                "error": branches["performance_analysis"]["error"],
+                "performance_issues": []
+            }
+            branch_status = {
+                name: {key: value for key, value in branch.items() if key != "result"}
+                for name, branch in branches.items()
+            }
+            completed = [name for name, branch in branches.items() if branch["status"] == "completed"]
             
             return {
-                "success": True,
-                "general_review": {
-                    "issues": review_data.get("issues", []),
-                    "total_issues": len(review_data.get("issues", [])),
-                    "critical_count": sum(1 for issue in review_data.get("issues", []) if issue.get("type") == "critical"),
-                    "warning_count": sum(1 for issue in review_data.get("issues", []) if issue.get("type") == "warning")
-                },
+                "success": bool(completed),
+                "partial": len(completed) < len(branches),
+                "branch_status": branch_status,
+                "general_review": general_review,
                 "security_analysis": security_analysis,
                 "performance_analysis": performance_analysis,
                 "overall_score": self._calculate_overall_score(
-                    review_data.get("issues", []),
+                    general_review.get("issues", []),
                     security_analysis.get("security_issues", []),
                     performance_analysis.get("performance_issues", [])
                 )
@@ -151,75 +286,79 @@ class AdvancedAnalysisService:
                 "error": f"Comprehensive analysis failed: {str(e)}"
             }
     
-    def _parse_security_response(self, response: str) -> Dict[str, Any]:
-        """Parse security analysis response"""
-        try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-        
-        # Fallback parsing
-        return {"security_issues": []}
-    
-    def _parse_performance_response(self, response: str) -> Dict[str, Any]:
-        """Parse performance analysis response"""
-        try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-        
-        # Fallback parsing
-        return {"performance_issues": []}
+    async def _general_review(self, code: str, language: str) -> Dict[str, Any]:
+        """Run the general code review prompt used by comprehensive analysis.
+        
+        Like a regular review, a cut-off response is continued and the result is
+        capped at ``Config.REVIEW_MAX_ISSUES`` issues, critical ones first.
+        """
+        max_issues = Config.REVIEW_MAX_ISSUES
+        code_tokens = count_tokens(code)
+        # Get code review prompt
+        prompt = self.prompts["code_review"].format(
+            language=language,
+            rules_text="General coding best practices, security guidelines, and performance considerations",
+            code=code,
+            max_issues=max_issues
+        )
+        
+        messages = [HumanMessage(content=prompt)]
+        result = await self.router.invoke(
+            self.router.choose("review", code, language), messages, schema=CodeReviewOutput,
+            max_tokens=output_budget("code_review", code_tokens, max_issues)
+        )
+        result = await continue_truncated_review(self.router, self.prompts, result, messages, code_tokens, max_issues)
+        issues, dropped = cap_issues(result["data"].get("issues", []), max_issues)
+        
+        return {
+            "issues": issues,
+            "total_issues": len(issues),
+            "critical_count": sum(1 for issue in issues if issue.get("type") == "critical"),
+            "warning_count": sum(1 for issue in issues if issue.get("type") == "warning"),
+            "issues_dropped": dropped,
+            "output_truncated": result["truncated"] and len(issues) < max_issues
+        }
     
-    def _parse_llm_response(self, response: str) -> Dict[str, Any]:
-        """Parse LLM response to extract structured data"""
-        try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                return json.loads(json_str)
-        except json.JSONDecodeError:
-            pass
-        
-        # Fallback: try to extract information manually
-        issues = []
-        lines = response.split('\n')
-        current_issue = {}
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Rule:') or line.startswith('Issue:'):
-                if current_issue:
-                    issues.append(current_issue)
-                current_issue = {'rule': line.split(':', 1)[1].strip()}
-            elif line.startswith('Description:'):
-                current_issue['description'] = line.split(':', 1)[1].strip()
-            elif line.startswith('Code:'):
-                current_issue['code'] = line.split(':', 1)[1].strip()
-            elif line.startswith('Suggestion:'):
-                current_issue['suggestion'] = line.split(':', 1)[1].strip()
-            elif line.startswith('Line:'):
-                try:
-                    current_issue['lineNumber'] = int(line.split(':', 1)[1].strip())
-                except:
-                    current_issue['lineNumber'] = 0
-            elif line.startswith('Type:'):
-                type_val = line.split(':', 1)[1].strip().lower()
-                current_issue['type'] = 'critical' if 'critical' in type_val else 'warning'
-        
-        if current_issue:
-            issues.append(current_issue)
-        
-        return {"issues": issues}
+    async def _run_branches(self, branches: Dict[str, Any], deadline: float, branch_timeout: float) -> Dict[str, Dict[str, Any]]:
+        """Run independent analysis coroutines concurrently and collect partial results"""
+        
+        async def run(name, coro):
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(coro, timeout=branch_timeout)
+                # analyze_security/analyze_performance report their own failures
+                if isinstance(result, dict) and result.get("success") is False:
+                    status, error = "failed", result.get("error")
+                else:
+                    status, error = "completed", None
+            except asyncio.TimeoutError:
+                result, status, error = None, "timed_out", f"{name} exceeded {branch_timeout}s"
+            except Exception as e:
+                result, status, error = None, "failed", str(e)
+            return {
+                "status": status,
+                "error": error,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "result": result
+            }
+        
+        started = time.perf_counter()
+        tasks = {name: asyncio.create_task(run(name, coro)) for name, coro in branches.items()}
+        await asyncio.wait(tasks.values(), timeout=deadline)
+        
+        results = {}
+        for name, task in tasks.items():
+            if task.done():
+                results[name] = task.result()
+            else:
+                task.cancel()
+                results[name] = {
+                    "status": "timed_out",
+                    "error": f"{name} did not finish before the {deadline}s deadline",
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                    "result": None
+                }
+        return results
     
     def _analyze_risk_levels(self, security_issues: List[Dict[str, Any]]) -> Dict[str, int]:
         """Analyze distribution of risk levels in security issues"""
@@ -341,3 +480,19 @@ class AdvancedAnalysisService:
             "weighted_score": weighted_score,
             "max_possible_score": max_possible_score
         }
+
+
+def _greedy_groups(sizes: List[int], budget: int, max_count: int) -> List[List[int]]:
+    """Group consecutive indices while their total size fits the budget; an oversized item gets its own group"""
+    groups: List[List[int]] = []
+    current: List[int] = []
+    current_size = 0
+    for index, size in enumerate(sizes):
+        if current and (current_size + size > budget or len(current) >= max_count):
+            groups.append(current)
+            current, current_size = [], 0
+        current.append(index)
+        current_size += size
+    if current:
+        groups.append(current)
+    return groups
@@ -1,11 +1,25 @@
 import chromadb
 from chromadb.config import Settings
-from typing import List, Dict, Any
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple, Union
+import asyncio
+import copy
+import functools
+import hashlib
 import json
+import threading
 from config import Config
+from services.rule_chunker import RuleChunker
 
 class ChromaService:
     def __init__(self):
+        # Chroma's client is synchronous; async callers go through this bounded pool
+        # so embedding and HNSW lookups never run on the event loop thread.
+        self._executor = ThreadPoolExecutor(
+            max_workers=Config.CHROMA_MAX_WORKERS,
+            thread_name_prefix="chroma"
+        )
         self.client = chromadb.PersistentClient(
             path=Config.CHROMA_PERSIST_DIRECTORY,
             settings=Settings(anonymized_telemetry=False)
@@ -14,63 +28,226 @@ class ChromaService:
             name="code_review_rules",
             metadata={"description": "Code review rules and guidelines"}
         )
+        self.rule_chunker = RuleChunker()
+        # Re-ingesting a rule set reads then writes its chunks; keep that atomic per process
+        self._ingest_lock = threading.Lock()
+        
+        # Search results only change when the rules do; ``version`` bumps on every
+        # change so cached results from an older rule set are never served
+        self.version = 0
+        self._search_cache: "OrderedDict[Tuple[str, int, int], List[Dict[str, Any]]]" = OrderedDict()
+        self._search_cache_size = Config.RULE_SEARCH_CACHE_SIZE
+        self._cache_lock = threading.Lock()
+        self.search_cache_hits = 0
+        self.search_cache_misses = 0
     
-    def add_rules(self, rules_text: str, rule_name: str, description: str) -> bool:
-        """Add new rules to the database"""
+    def add_rules(self, rules_text: str, rule_name: str, description: str) -> Optional[Dict[str, int]]:
+        """Add or re-ingest a rule set, embedding only chunks whose text changed.
+        
+        Chunk ids are derived from the chunk text, so re-uploading a rule set
+        skips unchanged chunks, embeds new or edited ones and deletes chunks
+        that are no longer in the text. Returns ``embedded``, ``skipped`` and
+        ``deleted`` counts, or None on failure.
+        """
         try:
-            # Split rules text into chunks
-            chunks = self._chunk_text(rules_text)
-            
-            documents = []
-            metadatas = []
-            ids = []
+            # One chunk per rule, tagged with the section, language and category it came from
+            chunks = self.rule_chunker.split(rules_text, rule_name)
+            if not chunks:
+                print(f"No rules found in '{rule_name}'")
+                return None
             
+            documents = {}
+            metadatas = {}
             for i, chunk in enumerate(chunks):
-                chunk_id = f"{rule_name}_{i}"
-                documents.append(chunk)
-                metadatas.append({
+                chunk_id = self._chunk_id(rule_name, chunk["document"])
+                if chunk_id in documents:
+                    # A rule repeated word for word is stored once
+                    continue
+                documents[chunk_id] = chunk["document"]
+                metadatas[chunk_id] = {
                     "rule_name": rule_name,
                     "description": description,
                     "chunk_index": i,
-                    "total_chunks": len(chunks)
-                })
-                ids.append(chunk_id)
+                    "total_chunks": len(chunks),
+                    "section_path": chunk["section_path"],
+                    "section": chunk["section"],
+                    "language": chunk["language"],
+                    "category": chunk["category"]
+                }
             
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            return True
+            with self._ingest_lock:
+                existing = self.collection.get(where={"rule_name": rule_name}, include=["metadatas"])
+                existing_metadata = dict(zip(existing['ids'], existing['metadatas']))
+                
+                new_ids = [chunk_id for chunk_id in documents if chunk_id not in existing_metadata]
+                # Unchanged text keeps its embedding; only moved or re-described chunks get new metadata
+                moved_ids = [
+                    chunk_id for chunk_id in documents
+                    if chunk_id in existing_metadata and existing_metadata[chunk_id] != metadatas[chunk_id]
+                ]
+                stale_ids = [chunk_id for chunk_id in existing_metadata if chunk_id not in documents]
+                
+                if new_ids:
+                    self.collection.upsert(
+                        ids=new_ids,
+                        documents=[documents[chunk_id] for chunk_id in new_ids],
+                        metadatas=[metadatas[chunk_id] for chunk_id in new_ids]
+                    )
+                if moved_ids:
+                    self.collection.update(ids=moved_ids, metadatas=[metadatas[chunk_id] for chunk_id in moved_ids])
+                if stale_ids:
+                    self.collection.delete(ids=stale_ids)
+            
+            if new_ids or moved_ids or stale_ids:
+                self._bump_version()
+            return {
+                "embedded": len(new_ids),
+                "skipped": len(documents) - len(new_ids),
+                "deleted": len(stale_ids)
+            }
         except Exception as e:
             print(f"Error adding rules: {e}")
-            return False
+            return None
+    
+    @staticmethod
+    def _chunk_id(rule_name: str, document: str) -> str:
+        """Stable id for a chunk of a rule set, derived from its text"""
+        return f"{rule_name}_{hashlib.sha256(document.encode('utf-8')).hexdigest()[:16]}"
     
     def search_rules(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
-        """Search for relevant rules based on query"""
+        """Search for relevant rules based on query, reusing results while the rules are unchanged"""
+        return self._search([query], [n_results])[0]
+    
+    def search_rules_many(self, queries: List[str], n_results: Union[int, List[int]] = 5,
+                          merge: bool = True) -> Union[List[Dict[str, Any]], List[List[Dict[str, Any]]]]:
+        """Search several queries with one embedding pass and one collection query.
+        
+        ``n_results`` is one count for every query or a list with one count per
+        query. Results are merged in query order and deduplicated by rule chunk
+        id; with ``merge=False`` one result list per query is returned instead.
+        """
+        counts = list(n_results) if isinstance(n_results, list) else [n_results] * len(queries)
+        if len(counts) != len(queries):
+            raise ValueError("n_results must be an int or have one count per query")
+        per_query = self._search(queries, counts)
+        return self.merge_results(per_query) if merge else per_query
+    
+    @staticmethod
+    def merge_results(result_lists: List[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Concatenate search results in order, keeping the first hit for each rule chunk id"""
+        merged = []
+        seen_ids = set()
+        for results in result_lists:
+            for rule in results:
+                if rule['id'] not in seen_ids:
+                    seen_ids.add(rule['id'])
+                    merged.append(rule)
+        return merged
+    
+    def _search(self, queries: List[str], counts: List[int]) -> List[List[Dict[str, Any]]]:
+        """Serve each query from the search cache and send the rest to Chroma in one call"""
+        version = self.version
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(queries)
+        missing = []
+        with self._cache_lock:
+            for index, key in enumerate(zip(queries, counts)):
+                cached = self._search_cache.get((*key, version))
+                if cached is not None:
+                    self._search_cache.move_to_end((*key, version))
+                    self.search_cache_hits += 1
+                    results[index] = copy.deepcopy(cached)
+                else:
+                    self.search_cache_misses += 1
+                    missing.append(index)
+        if not missing:
+            return results
+        
+        # The nearest max(n) results of a query start with its nearest n, so one query serves every count
+        query_texts = list(dict.fromkeys(queries[index] for index in missing))
         try:
-            results = self.collection.query(
-                query_texts=[query],
-                n_results=n_results
+            found = self.collection.query(
+                query_texts=query_texts,
+                n_results=max(counts[index] for index in missing)
             )
+        except Exception as e:
+            print(f"Error searching rules: {e}")
+            for index in missing:
+                results[index] = []
+            return results
+        
+        by_query = {}
+        for position, query in enumerate(query_texts):
+            by_query[query] = [
+                {
+                    'id': found['ids'][position][i],
+                    'document': found['documents'][position][i],
+                    'metadata': found['metadatas'][position][i],
+                    'distance': found['distances'][position][i] if found.get('distances') else None
+                }
+                for i in range(len(found['ids'][position]))
+            ]
+        
+        with self._cache_lock:
+            for index in missing:
+                results[index] = by_query[queries[index]][:counts[index]]
+                # A rule change during the query makes these results stale; don't cache them
+                if version == self.version:
+                    self._search_cache[(queries[index], counts[index], version)] = copy.deepcopy(results[index])
+            while len(self._search_cache) > self._search_cache_size:
+                self._search_cache.popitem(last=False)
+        return results
+    
+    def search_cache_stats(self) -> Dict[str, Any]:
+        """Return rule search cache hit/miss counters and the rule-store version"""
+        with self._cache_lock:
+            lookups = self.search_cache_hits + self.search_cache_misses
+            return {
+                "version": self.version,
+                "entries": len(self._search_cache),
+                "max_entries": self._search_cache_size,
+                "hits": self.search_cache_hits,
+                "misses": self.search_cache_misses,
+                "hit_rate": round(self.search_cache_hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def get_rules(self, limit: int, offset: int = 0, where: Optional[Dict[str, str]] = None,
+                  include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Return one page of stored rule chunks and the number of chunks matching ``where``.
+        
+        ``where`` maps metadata fields (``rule_name``, ``language``, ``category``)
+        to required values. ``include`` picks "documents" and/or "metadatas"; ids
+        are always returned. The total is counted from ids alone, so document
+        bodies are never loaded for it.
+        """
+        include = ["documents", "metadatas"] if include is None else include
+        conditions = [{field: value} for field, value in (where or {}).items()]
+        filters = None if not conditions else conditions[0] if len(conditions) == 1 else {"$and": conditions}
+        try:
+            results = self.collection.get(where=filters, limit=limit, offset=offset, include=include)
+            if filters is None:
+                total = self.collection.count()
+            else:
+                total = len(self.collection.get(where=filters, include=[])['ids'])
             
             formatted_results = []
-            for i in range(len(results['documents'][0])):
-                formatted_results.append({
-                    'document': results['documents'][0][i],
-                    'metadata': results['metadatas'][0][i],
-                    'distance': results['distances'][0][i] if 'distances' in results else None
-                })
+            for i, rule_id in enumerate(results['ids']):
+                rule = {}
+                if "documents" in include:
+                    rule['document'] = results['documents'][i]
+                if "metadatas" in include:
+                    rule['metadata'] = results['metadatas'][i]
+                rule['id'] = rule_id
+                formatted_results.append(rule)
             
-            return formatted_results
+            return {"rules": formatted_results, "total": total}
         except Exception as e:
-            print(f"Error searching rules: {e}")
-            return []
+            print(f"Error listing rules: {e}")
+            return {"rules": [], "total": 0}
     
-    def get_all_rules(self) -> List[Dict[str, Any]]:
-        """Get all rules from the database"""
+    def get_rules_by_ids(self, ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Get stored rule chunks by id; unknown ids are left out, and None means the lookup failed"""
         try:
-            results = self.collection.get()
+            results = self.collection.get(ids=ids)
             formatted_results = []
             
             for i in range(len(results['documents'])):
@@ -82,30 +259,8 @@ class ChromaService:
             
             return formatted_results
         except Exception as e:
-            print(f"Error getting all rules: {e}")
-            return []
-    
-    def _chunk_text(self, text: str, chunk_size: int = 1000) -> List[str]:
-        """Split text into chunks for better storage and retrieval"""
-        words = text.split()
-        chunks = []
-        current_chunk = []
-        current_size = 0
-        
-        for word in words:
-            if current_size + len(word) + 1 > chunk_size:
-                if current_chunk:
-                    chunks.append(' '.join(current_chunk))
-                current_chunk = [word]
-                current_size = len(word)
-            else:
-                current_chunk.append(word)
-                current_size += len(word) + 1
-        
-        if current_chunk:
-            chunks.append(' '.join(current_chunk))
-        
-        return chunks
+            print(f"Error getting rules by id: {e}")
+            return None
     
     def clear_rules(self) -> bool:
         """Clear all rules from the database"""
@@ -115,7 +270,45 @@ class ChromaService:
                 name="code_review_rules",
                 metadata={"description": "Code review rules and guidelines"}
             )
+            self._bump_version()
             return True
         except Exception as e:
             print(f"Error clearing rules: {e}")
             return False
+    
+    def _bump_version(self) -> None:
+        """Invalidate cached search results after the rules change"""
+        with self._cache_lock:
+            self.version += 1
+            self._search_cache.clear()
+    
+    async def _run(self, func, *args, **kwargs):
+        """Run a blocking Chroma call on the bounded executor"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+    
+    async def aadd_rules(self, rules_text: str, rule_name: str, description: str) -> Optional[Dict[str, int]]:
+        """Async variant of add_rules"""
+        return await self._run(self.add_rules, rules_text, rule_name, description)
+    
+    async def asearch_rules(self, query: str, n_results: int = 5) -> List[Dict[str, Any]]:
+        """Async variant of search_rules"""
+        return await self._run(self.search_rules, query, n_results)
+    
+    async def asearch_rules_many(self, queries: List[str], n_results: Union[int, List[int]] = 5,
+                                 merge: bool = True) -> Union[List[Dict[str, Any]], List[List[Dict[str, Any]]]]:
+        """Async variant of search_rules_many"""
+        return await self._run(self.search_rules_many, queries, n_results, merge)
+    
+    async def aget_rules(self, limit: int, offset: int = 0, where: Optional[Dict[str, str]] = None,
+                         include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Async variant of get_rules"""
+        return await self._run(self.get_rules, limit, offset, where, include)
+    
+    async def aget_rules_by_ids(self, ids: List[str]) -> Optional[List[Dict[str, Any]]]:
+        """Async variant of get_rules_by_ids"""
+        return await self._run(self.get_rules_by_ids, ids)
+    
+    async def aclear_rules(self) -> bool:
+        """Async variant of clear_rules"""
+        return await self._run(self.clear_rules)
@@ -0,0 +1,147 @@
+from typing import Dict, List, Any, Optional
+import re
+from config import Config
+from services.token_counter import count_tokens
+
+# Top-level constructs that make a good place to cut a file, across common languages
+_BOUNDARY_RE = re.compile(
+    r"^(?:async\s+def|def|class|function|export|public|private|protected|internal|static|"
+    r"abstract|final|func|fn|pub|impl|struct|enum|interface|trait|type|module|namespace|"
+    r"const|let|var|package|@)\b"
+)
+_DECORATOR_RE = re.compile(r"^@")
+
+
+class CodeChunker:
+    """Split large files into token-bounded chunks on function and class boundaries"""
+
+    def __init__(self, max_tokens: Optional[int] = None, overlap_lines: Optional[int] = None):
+        self.max_tokens = max_tokens if max_tokens is not None else Config.REVIEW_CHUNK_TOKENS
+        self.overlap_lines = overlap_lines if overlap_lines is not None else Config.REVIEW_CHUNK_OVERLAP_LINES
+
+    def needs_chunking(self, code: str) -> bool:
+        """True if the code does not fit in one review prompt"""
+        return count_tokens(code) > self.max_tokens
+
+    def split(self, code: str) -> List[Dict[str, Any]]:
+        """Return chunks as dicts with ``code``, ``start_line`` and ``end_line`` (1-based, inclusive)"""
+        lines = code.splitlines(keepends=True)
+        if not lines:
+            return []
+
+        chunks = []
+        current: List[int] = []       # segment start indexes packed into the current chunk
+        current_tokens = 0
+        segments = self._segments(lines)
+
+        for start, end in segments:
+            tokens = count_tokens("".join(lines[start:end]))
+            if tokens > self.max_tokens:
+                # A single definition larger than the budget is split by lines
+                if current:
+                    chunks.append((current[0], start))
+                    current, current_tokens = [], 0
+                chunks.extend(self._split_lines(lines, start, end))
+                continue
+            if current and current_tokens + tokens > self.max_tokens:
+                chunks.append((current[0], start))
+                current, current_tokens = [], 0
+            current.append(start)
+            current_tokens += tokens
+
+        if current:
+            chunks.append((current[0], len(lines)))
+
+        result = []
+        for index, (start, end) in enumerate(chunks):
+            # Overlap gives the reviewer context for code right at the cut
+            if index > 0:
+                start = max(0, start - self.overlap_lines)
+            result.append({
+                "code": "".join(lines[start:end]),
+                "start_line": start + 1,
+                "end_line": end
+            })
+        return result
+
+    def _segments(self, lines: List[str]) -> List[tuple]:
+        """Cut the file before every top-level definition (keeping decorators attached)"""
+        boundaries = [0]
+        for index, line in enumerate(lines):
+            if index == 0 or not line.strip() or line[0].isspace():
+                continue
+            if _BOUNDARY_RE.match(line) and not _DECORATOR_RE.match(lines[index - 1]):
+                boundaries.append(index)
+            elif not lines[index - 1].strip() and not _DECORATOR_RE.match(line):
+                # Any unindented line after a blank line also starts a new block
+                boundaries.append(index)
+        boundaries = sorted(set(boundaries))
+        return [(start, end) for start, end in zip(boundaries, boundaries[1:] + [len(lines)])]
+
+    def _split_lines(self, lines: List[str], start: int, end: int) -> List[tuple]:
+        """Split an oversized segment into line windows that fit the budget"""
+        windows = []
+        window_start = start
+        window_tokens = 0
+        for index in range(start, end):
+            tokens = count_tokens(lines[index])
+            if index > window_start and window_tokens + tokens > self.max_tokens:
+                windows.append((window_start, index))
+                window_start, window_tokens = index, 0
+            window_tokens += tokens
+        windows.append((window_start, end))
+        return windows
+
+
+def issue_key(issue: Dict[str, Any]) -> tuple:
+    """Identity used to drop the same issue reported by two overlapping chunks"""
+    return (
+        str(issue.get("rule") or issue.get("title") or "").strip().lower(),
+        issue.get("lineNumber"),
+        str(issue.get("code") or "").strip()
+    )
+
+
+def merge_chunk_reviews(reviews: List[Dict[str, Any]], chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge per-chunk review data, remapping line numbers to the original file"""
+    issues = []
+    seen = set()
+    good_points: List[str] = []
+    recommendations: List[str] = []
+    weighted_score = 0.0
+    scored_lines = 0
+    overall_assessment: Dict[str, Any] = {}
+
+    for review, chunk in zip(reviews, chunks):
+        for issue in review.get("issues", []):
+            issue = dict(issue)
+            line_number = issue.get("lineNumber")
+            if isinstance(line_number, int) and line_number > 0:
+                issue["lineNumber"] = line_number + chunk["start_line"] - 1
+            key = issue_key(issue)
+            if key not in seen:
+                seen.add(key)
+                issues.append(issue)
+
+        for point in review.get("good_points", []):
+            if point not in good_points:
+                good_points.append(point)
+        for recommendation in review.get("recommendations", []):
+            if recommendation not in recommendations:
+                recommendations.append(recommendation)
+
+        score = review.get("overall_score")
+        if isinstance(score, (int, float)):
+            lines = chunk["end_line"] - chunk["start_line"] + 1
+            weighted_score += score * lines
+            scored_lines += lines
+        if not overall_assessment and review.get("overall_assessment"):
+            overall_assessment = review["overall_assessment"]
+
+    return {
+        "issues": issues,
+        "good_points": good_points,
+        "recommendations": recommendations,
+        "overall_score": round(weighted_score / scored_lines) if scored_lines else 0,
+        "overall_assessment": overall_assessment
+    }
@@ -1,22 +1,39 @@
 from langgraph.graph import StateGraph, END
-from langchain_openai import ChatOpenAI
-from langchain.schema import HumanMessage, SystemMessage
-from typing import Dict, List, Any, TypedDict
-import json
-import re
+from langchain.schema import AIMessage, HumanMessage, SystemMessage
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple, TypedDict
+import asyncio
+import time
 from config import Config
 from services.chroma_service import ChromaService
 from services.prompt_service import PromptService
+from services.review_cache import ReviewCache
+from services.similarity_cache import SimilarityCache
+from services.language_detector import LanguageDetector
+from services.stream_parser import IncrementalJSONParser
+from services.structured_output import StructuredOutput
+from services.code_chunker import CodeChunker, issue_key, merge_chunk_reviews
+from services.single_flight import SingleFlight
+from services.model_router import ModelRouter
+from services.output_budget import output_budget
+from services.token_counter import count_tokens
+from models import CodeReviewOutput, ReviewRule
 
 class CodeReviewState(TypedDict):
     code: str
     language: str
+    file_path: Optional[str]
     rules: List[Dict[str, Any]]
     review_results: List[Dict[str, Any]]
     positive_aspects: List[str]
     recommendations: List[str]
     overall_assessment: Dict[str, Any]
     current_step: str
+    cache_key: str
+    cache_hit: bool
+    summary_mode: Optional[str]
+    model_hint: Optional[str]
+    max_issues: int
+    metadata: Dict[str, Any]
     summary: str
     overall_score: int
     total_issues: int
@@ -24,15 +41,15 @@ class CodeReviewState(TypedDict):
     warning_count: int
 
 class CodeReviewService:
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model=Config.MODEL_NAME,
-            temperature=Config.TEMPERATURE,
-            max_tokens=Config.MAX_TOKENS,
-            api_key=Config.OPENAI_API_KEY,
-            base_url="https://aiportalapi.stu-platform.live/jpe",
-        )
-        self.chroma_service = ChromaService()
+    def __init__(self, chroma_service: Optional[ChromaService] = None, router: Optional[ModelRouter] = None):
+        self.router = router or ModelRouter()
+        self.chroma_service = chroma_service or ChromaService()
+        self.review_cache = ReviewCache() if Config.REVIEW_CACHE_ENABLED else None
+        self.similarity_cache = SimilarityCache() if Config.SIMILARITY_CACHE_ENABLED else None
+        self._summary_latency_ms: Optional[float] = None
+        self.language_detector = LanguageDetector()
+        self.code_chunker = CodeChunker()
+        self.single_flight = SingleFlight()
         self.prompts = self._create_prompts()
         self.graph = self._build_graph()
     
@@ -47,6 +64,7 @@ class CodeReviewService:
         # Add nodes
         workflow.add_node("detect_language", self._detect_language)
         workflow.add_node("search_rules", self._search_relevant_rules)
+        workflow.add_node("check_cache", self._check_cache)
         workflow.add_node("analyze_code", self._analyze_code)
         workflow.add_node("generate_summary", self._generate_summary)
         
@@ -55,109 +73,165 @@ class CodeReviewService:
         
         # Add edges
         workflow.add_edge("detect_language", "search_rules")
-        workflow.add_edge("search_rules", "analyze_code")
+        workflow.add_edge("search_rules", "check_cache")
+        workflow.add_conditional_edges(
+            "check_cache",
+            lambda state: "generate_summary" if state["cache_hit"] else "analyze_code",
+            {"generate_summary": "generate_summary", "analyze_code": "analyze_code"}
+        )
         workflow.add_edge("analyze_code", "generate_summary")
         workflow.add_edge("generate_summary", END)
         
         return workflow.compile()
     
-    def _detect_language(self, state: CodeReviewState) -> CodeReviewState:
-        """Detect programming language from code using AI"""
+    async def _detect_language(self, state: CodeReviewState) -> CodeReviewState:
+        """Detect programming language, consulting the LLM only for low-confidence cases"""
         code = state["code"]
         
-        try:
-            # Use AI to detect language
-            prompt = self.prompts["language_detection"].format(code=code)
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            detected_language = response.content.strip()
-            
-            # Fallback to pattern-based detection if AI fails
-            if not detected_language or detected_language.lower() == "unknown":
-                detected_language = self._fallback_language_detection(code)
-            
-            state["language"] = detected_language
-            state["current_step"] = "language_detected"
-            
-        except Exception as e:
-            print(f"Error in AI language detection: {e}")
-            # Fallback to pattern-based detection
-            detected_language = self._fallback_language_detection(code)
-            state["language"] = detected_language
-            state["current_step"] = "language_detected"
-        
-        return state
-    
-    def _fallback_language_detection(self, code: str) -> str:
-        """Fallback language detection using pattern matching"""
-        language_patterns = {
-            "Python": [
-                r"def\s+\w+\s*\(", r"import\s+\w+", r"from\s+\w+\s+import",
-                r"class\s+\w+", r"if\s+__name__\s*==\s*['\"]__main__['\"]"
-            ],
-            "JavaScript": [
-                r"function\s+\w+\s*\(", r"const\s+\w+", r"let\s+\w+", r"var\s+\w+",
-                r"console\.log", r"export\s+", r"import\s+"
-            ],
-            "TypeScript": [
-                r"interface\s+\w+", r"type\s+\w+", r":\s*\w+", r"<T>",
-                r"function\s+\w+<", r"const\s+\w+:\s*\w+"
-            ],
-            "Java": [
-                r"public\s+class\s+\w+", r"public\s+static\s+void\s+main",
-                r"import\s+java\.", r"System\.out\.println"
-            ],
-            "C++": [
-                r"#include\s*<", r"using\s+namespace\s+std", r"std::",
-                r"int\s+main\s*\(", r"cout\s*<<"
-            ],
-            "C#": [
-                r"using\s+System", r"namespace\s+\w+", r"public\s+class\s+\w+",
-                r"Console\.WriteLine", r"var\s+\w+"
-            ]
-        }
-        
-        detected_language = "Unknown"
-        max_matches = 0
+        detection = self.language_detector.detect(
+            code,
+            language=state["language"],
+            file_path=state.get("file_path")
+        )
+        detected_language = detection["language"]
+        source = detection["source"]
         
-        for lang, patterns in language_patterns.items():
-            matches = sum(1 for pattern in patterns if re.search(pattern, code))
-            if matches > max_matches:
-                max_matches = matches
-                detected_language = lang
+        if detection["confidence"] < Config.LANGUAGE_DETECTION_MIN_CONFIDENCE:
+            try:
+                # Use AI to detect language
+                prompt = self.prompts["language_detection"].format(code=code)
+                tier = self.router.choose("language_detection", hint=state.get("model_hint"))
+                result = await self.router.invoke(
+                    tier, [HumanMessage(content=prompt)], max_tokens=output_budget("language_detection")
+                )
+                self._record_llm_call(state, "language_detection", result)
+                llm_language = result["response"].content.strip()
+                
+                # Keep the classifier's guess if AI cannot decide
+                if llm_language and llm_language.lower() != "unknown":
+                    detected_language = llm_language
+                    source = "llm"
+                    
+            except Exception as e:
+                print(f"Error in AI language detection: {e}")
         
-        return detected_language
+        state["language"] = detected_language
+        state["metadata"]["language_source"] = source
+        state["current_step"] = "language_detected"
+        return state
     
-    def _search_relevant_rules(self, state: CodeReviewState) -> CodeReviewState:
+    async def _search_relevant_rules(self, state: CodeReviewState) -> CodeReviewState:
         """Search for relevant rules based on code and language"""
-        code = state["code"]
-        language = state["language"]
+        # Batch reviews look rules up once per language and pass them in
+        if not state["metadata"].get("rules_prefetched"):
+            state["rules"] = await self.find_rules(state["language"])
+        state["current_step"] = "rules_found"
+        return state
+    
+    async def find_rules(self, language: str) -> List[Dict[str, Any]]:
+        """Return the top rules for a language plus general coding standards"""
+        return (await self.find_rules_many([language]))[language]
+    
+    async def find_rules_many(self, languages: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Return ``find_rules`` results for several languages from one vector search"""
+        languages = list(dict.fromkeys(languages))
+        queries = []
+        for language in languages:
+            # Create search query
+            query = f"code review rules for {language} programming language"
+            if language != "Unknown":
+                query += f" {language} best practices coding standards"
+            queries.append(query)
         
-        # Create search query
-        query = f"code review rules for {language} programming language"
-        if language != "Unknown":
-            query += f" {language} best practices coding standards"
+        # Search in ChromaDB; general coding rules apply to every language, so they are fetched once
+        results = await self.chroma_service.asearch_rules_many(
+            queries + ["general coding standards best practices"],
+            [10] * len(queries) + [5],
+            merge=False
+        )
+        general_rules = results[-1]
         
-        # Search in ChromaDB
-        relevant_rules = self.chroma_service.search_rules(query, n_results=10)
+        # Combine and deduplicate by rule chunk id, limited to the top 10
+        return {
+            language: ChromaService.merge_results([relevant_rules, general_rules])[:10]
+            for language, relevant_rules in zip(languages, results)
+        }
+    
+    async def prewarm_rules(self, languages: Optional[List[str]] = None) -> int:
+        """Run the rule searches for common languages so the next reviews hit the search cache"""
+        if languages is None:
+            languages = [
+                language.strip() for language in Config.RULE_CACHE_PREWARM_LANGUAGES.split(",") if language.strip()
+            ]
+        await self.find_rules_many(languages + ["Unknown"])
+        return len(languages)
+    
+    def resolve_language(self, code: str, language: Optional[str] = None,
+                         file_path: Optional[str] = None) -> Optional[str]:
+        """Return the language if it can be decided without the LLM, otherwise None"""
+        detection = self.language_detector.detect(code, language=language, file_path=file_path)
+        if detection["confidence"] < Config.LANGUAGE_DETECTION_MIN_CONFIDENCE:
+            return None
+        return detection["language"]
+    
+    async def _check_cache(self, state: CodeReviewState) -> CodeReviewState:
+        """Reuse a previous analysis of the same (or nearly the same) code, language and rule set"""
+        state["cache_hit"] = False
+        if self.review_cache is None and self.similarity_cache is None:
+            return state
         
-        # Also search for general coding rules
-        general_rules = self.chroma_service.search_rules("general coding standards best practices", n_results=5)
+        state["cache_key"] = ReviewCache.make_key(
+            code=state["code"],
+            language=state["language"],
+            rules=state["rules"],
+            prompt_version=PromptService.PROMPT_VERSION,
+            model_name=self.router.model_for(self._review_tier(state)),
+            max_issues=state["max_issues"]
+        )
+        cached = None
+        if self.review_cache is not None:
+            cached = await asyncio.to_thread(self.review_cache.get, state["cache_key"])
+            if cached is not None:
+                state["metadata"]["cache_source"] = "exact"
         
-        # Combine and deduplicate
-        all_rules = relevant_rules + general_rules
-        unique_rules = []
-        seen_docs = set()
+        # Near-duplicates (renames, reformatting, small edits) reuse a review of similar code
+        if cached is None and self.similarity_cache is not None:
+            match = await asyncio.to_thread(
+                self.similarity_cache.lookup, state["code"], self._cache_scope(state), state["language"]
+            )
+            if match is not None:
+                cached = match["value"]
+                state["metadata"]["cache_source"] = "similarity"
+                state["metadata"]["similarity_score"] = match["similarity"]
+                state["metadata"]["similarity_source_key"] = match["source_key"]
         
-        for rule in all_rules:
-            if rule['document'] not in seen_docs:
-                unique_rules.append(rule)
-                seen_docs.add(rule['document'])
+        if cached is not None:
+            state["review_results"] = cached.get("review_results", [])
+            state["positive_aspects"] = cached.get("positive_aspects", [])
+            state["overall_score"] = cached.get("overall_score", 0)
+            state["recommendations"] = cached.get("recommendations", [])
+            state["overall_assessment"] = cached.get("overall_assessment", {})
+            state["cache_hit"] = True
+            state["current_step"] = "analysis_cached"
         
-        state["rules"] = unique_rules[:10]  # Limit to top 10
-        state["current_step"] = "rules_found"
         return state
     
-    def _analyze_code(self, state: CodeReviewState) -> CodeReviewState:
+    def _cache_scope(self, state: CodeReviewState) -> str:
+        """Key shared by every review that may be reused for the same language, rules, prompt and model"""
+        return ReviewCache.make_key(
+            code="",
+            language=state["language"],
+            rules=state["rules"],
+            prompt_version=PromptService.PROMPT_VERSION,
+            model_name=self.router.model_for(self._review_tier(state)),
+            max_issues=state["max_issues"]
+        )
+    
+    def _review_tier(self, state: CodeReviewState) -> str:
+        """Model tier for the main review, decided once for the whole file"""
+        return self.router.choose("review", state["code"], state["language"], state.get("model_hint"))
+    
+    async def _analyze_code(self, state: CodeReviewState) -> CodeReviewState:
         """Analyze code against the rules and generate review results"""
         code = state["code"]
         language = state["language"]
@@ -166,64 +240,179 @@ class CodeReviewService:
         # Prepare context for LLM
         rules_text = "\n\n".join([rule['document'] for rule in rules])
         
+        tier = self._review_tier(state)
+        max_issues = state["max_issues"]
+        state["metadata"]["model_tier"] = tier
+        
         try:
-            # Use PromptTemplate for code review
-            prompt = self.prompts["code_review"].format(
-                language=language,
-                rules_text=rules_text,
-                code=code
-            )
+            if self.code_chunker.needs_chunking(code):
+                review_data = await self._analyze_chunks(state, language, rules_text, code, tier)
+            else:
+                result = await self._review_chunk(language, rules_text, code, tier=tier, max_issues=max_issues)
+                self._record_llm_call(state, "analyze_code", result)
+                self._flag_truncated(state, result)
+                review_data = result["data"]
+                if result["escalated"]:
+                    state["metadata"]["model_tier"] = result["tier"]
+                    state["metadata"]["escalated"] = True
             
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            
-            # Parse LLM response
-            review_data = self._parse_llm_response(response.content)
-            
-            state["review_results"] = review_data.get("issues", [])
+            state["review_results"] = self._cap_issues(state, review_data.get("issues", []))
             state["positive_aspects"] = review_data.get("good_points", [])
-            state["overall_score"] = review_data.get("overall_score", [])
+            state["overall_score"] = review_data.get("overall_score", 0)
             state["recommendations"] = review_data.get("recommendations", [])
             state["overall_assessment"] = review_data.get("overall_assessment", {})
             state["current_step"] = "analysis_complete"
             
+            cached = {
+                "review_results": state["review_results"],
+                "positive_aspects": state["positive_aspects"],
+                "overall_score": state["overall_score"],
+                "recommendations": state["recommendations"],
+                "overall_assessment": state["overall_assessment"]
+            }
+            # A review missing failed chunks or cut-off issues must not be replayed as a complete one
+            complete = not state["metadata"].get("failed_chunks") and not state["metadata"].get("output_truncated")
+            if self.review_cache is not None and state.get("cache_key") and complete:
+                await asyncio.to_thread(self.review_cache.set, state["cache_key"], cached)
+            if self.similarity_cache is not None and state.get("cache_key") and complete:
+                await asyncio.to_thread(
+                    self.similarity_cache.add, state["cache_key"], code, self._cache_scope(state), cached, language
+                )
+            
         except Exception as e:
+            # Fail the review rather than report an empty one once retries are exhausted
             print(f"Error in code analysis: {e}")
-            state["review_results"] = []
-            state["current_step"] = "analysis_error"
+            raise
         
         return state
     
-    def _generate_summary(self, state: CodeReviewState) -> CodeReviewState:
-        """Generate a summary of the review results using AI"""
+    async def _review_chunk(self, language: str, rules_text: str, code: str, start_line: int = 1,
+                            tier: str = "strong", max_issues: Optional[int] = None) -> Dict[str, Any]:
+        """Run the code review prompt on one piece of code, returning the router result.
+        
+        The output budget scales with the code's size and the issue cap; when
+        the response still hits it, the model is asked to continue with the
+        issues it has not reported yet, up to ``Config.LLM_MAX_CONTINUATIONS`` times.
+        """
+        max_issues = max_issues or Config.REVIEW_MAX_ISSUES
+        code_tokens = count_tokens(code)
+        # Use PromptTemplate for code review
+        prompt = self.prompts["code_review"].format(
+            language=language,
+            rules_text=rules_text,
+            code=code,
+            max_issues=max_issues
+        )
+        
+        # The start line lets streaming consumers remap issue line numbers per chunk;
+        # the response is validated against the same schema the provider was asked to follow
+        messages = [HumanMessage(content=prompt)]
+        config = {"metadata": {"chunk_start_line": start_line}}
+        result = await self.router.invoke(
+            tier,
+            messages,
+            schema=CodeReviewOutput,
+            config=config,
+            max_tokens=output_budget("code_review", code_tokens, max_issues)
+        )
+        return await continue_truncated_review(
+            self.router, self.prompts, result, messages, code_tokens, max_issues, config
+        )
+    
+    @staticmethod
+    def _flag_truncated(state: CodeReviewState, result: Dict[str, Any]) -> None:
+        """Mark the review incomplete when continuations ran out while the output was still cut off"""
+        if result["truncated"] and len(result["data"]["issues"]) < state["max_issues"]:
+            state["metadata"]["output_truncated"] = True
+    
+    def _cap_issues(self, state: CodeReviewState, issues: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Keep at most ``max_issues`` issues, critical ones first"""
+        kept, dropped = cap_issues(issues, state["max_issues"])
+        if dropped:
+            state["metadata"]["issues_dropped"] = dropped
+        return kept
+    
+    async def _analyze_chunks(self, state: CodeReviewState, language: str, rules_text: str, code: str,
+                              tier: str) -> Dict[str, Any]:
+        """Review a large file as concurrent token-bounded chunks and merge the results"""
+        chunks = self.code_chunker.split(code)
+        semaphore = asyncio.Semaphore(Config.REVIEW_CHUNK_CONCURRENCY)
+        
+        async def review(chunk):
+            async with semaphore:
+                return await self._review_chunk(
+                    language, rules_text, chunk["code"], chunk["start_line"], tier, state["max_issues"]
+                )
+        
+        results = await asyncio.gather(*(review(chunk) for chunk in chunks), return_exceptions=True)
+        
+        reviews = []
+        failed_chunks = []
+        for chunk, result in zip(chunks, results):
+            if isinstance(result, Exception):
+                print(f"Error reviewing lines {chunk['start_line']}-{chunk['end_line']}: {result}")
+                failed_chunks.append([chunk["start_line"], chunk["end_line"]])
+                reviews.append({})
+            else:
+                reviews.append(result["data"])
+                self._record_llm_call(state, "analyze_code", result)
+                self._flag_truncated(state, result)
+                if result["escalated"]:
+                    state["metadata"]["escalated"] = True
+        
+        if len(failed_chunks) == len(chunks):
+            raise results[0]
+        
+        state["metadata"]["chunks"] = len(chunks)
+        if failed_chunks:
+            state["metadata"]["failed_chunks"] = failed_chunks
+        return merge_chunk_reviews(reviews, chunks)
+    
+    async def _generate_summary(self, state: CodeReviewState) -> CodeReviewState:
+        """Generate a summary of the review results, using the LLM only when requested"""
         review_results = state["review_results"]
         language = state["language"]
+        summary_mode = state.get("summary_mode") or Config.SUMMARY_STRATEGY
         
         # Count issues by type
         critical_count = sum(1 for issue in review_results if issue.get("type") == "critical")
         warning_count = sum(1 for issue in review_results if issue.get("type") == "warning")
         total_issues = len(review_results)
         
-        try:
-            # Use AI to generate summary
-            prompt = self.prompts["summary_generation"].format(
-                language=language,
-                total_issues=total_issues,
-                critical_count=critical_count,
-                warning_count=warning_count
-            )
-            
-            response = self.llm.invoke([HumanMessage(content=prompt)])
-            summary = response.content.strip()
-            
-            # Fallback to template-based summary if AI fails
-            if not summary or len(summary) < 10:
-                summary = self._fallback_summary_generation(language, total_issues, critical_count, warning_count)
+        summary = ""
+        if summary_mode == "llm":
+            try:
+                # Use AI to generate summary
+                prompt = self.prompts["summary_generation"].format(
+                    language=language,
+                    total_issues=total_issues,
+                    critical_count=critical_count,
+                    warning_count=warning_count
+                )
                 
-        except Exception as e:
-            print(f"Error in AI summary generation: {e}")
-            # Fallback to template-based summary
+                started = time.perf_counter()
+                tier = self.router.choose("summary", hint=state.get("model_hint"))
+                result = await self.router.invoke(
+                    tier, [HumanMessage(content=prompt)], max_tokens=output_budget("summary_generation")
+                )
+                self._record_summary_latency((time.perf_counter() - started) * 1000)
+                self._record_llm_call(state, "generate_summary", result)
+                summary = result["response"].content.strip()
+                    
+            except Exception as e:
+                print(f"Error in AI summary generation: {e}")
+        
+        # Template summary is the default strategy and the fallback if the LLM fails
+        if not summary or len(summary) < 10:
             summary = self._fallback_summary_generation(language, total_issues, critical_count, warning_count)
         
+        state["metadata"]["summary_strategy"] = summary_mode
+        if summary_mode == "llm":
+            state["metadata"]["summary_llm_latency_saved_ms"] = None
+        else:
+            saved_ms, source = self._summary_latency_estimate()
+            state["metadata"]["summary_llm_latency_saved_ms"] = saved_ms
+            state["metadata"]["summary_llm_latency_source"] = source
         state["summary"] = summary
         state["total_issues"] = total_issues
         state["critical_count"] = critical_count
@@ -232,6 +421,33 @@ class CodeReviewService:
         
         return state
     
+    def _record_llm_call(self, state: CodeReviewState, node: str, result: Dict[str, Any]) -> None:
+        """Append one LLM call's tier, token usage (including cached prompt tokens) and latency to the metadata"""
+        state["metadata"].setdefault("llm_calls", []).append({
+            "node": node,
+            "tier": result["tier"],
+            **result["usage"],
+            "continuations": result.get("continuations", 0)
+        })
+    
+    def _record_summary_latency(self, latency_ms: float) -> None:
+        """Track a moving average of LLM summary latency to report what template mode saves"""
+        if self._summary_latency_ms is None:
+            self._summary_latency_ms = latency_ms
+        else:
+            self._summary_latency_ms = 0.8 * self._summary_latency_ms + 0.2 * latency_ms
+    
+    def _summary_latency_estimate(self) -> Tuple[float, str]:
+        """Estimated latency of the LLM summary this review skipped, and where the estimate came from.
+        
+        Uses the ``summary_generation`` calls measured in this process when there
+        are any, otherwise ``Config.SUMMARY_LLM_LATENCY_ESTIMATE_MS``. Tier-wide
+        averages are not used: they are dominated by much longer review outputs.
+        """
+        if self._summary_latency_ms is not None:
+            return round(self._summary_latency_ms, 1), "measured_summaries"
+        return float(Config.SUMMARY_LLM_LATENCY_ESTIMATE_MS), "configured_default"
+    
     def _fallback_summary_generation(self, language: str, total_issues: int, critical_count: int, warning_count: int) -> str:
         """Fallback summary generation using templates"""
         if total_issues == 0:
@@ -247,133 +463,226 @@ class CodeReviewService:
             
             return summary
     
-    def _parse_llm_response(self, response: str) -> Dict[str, Any]:
-        """Parse the LLM response to extract structured data"""
-        print(f"🔍 Parsing LLM response: {response[:200]}...")
+    async def review_code(self, code: str, language: str = None, file_path: Optional[str] = None,
+                          summary_mode: Optional[str] = None,
+                          rules: Optional[List[Dict[str, Any]]] = None,
+                          model_hint: Optional[str] = None,
+                          max_issues: Optional[int] = None) -> Dict[str, Any]:
+        """Main method to review code; identical concurrent reviews share one run.
+        
+        ``rules`` skips the rule search when the caller already looked them up
+        for the code's language (see ``find_rules``). ``max_issues`` caps the
+        issues returned (default ``Config.REVIEW_MAX_ISSUES``).
+        """
+        key = SingleFlight.make_key("review_code", code, language, file_path, summary_mode, model_hint, max_issues)
+        return await self.single_flight.do(
+            key, lambda: self._review_code(code, language, file_path, summary_mode, rules, model_hint, max_issues)
+        )
+    
+    async def _review_code(self, code: str, language: Optional[str], file_path: Optional[str],
+                           summary_mode: Optional[str], rules: Optional[List[Dict[str, Any]]] = None,
+                           model_hint: Optional[str] = None, max_issues: Optional[int] = None) -> Dict[str, Any]:
+        initial_state = self._initial_state(code, language, file_path, summary_mode, rules, model_hint, max_issues)
         
         try:
-            # Try to find JSON in the response
-            json_match = re.search(r'\{.*\}', response, re.DOTALL)
-            if json_match:
-                json_str = json_match.group()
-                print(f"📋 Found JSON: {json_str}")
-                parsed = json.loads(json_str)
-                print(f"✅ Successfully parsed JSON with {len(parsed.get('issues', []))} issues")
-                print(f"📈 Good points: {len(parsed.get('good_points', []))}")
-                print(f"💡 Recommendations: {len(parsed.get('recommendations', []))}")
-                return parsed
-        except json.JSONDecodeError as e:
-            print(f"❌ JSON parsing failed: {e}")
-            pass
-        
-        # Fallback: try to extract information manually
-        print("🔄 Using fallback parsing...")
-        issues = []
-        lines = response.split('\n')
-        current_issue = {}
-        
-        for line in lines:
-            line = line.strip()
-            if line.startswith('Title:'):
-                if current_issue:
-                    issues.append(current_issue)
-                try:
-                    current_issue = {'title': line.split(':', 1)[1].strip()}
-                except IndexError:
-                    current_issue = {'title': line}
-            elif line.startswith('Rule:') or line.startswith('Issue:'):
-                if current_issue:
-                    issues.append(current_issue)
-                try:
-                    current_issue = {'rule': line.split(':', 1)[1].strip()}
-                except IndexError:
-                    current_issue = {'rule': line}
-            elif line.startswith('Description:'):
-                try:
-                    current_issue['description'] = line.split(':', 1)[1].strip()
-                except IndexError:
-                    current_issue['description'] = line
-            elif line.startswith('Code:'):
-                try:
-                    current_issue['code'] = line.split(':', 1)[1].strip()
-                except IndexError:
-                    current_issue['code'] = line
-            elif line.startswith('Suggestion:'):
-                try:
-                    current_issue['suggestion'] = line.split(':', 1)[1].strip()
-                except IndexError:
-                    current_issue['suggestion'] = line
-            elif line.startswith('Line:'):
-                try:
-                    current_issue['lineNumber'] = int(line.split(':', 1)[1].strip())
-                except (IndexError, ValueError):
-                    current_issue['lineNumber'] = 0
-            elif line.startswith('Type:'):
-                try:
-                    type_val = line.split(':', 1)[1].strip().lower()
-                    current_issue['type'] = 'critical' if 'critical' in type_val else 'warning'
-                except (IndexError, AttributeError):
-                    current_issue['type'] = 'warning'
-        
-        if current_issue:
-            issues.append(current_issue)
-        
-        print(f"📊 Fallback parsing found {len(issues)} issues")
-        return {
-            "issues": issues,
-            "good_points": [],
-            "recommendations": [],
-            "overall_assessment": {}
-        }
+            final_state = await self.graph.ainvoke(initial_state)
+            return self._format_result(final_state)
+        except Exception as e:
+            return self._error_result(e, language)
     
-    def review_code(self, code: str, language: str = None) -> Dict[str, Any]:
-        """Main method to review code"""
-        initial_state = CodeReviewState(
+    async def stream_review(self, code: str, language: str = None, file_path: Optional[str] = None,
+                            summary_mode: Optional[str] = None,
+                            model_hint: Optional[str] = None,
+                            max_issues: Optional[int] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Review code, yielding events as graph steps finish and issues are parsed.
+        
+        Events are dicts with ``event`` and ``data`` keys: one per completed node
+        (named after its ``current_step``), one ``issue`` per review issue as soon
+        as it is parsed from the streamed LLM output, and a final ``result``.
+        """
+        initial_state = self._initial_state(
+            code, language, file_path, summary_mode, model_hint=model_hint, max_issues=max_issues
+        )
+        # Large files are reviewed as concurrent chunks, so keep one parser per LLM run
+        issue_parsers: Dict[str, IncrementalJSONParser] = {}
+        streamed_keys = set()
+        final_state = None
+        last_step = None
+        
+        try:
+            async for event in self.graph.astream_events(initial_state, version="v2"):
+                kind = event["event"]
+                node = event.get("metadata", {}).get("langgraph_node")
+                
+                if kind == "on_chat_model_stream" and node == "analyze_code":
+                    parser = issue_parsers.setdefault(event["run_id"], IncrementalJSONParser(array_keys=("issues",)))
+                    start_line = event["metadata"].get("chunk_start_line", 1)
+                    for _, raw_issue in parser.feed(event["data"]["chunk"].content):
+                        # Only stream issues that will also pass validation of the final response
+                        issue = StructuredOutput.validate_item(ReviewRule, raw_issue)
+                        if issue is None:
+                            continue
+                        if isinstance(issue.get("lineNumber"), int) and issue["lineNumber"] > 0:
+                            issue["lineNumber"] += start_line - 1
+                        if issue_key(issue) not in streamed_keys and len(streamed_keys) < initial_state["max_issues"]:
+                            streamed_keys.add(issue_key(issue))
+                            yield {"event": "issue", "data": issue}
+                
+                elif kind == "on_chain_end" and event["name"] == node and node in self.graph.nodes and node != "__start__":
+                    final_state = event["data"]["output"]
+                    # Cache hits and fallback parsing produce issues that were never streamed
+                    if final_state["current_step"] in ("analysis_cached", "analysis_complete"):
+                        for issue in final_state["review_results"]:
+                            if issue_key(issue) not in streamed_keys:
+                                streamed_keys.add(issue_key(issue))
+                                yield {"event": "issue", "data": issue}
+                    # check_cache leaves the step unchanged on a miss; report each step once
+                    if final_state["current_step"] != last_step:
+                        last_step = final_state["current_step"]
+                        yield {"event": last_step, "data": self._step_data(final_state)}
+            
+            yield {"event": "result", "data": self._format_result(final_state)}
+        except Exception as e:
+            yield {"event": "result", "data": self._error_result(e, language)}
+    
+    def _step_data(self, state: CodeReviewState) -> Dict[str, Any]:
+        """Small progress payload describing a finished graph step"""
+        step = state["current_step"]
+        if step == "language_detected":
+            return {"language": state["language"], "source": state["metadata"].get("language_source")}
+        if step == "rules_found":
+            return {"rule_count": len(state["rules"])}
+        if step in ("analysis_cached", "analysis_complete"):
+            return {"total_issues": len(state["review_results"]), "cache_hit": state.get("cache_hit", False)}
+        return {"total_issues": state["total_issues"]}
+    
+    def _initial_state(self, code: str, language: Optional[str], file_path: Optional[str],
+                       summary_mode: Optional[str], rules: Optional[List[Dict[str, Any]]] = None,
+                       model_hint: Optional[str] = None, max_issues: Optional[int] = None) -> CodeReviewState:
+        return CodeReviewState(
             code=code,
             language=language or "Unknown",
-            rules=[],
+            file_path=file_path,
+            rules=list(rules) if rules is not None else [],
             review_results=[],
             positive_aspects=[],
             recommendations=[],
             good_points=[],
             overall_assessment={},
             current_step="started",
+            cache_key="",
+            cache_hit=False,
+            summary_mode=summary_mode,
+            model_hint=model_hint,
+            max_issues=max(1, min(max_issues or Config.REVIEW_MAX_ISSUES, Config.REVIEW_MAX_ISSUES_LIMIT)),
+            metadata={"rules_prefetched": True} if rules is not None else {},
             summary="",
             overall_score=0,
             total_issues=0,
             critical_count=0,
             warning_count=0
         )
-        
-        try:
-            final_state = self.graph.invoke(initial_state)
-            
-            return {
-                "success": True,
-                "message": "Code review completed successfully",
-                "review_results": final_state["review_results"],
-                "positive_aspects": final_state.get("positive_aspects", []),
-                "recommendations": final_state.get("recommendations", []),
-                "overall_assessment": final_state.get("overall_assessment", {}),
-                "summary": final_state["summary"],
-                "language_detected": final_state["language"],
-                "total_issues": final_state["total_issues"],
-                "overall_score": final_state["overall_score"],
-                "critical_count": final_state["critical_count"],
-                "warning_count": final_state["warning_count"]
+    
+    def _format_result(self, final_state: CodeReviewState) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "message": "Code review completed successfully",
+            "review_results": final_state["review_results"],
+            "positive_aspects": final_state.get("positive_aspects", []),
+            "recommendations": final_state.get("recommendations", []),
+            "overall_assessment": final_state.get("overall_assessment", {}),
+            "summary": final_state["summary"],
+            "language_detected": final_state["language"],
+            "total_issues": final_state["total_issues"],
+            "overall_score": final_state["overall_score"],
+            "critical_count": final_state["critical_count"],
+            "warning_count": final_state["warning_count"],
+            "metadata": {
+                **final_state.get("metadata", {}),
+                "cache_hit": final_state.get("cache_hit", False)
             }
+        }
+    
+    def _error_result(self, error: Exception, language: Optional[str]) -> Dict[str, Any]:
+        return {
+            "success": False,
+            "message": f"Error during code review: {str(error)}",
+            "review_results": [],
+            "positive_aspects": [],
+            "recommendations": [],
+            "overall_assessment": {},
+            "summary": "Code review failed due to an error",
+            "language_detected": language or "Unknown",
+            "overall_score": 0,
+            "total_issues": 0,
+            "critical_count": 0,
+            "warning_count": 0
+        }
+
+
+async def continue_truncated_review(router: ModelRouter, prompts: Dict[str, Any], result: Dict[str, Any],
+                                    messages: List[Any], code_tokens: int, max_issues: int,
+                                    config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Ask for the issues a cut-off code review has not reported yet, up to ``Config.LLM_MAX_CONTINUATIONS`` times.
+
+    ``result`` is the router result of the ``code_review`` prompt sent as
+    ``messages``; the returned result merges every continuation and counts them
+    in ``continuations``.
+    """
+    result["continuations"] = 0
+    while result["truncated"] and result["continuations"] < Config.LLM_MAX_CONTINUATIONS:
+        remaining = max_issues - len(result["data"]["issues"])
+        if remaining <= 0:
+            break
+        # Resending the cut-off answer keeps the prompt prefix identical, so it is served from cache
+        messages = messages + [
+            AIMessage(content=result["response"].content),
+            HumanMessage(content=prompts["code_review_continuation"].format(remaining=remaining))
+        ]
+        try:
+            more = await router.invoke(
+                result["tier"],
+                messages,
+                schema=CodeReviewOutput,
+                config=config,
+                max_tokens=output_budget("code_review_continuation", code_tokens, remaining)
+            )
         except Exception as e:
-            return {
-                "success": False,
-                "message": f"Error during code review: {str(e)}",
-                "review_results": [],
-                "positive_aspects": [],
-                "recommendations": [],
-                "overall_assessment": {},
-                "summary": "Code review failed due to an error",
-                "language_detected": language or "Unknown",
-                "overall_score": 0,
-                "total_issues": 0,
-                "critical_count": 0,
-                "warning_count": 0
-            }
+            print(f"Error continuing truncated review: {e}")
+            break
+        result = merge_continuation(result, more)
+    return result
+
+
+def merge_continuation(result: Dict[str, Any], more: Dict[str, Any]) -> Dict[str, Any]:
+    """Add a continuation's new issues and token usage to the result it continues"""
+    data = result["data"]
+    seen = {issue_key(issue) for issue in data["issues"]}
+    for issue in more["data"]["issues"]:
+        if issue_key(issue) not in seen:
+            seen.add(issue_key(issue))
+            data["issues"].append(issue)
+    for field in ("good_points", "recommendations"):
+        data[field] += [item for item in more["data"][field] if item not in data[field]]
+    
+    usage = dict(result["usage"])
+    for field in ("input_tokens", "cached_input_tokens", "output_tokens", "latency_ms"):
+        usage[field] += more["usage"][field]
+    usage["latency_ms"] = round(usage["latency_ms"], 1)
+    usage["finish_reason"] = more["usage"]["finish_reason"]
+    return {
+        **result,
+        "data": data,
+        "escalated": result["escalated"] or more["escalated"],
+        "truncated": more["truncated"],
+        "continuations": result["continuations"] + 1,
+        "usage": usage
+    }
+
+
+def cap_issues(issues: List[Dict[str, Any]], max_issues: int) -> Tuple[List[Dict[str, Any]], int]:
+    """Keep at most ``max_issues`` issues, critical ones first; returns the kept issues and how many were dropped"""
+    if len(issues) <= max_issues:
+        return issues, 0
+    ranked = sorted(issues, key=lambda issue: issue.get("type") != "critical")
+    return ranked[:max_issues], len(issues) - max_issues
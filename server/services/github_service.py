@@ -2,6 +2,7 @@ import requests
 import base64
 from typing import Dict, List, Optional
 import re
+from services.language_detector import detect_language_from_path
 
 class GitHubService:
     def __init__(self, token: Optional[str] = None):
@@ -109,47 +110,4 @@ class GitHubService:
     
     def _detect_language(self, filename: str) -> str:
         """Detect programming language based on file extension"""
-        extension = filename.split(".")[-1].lower()
-        
-        language_map = {
-            "py": "Python",
-            "js": "JavaScript",
-            "ts": "TypeScript",
-            "jsx": "React JSX",
-            "tsx": "React TSX",
-            "java": "Java",
-            "cpp": "C++",
-            "c": "C",
-            "cs": "C#",
-            "php": "PHP",
-            "rb": "Ruby",
-            "go": "Go",
-            "rs": "Rust",
-            "swift": "Swift",
-            "kt": "Kotlin",
-            "scala": "Scala",
-            "r": "R",
-            "m": "Objective-C",
-            "mm": "Objective-C++",
-            "html": "HTML",
-            "css": "CSS",
-            "scss": "SCSS",
-            "sass": "Sass",
-            "sql": "SQL",
-            "sh": "Shell",
-            "bash": "Bash",
-            "zsh": "Zsh",
-            "fish": "Fish",
-            "ps1": "PowerShell",
-            "bat": "Batch",
-            "yml": "YAML",
-            "yaml": "YAML",
-            "json": "JSON",
-            "xml": "XML",
-            "toml": "TOML",
-            "ini": "INI",
-            "cfg": "Configuration",
-            "conf": "Configuration"
-        }
-        
-        return language_map.get(extension, "Unknown")
+        return detect_language_from_path(filename) or "Unknown"
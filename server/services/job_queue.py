@@ -0,0 +1,299 @@
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from config import Config
+
+class JobQueue:
+    """Durable SQLite-backed queue of review items drained by a pool of async workers.
+
+    Every item's state (pending, running, done, failed), attempt count and
+    result lives in SQLite, so progress survives a restart: items that were
+    running when the process stopped go back to pending on ``start()``.
+    Workers share one pacing clock so the queue as a whole never starts more
+    than ``rate_per_second`` items per second.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]],
+                 db_path: Optional[str] = None, workers: Optional[int] = None,
+                 rate_per_second: Optional[float] = None, max_attempts: Optional[int] = None,
+                 retry_delay: Optional[float] = None, poll_interval: Optional[float] = None):
+        self.handler = handler
+        self.db_path = db_path or Config.JOB_QUEUE_PATH
+        self.workers = workers if workers is not None else Config.JOB_QUEUE_WORKERS
+        self.rate_per_second = rate_per_second if rate_per_second is not None else Config.JOB_QUEUE_RATE_PER_SECOND
+        self.max_attempts = max_attempts if max_attempts is not None else Config.JOB_QUEUE_MAX_ATTEMPTS
+        self.retry_delay = retry_delay if retry_delay is not None else Config.JOB_QUEUE_RETRY_DELAY_SECONDS
+        self.poll_interval = poll_interval if poll_interval is not None else Config.JOB_QUEUE_POLL_SECONDS
+
+        self._lock = threading.Lock()
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pace_lock: Optional[asyncio.Lock] = None
+        self._next_start = 0.0
+
+        self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self._conn.executescript(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                request TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                completed_seq INTEGER,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, idx)
+            );
+            CREATE INDEX IF NOT EXISTS job_items_pending ON job_items (status, available_at);
+            CREATE INDEX IF NOT EXISTS job_items_completed ON job_items (job_id, completed_seq);"""
+        )
+        self._conn.commit()
+
+    async def start(self) -> int:
+        """Requeue items interrupted by a restart and start the worker pool"""
+        recovered = await asyncio.to_thread(self._recover)
+        if recovered:
+            print(f"🔁 Requeued {recovered} interrupted job items")
+        self._wakeup = asyncio.Event()
+        self._pace_lock = asyncio.Lock()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        return recovered
+
+    async def stop(self) -> None:
+        """Cancel the workers; their running items are requeued on the next start"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, items: List[Dict[str, Any]]) -> str:
+        """Persist a job of review items and return its id"""
+        job_id = uuid.uuid4().hex
+        await asyncio.to_thread(self._insert_job, job_id, items)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return progress counts for a job, or None if it does not exist"""
+        return await asyncio.to_thread(self._job_status, job_id)
+
+    async def get_results(self, job_id: str, after: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Return finished items in completion order, starting after sequence number ``after``"""
+        return await asyncio.to_thread(self._completed_items, job_id, after, limit)
+
+    async def stream_results(self, job_id: str, after: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Yield finished items as they complete, then a final ``job_complete`` event.
+
+        Each item carries its ``seq``; reconnecting with ``after`` set to the
+        last seen value resumes the stream without duplicates.
+        """
+        completed = None
+        while True:
+            items = await self.get_results(job_id, after)
+            for item in items:
+                after = item["seq"]
+                yield {"event": "item", "data": item}
+            if items:
+                continue
+            if completed is not None:
+                yield {"event": "job_complete", "data": completed}
+                return
+
+            job = await self.get_job(job_id)
+            if job is None:
+                yield {"event": "error", "data": {"message": f"Job '{job_id}' not found"}}
+                return
+            if job["status"] == "completed":
+                # The last items may have finished after the read above; drain them before closing
+                completed = job
+                continue
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue-wide item counts and worker settings"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM job_items GROUP BY status").fetchall()
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0, **dict(rows)}
+        return {
+            **counts,
+            "workers": len(self._tasks),
+            "rate_per_second": self.rate_per_second
+        }
+
+    async def _worker(self) -> None:
+        while True:
+            try:
+                item = await asyncio.to_thread(self._claim)
+                if item is None:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                await self._pace()
+                await self._process(item)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error in job queue worker: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _pace(self) -> None:
+        """Space item starts 1 / rate_per_second apart across all workers"""
+        if self.rate_per_second <= 0:
+            return
+        async with self._pace_lock:
+            now = time.monotonic()
+            start_at = max(now, self._next_start)
+            self._next_start = start_at + 1 / self.rate_per_second
+        if start_at > now:
+            await asyncio.sleep(start_at - now)
+
+    async def _process(self, item: Dict[str, Any]) -> None:
+        try:
+            result = await self.handler(item["request"])
+            error = None if result.get("success") else result.get("message") or "Review failed"
+        except Exception as e:
+            result, error = None, str(e)
+
+        if error is None:
+            await asyncio.to_thread(self._finish, item, "done", result, None)
+        elif item["attempts"] >= self.max_attempts:
+            print(f"Job {item['job_id']} item {item['idx']} failed after {item['attempts']} attempts: {error}")
+            await asyncio.to_thread(self._finish, item, "failed", result, error)
+        else:
+            delay = self.retry_delay * (2 ** (item["attempts"] - 1))
+            await asyncio.to_thread(self._retry_later, item, error, delay)
+
+    def _recover(self) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE job_items SET status = 'pending', updated_at = ? WHERE status = 'running'",
+                (time.time(),)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def _insert_job(self, job_id: str, items: List[Dict[str, Any]]) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("INSERT INTO jobs (id, total, created_at) VALUES (?, ?, ?)", (job_id, len(items), now))
+            self._conn.executemany(
+                "INSERT INTO job_items (job_id, idx, request, available_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(job_id, index, json.dumps(item, ensure_ascii=False), now, now) for index, item in enumerate(items)]
+            )
+            self._conn.commit()
+
+    def _claim(self) -> Optional[Dict[str, Any]]:
+        """Mark the oldest available pending item as running and return it"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT i.job_id, i.idx, i.request, i.attempts FROM job_items i JOIN jobs j ON j.id = i.job_id "
+                "WHERE i.status = 'pending' AND i.available_at <= ? ORDER BY j.created_at, i.idx LIMIT 1",
+                (now,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE job_items SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                (now, row[0], row[1])
+            )
+            self._conn.commit()
+        return {"job_id": row[0], "idx": row[1], "request": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def _finish(self, item: Dict[str, Any], status: str, result: Optional[Dict[str, Any]], error: Optional[str]) -> None:
+        with self._lock:
+            seq = self._conn.execute(
+                "SELECT COALESCE(MAX(completed_seq), 0) + 1 FROM job_items WHERE job_id = ?", (item["job_id"],)
+            ).fetchone()[0]
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = ?, completed_seq = ?, updated_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                (status, json.dumps(result, ensure_ascii=False) if result is not None else None, error,
+                 seq, time.time(), item["job_id"], item["idx"])
+            )
+            self._conn.commit()
+
+    def _retry_later(self, item: Dict[str, Any], error: str, delay: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET status = 'pending', error = ?, available_at = ?, updated_at = ? "
+                "WHERE job_id = ? AND idx = ?",
+                (error, now + delay, now, item["job_id"], item["idx"])
+            )
+            self._conn.commit()
+
+    def _job_status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._conn.execute("SELECT total, created_at FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*), SUM(attempts), SUM(MAX(attempts - 1, 0)) FROM job_items "
+                "WHERE job_id = ? GROUP BY status",
+                (job_id,)
+            ).fetchall()
+            updated_at = self._conn.execute(
+                "SELECT MAX(updated_at) FROM job_items WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        attempts = retries = 0
+        for status, count, status_attempts, status_retries in rows:
+            counts[status] = count
+            attempts += status_attempts or 0
+            retries += status_retries or 0
+        finished = counts["done"] + counts["failed"]
+        if finished == job[0]:
+            status = "completed"
+        elif finished or counts["running"] or attempts:
+            status = "running"
+        else:
+            status = "queued"
+
+        return {
+            "job_id": job_id,
+            "status": status,
+            "total": job[0],
+            **counts,
+            "progress": round(finished / job[0], 4) if job[0] else 1.0,
+            "retries": retries,
+            "created_at": job[1],
+            "updated_at": updated_at or job[1]
+        }
+
+    def _completed_items(self, job_id: str, after: int, limit: int) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT idx, status, attempts, result, error, completed_seq FROM job_items "
+                "WHERE job_id = ? AND completed_seq > ? ORDER BY completed_seq LIMIT ?",
+                (job_id, after, limit)
+            ).fetchall()
+        return [
+            {
+                "index": idx,
+                "status": status,
+                "attempts": attempts,
+                "result": json.loads(result) if result else None,
+                "error": error,
+                "seq": seq
+            }
+            for idx, status, attempts, result, error, seq in rows
+        ]
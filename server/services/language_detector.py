@@ -0,0 +1,202 @@
+from typing import Dict, Any, Optional, Tuple
+import os
+import re
+
+LANGUAGE_EXTENSIONS = {
+    "py": "Python",
+    "js": "JavaScript",
+    "ts": "TypeScript",
+    "jsx": "React JSX",
+    "tsx": "React TSX",
+    "java": "Java",
+    "cpp": "C++",
+    "c": "C",
+    "cs": "C#",
+    "php": "PHP",
+    "rb": "Ruby",
+    "go": "Go",
+    "rs": "Rust",
+    "swift": "Swift",
+    "kt": "Kotlin",
+    "scala": "Scala",
+    "r": "R",
+    "m": "Objective-C",
+    "mm": "Objective-C++",
+    "html": "HTML",
+    "css": "CSS",
+    "scss": "SCSS",
+    "sass": "Sass",
+    "sql": "SQL",
+    "sh": "Shell",
+    "bash": "Bash",
+    "zsh": "Zsh",
+    "fish": "Fish",
+    "ps1": "PowerShell",
+    "bat": "Batch",
+    "yml": "YAML",
+    "yaml": "YAML",
+    "json": "JSON",
+    "xml": "XML",
+    "toml": "TOML",
+    "ini": "INI",
+    "cfg": "Configuration",
+    "conf": "Configuration"
+}
+
+LANGUAGE_FILENAMES = {
+    "dockerfile": "Dockerfile",
+    "makefile": "Makefile"
+}
+
+SHEBANG_INTERPRETERS = {
+    "python": "Python",
+    "node": "JavaScript",
+    "deno": "TypeScript",
+    "ts-node": "TypeScript",
+    "ruby": "Ruby",
+    "php": "PHP",
+    "perl": "Perl",
+    "sh": "Shell",
+    "bash": "Bash",
+    "zsh": "Zsh",
+    "fish": "Fish",
+    "pwsh": "PowerShell"
+}
+
+# Modeline file types that do not match a LANGUAGE_EXTENSIONS key
+MODELINE_LANGUAGES = {
+    "python": "Python",
+    "javascript": "JavaScript",
+    "typescript": "TypeScript",
+    "java": "Java",
+    "ruby": "Ruby",
+    "rust": "Rust",
+    "c++": "C++",
+    "csharp": "C#",
+    "objc": "Objective-C",
+    "kotlin": "Kotlin",
+    "perl": "Perl"
+}
+
+LANGUAGE_PATTERNS = {
+    "Python": [
+        r"def\s+\w+\s*\(", r"import\s+\w+", r"from\s+\w+\s+import",
+        r"class\s+\w+", r"if\s+__name__\s*==\s*['\"]__main__['\"]"
+    ],
+    "JavaScript": [
+        r"function\s+\w+\s*\(", r"const\s+\w+", r"let\s+\w+", r"var\s+\w+",
+        r"console\.log", r"export\s+", r"import\s+"
+    ],
+    "TypeScript": [
+        r"interface\s+\w+", r"type\s+\w+", r":\s*\w+", r"<T>",
+        r"function\s+\w+<", r"const\s+\w+:\s*\w+"
+    ],
+    "Java": [
+        r"public\s+class\s+\w+", r"public\s+static\s+void\s+main",
+        r"import\s+java\.", r"System\.out\.println"
+    ],
+    "C++": [
+        r"#include\s*<", r"using\s+namespace\s+std", r"std::",
+        r"int\s+main\s*\(", r"cout\s*<<"
+    ],
+    "C#": [
+        r"using\s+System", r"namespace\s+\w+", r"public\s+class\s+\w+",
+        r"Console\.WriteLine", r"var\s+\w+"
+    ]
+}
+
+_SHEBANG_RE = re.compile(r"^#!\s*(\S+)(?:\s+(\S+))?")
+_VIM_MODELINE_RE = re.compile(r"vim?:.*?\b(?:ft|filetype|syntax)=([\w+#-]+)")
+_EMACS_MODELINE_RE = re.compile(r"-\*-.*?(?:mode:\s*)?([\w+#-]+)\s*(?:;.*)?-\*-", re.IGNORECASE)
+
+
+def detect_language_from_path(file_path: Optional[str]) -> Optional[str]:
+    """Map a file name to a language using its extension or well-known name"""
+    if not file_path:
+        return None
+    filename = os.path.basename(file_path).lower()
+    if filename in LANGUAGE_FILENAMES:
+        return LANGUAGE_FILENAMES[filename]
+    if "." not in filename:
+        return None
+    return LANGUAGE_EXTENSIONS.get(filename.rsplit(".", 1)[-1])
+
+
+class LanguageDetector:
+    """Resolve a snippet's language with the cheapest tier that is confident enough.
+
+    Tiers run in order: explicit request language, file extension, shebang,
+    editor modeline, then a local pattern classifier. Callers decide whether a
+    low-confidence classifier result is worth an LLM call.
+    """
+
+    def detect(self, code: str, language: Optional[str] = None, file_path: Optional[str] = None) -> Dict[str, Any]:
+        """Return the detected language, the tier that decided it and its confidence"""
+        if language and language.lower() != "unknown":
+            return self._result(language, "request", 1.0)
+
+        from_path = detect_language_from_path(file_path)
+        if from_path:
+            return self._result(from_path, "extension", 1.0)
+
+        from_shebang = self.detect_from_shebang(code)
+        if from_shebang:
+            return self._result(from_shebang, "shebang", 0.95)
+
+        from_modeline = self.detect_from_modeline(code)
+        if from_modeline:
+            return self._result(from_modeline, "modeline", 0.95)
+
+        classified, confidence = self.classify(code)
+        return self._result(classified, "classifier", confidence)
+
+    def detect_from_shebang(self, code: str) -> Optional[str]:
+        """Read the interpreter from a leading #! line"""
+        first_line = code.lstrip("\ufeff").split("\n", 1)[0].strip()
+        match = _SHEBANG_RE.match(first_line)
+        if not match:
+            return None
+
+        interpreter = os.path.basename(match.group(1))
+        if interpreter == "env" and match.group(2):
+            interpreter = match.group(2)
+        interpreter = re.sub(r"[\d.]+$", "", interpreter)
+        return SHEBANG_INTERPRETERS.get(interpreter)
+
+    def detect_from_modeline(self, code: str) -> Optional[str]:
+        """Read a vim or emacs modeline from the first or last few lines"""
+        lines = code.splitlines()
+        for line in lines[:5] + lines[-5:]:
+            match = _VIM_MODELINE_RE.search(line) or _EMACS_MODELINE_RE.search(line)
+            if match:
+                file_type = match.group(1).lower()
+                language = MODELINE_LANGUAGES.get(file_type) or LANGUAGE_EXTENSIONS.get(file_type)
+                if language:
+                    return language
+        return None
+
+    def classify(self, code: str) -> Tuple[str, float]:
+        """Score the code against per-language patterns.
+
+        Confidence grows with the margin over the runner-up and with the
+        number of matched patterns, so a single stray match stays low.
+        """
+        scores = [
+            (lang, sum(1 for pattern in patterns if re.search(pattern, code)))
+            for lang, patterns in LANGUAGE_PATTERNS.items()
+        ]
+        best_language, best_score = "Unknown", 0
+        for lang, score in scores:
+            if score > best_score:
+                best_language, best_score = lang, score
+        if best_score == 0:
+            return "Unknown", 0.0
+
+        runner_up = max((score for lang, score in scores if lang != best_language), default=0)
+        margin = (best_score - runner_up) / best_score
+        support = min(1.0, best_score / 3)
+        return best_language, round(margin * support, 2)
+
+    @staticmethod
+    def _result(language: str, source: str, confidence: float) -> Dict[str, Any]:
+        return {"language": language, "source": source, "confidence": confidence}
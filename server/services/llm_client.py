@@ -0,0 +1,149 @@
+from langchain_core.messages import AIMessage
+from langchain_openai import ChatOpenAI
+from typing import Any, Dict, List, Optional, Tuple
+import threading
+import httpx
+import openai
+from config import Config
+from services.llm_limiter import AdaptiveLimiter
+
+
+class LLMClientRegistry:
+    """Process-wide registry of chat model clients sharing one pooled HTTP transport.
+
+    Every service asks the registry for its ``ChatOpenAI`` instead of building
+    its own, so all LLM traffic reuses the same keep-alive connections (and
+    TLS sessions) to the API host. Clients with identical settings are shared.
+    Calls made through ``ainvoke`` also share one adaptive concurrency limiter.
+    """
+
+    _lock = threading.Lock()
+    _clients: Dict[Tuple, ChatOpenAI] = {}
+    _http_client: Optional[httpx.Client] = None
+    _http_async_client: Optional[httpx.AsyncClient] = None
+    requests_total = 0
+    limiter = AdaptiveLimiter()
+
+    @classmethod
+    def get_llm(cls, model: Optional[str] = None, temperature: Optional[float] = None,
+                max_tokens: Optional[int] = None, **kwargs: Any) -> ChatOpenAI:
+        """Return the shared client for these settings, creating it on first use"""
+        model = model or Config.MODEL_NAME
+        temperature = Config.TEMPERATURE if temperature is None else temperature
+        max_tokens = max_tokens or Config.MAX_TOKENS
+        key = (model, temperature, max_tokens, tuple(sorted(kwargs.items())))
+
+        with cls._lock:
+            client = cls._clients.get(key)
+            if client is None:
+                http_client, http_async_client = cls._http_clients()
+                client = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    api_key=Config.OPENAI_API_KEY,
+                    base_url=Config.OPENAI_BASE_URL,
+                    timeout=Config.LLM_TIMEOUT_SECONDS,
+                    # Retries are handled by the shared limiter so they respect its backoff
+                    max_retries=0,
+                    http_client=http_client,
+                    http_async_client=http_async_client,
+                    **kwargs
+                )
+                cls._clients[key] = client
+            return client
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        """Return connection pool utilisation for the shared transports"""
+        with cls._lock:
+            return {
+                "clients": len(cls._clients),
+                "requests_total": cls.requests_total,
+                "max_connections": Config.LLM_MAX_CONNECTIONS,
+                "max_keepalive_connections": Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                "keepalive_expiry_seconds": Config.LLM_KEEPALIVE_EXPIRY_SECONDS,
+                "async_pool": cls._pool_stats(cls._http_async_client),
+                "sync_pool": cls._pool_stats(cls._http_client)
+            }
+
+    @classmethod
+    async def aclose(cls) -> None:
+        """Close the shared transports; the next get_llm() call opens fresh ones"""
+        with cls._lock:
+            http_client, http_async_client = cls._http_client, cls._http_async_client
+            cls._clients.clear()
+            cls._http_client = None
+            cls._http_async_client = None
+        if http_async_client is not None:
+            await http_async_client.aclose()
+        if http_client is not None:
+            http_client.close()
+
+    @classmethod
+    def _http_clients(cls) -> Tuple[httpx.Client, httpx.AsyncClient]:
+        """Build the pooled transports once; callers hold the registry lock"""
+        if cls._http_async_client is None:
+            limits = httpx.Limits(
+                max_connections=Config.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=Config.LLM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=Config.LLM_KEEPALIVE_EXPIRY_SECONDS
+            )
+            timeout = httpx.Timeout(Config.LLM_TIMEOUT_SECONDS, connect=Config.LLM_CONNECT_TIMEOUT_SECONDS)
+            cls._http_client = httpx.Client(limits=limits, timeout=timeout)
+            cls._http_async_client = httpx.AsyncClient(
+                limits=limits,
+                timeout=timeout,
+                event_hooks={"request": [cls._on_request]}
+            )
+        return cls._http_client, cls._http_async_client
+
+    @classmethod
+    async def _on_request(cls, request: httpx.Request) -> None:
+        cls.requests_total += 1
+
+    @staticmethod
+    def _pool_stats(client: Optional[httpx.Client]) -> Dict[str, Any]:
+        """Count open, busy and idle connections in an httpx client's pool"""
+        pool = getattr(getattr(client, "_transport", None), "_pool", None)
+        if pool is None:
+            return {"connections": 0, "active": 0, "idle": 0}
+        connections = list(pool.connections)
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return {
+            "connections": len(connections),
+            "active": len(connections) - idle,
+            "idle": idle
+        }
+
+
+def get_llm(model: Optional[str] = None, temperature: Optional[float] = None,
+            max_tokens: Optional[int] = None, **kwargs: Any) -> ChatOpenAI:
+    """Shortcut for LLMClientRegistry.get_llm"""
+    return LLMClientRegistry.get_llm(model=model, temperature=temperature, max_tokens=max_tokens, **kwargs)
+
+
+async def ainvoke(llm: Any, messages: List[Any], **kwargs: Any) -> Any:
+    """Invoke a chat model through the shared limiter, retrying rate limits and transient errors"""
+    async def call():
+        try:
+            return await llm.ainvoke(messages, **kwargs)
+        except openai.LengthFinishReasonError as e:
+            # Structured output raises on a cut-off answer; return it so callers can repair or continue it
+            return _truncated_message(e.completion)
+    
+    return await LLMClientRegistry.limiter.run(call)
+
+
+def _truncated_message(completion: Any) -> AIMessage:
+    """Build the AIMessage ChatOpenAI would have returned for a completion stopped by max_tokens"""
+    usage = completion.usage.model_dump() if completion.usage else {}
+    return AIMessage(
+        content=completion.choices[0].message.content or "",
+        usage_metadata={
+            "input_tokens": usage.get("prompt_tokens", 0),
+            "output_tokens": usage.get("completion_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0)
+        },
+        response_metadata={"token_usage": usage, "model_name": completion.model, "finish_reason": "length"}
+    )
@@ -0,0 +1,185 @@
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import asyncio
+import random
+import time
+from config import Config
+
+# Status codes worth retrying: rate limiting, timeouts and transient server errors
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_ERRORS = ("APITimeoutError", "APIConnectionError", "TimeoutException", "TimeoutError", "ConnectError")
+
+
+class AdaptiveLimiter:
+    """Cap in-flight LLM calls with a limit that adapts AIMD-style.
+
+    Each success nudges the limit up by ``1 / limit`` (about one slot per
+    round of calls); a 429 or a call slower than ``latency_threshold``
+    multiplies it by ``decrease_factor``, at most once per ``cooldown``
+    seconds so a burst of 429s counts as one congestion signal. Failed calls
+    are retried with full-jitter exponential backoff, honouring ``Retry-After``.
+    """
+
+    def __init__(self, initial_limit: Optional[int] = None, min_limit: Optional[int] = None,
+                 max_limit: Optional[int] = None, latency_threshold: Optional[float] = None,
+                 max_retries: Optional[int] = None, backoff_base: Optional[float] = None,
+                 backoff_max: Optional[float] = None, decrease_factor: float = 0.5, cooldown: float = 1.0):
+        self.min_limit = min_limit if min_limit is not None else Config.LLM_MIN_CONCURRENCY
+        self.max_limit = max_limit if max_limit is not None else Config.LLM_MAX_CONCURRENCY
+        initial = initial_limit if initial_limit is not None else Config.LLM_INITIAL_CONCURRENCY
+        self.limit = float(max(self.min_limit, min(initial, self.max_limit)))
+        self.latency_threshold = latency_threshold if latency_threshold is not None else Config.LLM_LATENCY_THRESHOLD_SECONDS
+        self.max_retries = max_retries if max_retries is not None else Config.LLM_MAX_RETRIES
+        self.backoff_base = backoff_base if backoff_base is not None else Config.LLM_BACKOFF_BASE_SECONDS
+        self.backoff_max = backoff_max if backoff_max is not None else Config.LLM_BACKOFF_MAX_SECONDS
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._last_decrease = 0.0
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.retries = 0
+        self.rate_limited = 0
+        self.slow_calls = 0
+        self.max_queue_depth = 0
+
+    async def run(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``func`` under the limit, retrying retryable failures with backoff"""
+        self.calls += 1
+        attempt = 0
+        while True:
+            await self._acquire()
+            started = time.monotonic()
+            try:
+                result = await func()
+                error = None
+            except Exception as e:
+                error = e
+            finally:
+                self._release()
+
+            if error is None:
+                self._on_success(time.monotonic() - started)
+                return result
+
+            retryable, retry_after = self._classify(error)
+            if self._status(error) == 429:
+                self.rate_limited += 1
+                self._decrease()
+            if not retryable or attempt >= self.max_retries:
+                self.failures += 1
+                raise error
+            delay = retry_after if retry_after is not None else self._backoff(attempt)
+            attempt += 1
+            self.retries += 1
+            print(f"LLM call failed ({error.__class__.__name__}), retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the current limit, queue depth and retry counters"""
+        return {
+            "limit": int(self.limit),
+            "limit_exact": round(self.limit, 2),
+            "min_limit": self.min_limit,
+            "max_limit": self.max_limit,
+            "in_flight": self.in_flight,
+            "queue_depth": len(self._waiters),
+            "max_queue_depth": self.max_queue_depth,
+            "calls": self.calls,
+            "successes": self.successes,
+            "failures": self.failures,
+            "retries": self.retries,
+            "rate_limited": self.rate_limited,
+            "slow_calls": self.slow_calls
+        }
+
+    async def _acquire(self) -> None:
+        if self.in_flight < int(self.limit) and not self._waiters:
+            self.in_flight += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.max_queue_depth = max(self.max_queue_depth, len(self._waiters))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # A slot handed to a cancelled waiter must go to the next one
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            elif waiter in self._waiters:
+                # _wake() may already have dropped a waiter cancelled before its turn
+                self._waiters.remove(waiter)
+            raise
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self) -> None:
+        """Hand free slots to queued callers in arrival order"""
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _on_success(self, latency: float) -> None:
+        self.successes += 1
+        if latency > self.latency_threshold:
+            self.slow_calls += 1
+            self._decrease()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: a random delay up to the capped exponential step"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _classify(self, error: Exception) -> tuple:
+        """Return (retryable, Retry-After seconds or None) for an LLM client error"""
+        status = self._status(error)
+        if status is not None:
+            return status in _RETRYABLE_STATUS, self._retry_after(error)
+        return isinstance(error, asyncio.TimeoutError) or error.__class__.__name__ in _RETRYABLE_ERRORS, None
+
+    @staticmethod
+    def _status(error: Exception) -> Optional[int]:
+        status = getattr(error, "status_code", None)
+        if status is None:
+            status = getattr(getattr(error, "response", None), "status_code", None)
+        return status if isinstance(status, int) else None
+
+    def _retry_after(self, error: Exception) -> Optional[float]:
+        headers = getattr(getattr(error, "response", None), "headers", None)
+        if not headers:
+            return None
+        value = headers.get("retry-after-ms")
+        if value:
+            try:
+                return min(self.backoff_max, float(value) / 1000)
+            except ValueError:
+                pass
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(self.backoff_max, max(0.0, seconds))
@@ -1,32 +1,54 @@
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional
+import asyncio
+import time
+from config import Config
 from services.code_review_service import CodeReviewService
 from services.github_service import GitHubService
 from services.chroma_service import ChromaService
 from services.advanced_analysis_service import AdvancedAnalysisService
-from models import CodeReviewRequest, GitHubPRRequest, RuleUploadRequest, CodeReviewResponse, ReviewRule
+from services.llm_client import LLMClientRegistry
+from services.job_queue import JobQueue
+from services.structured_output import StructuredOutput
+from services.model_router import ModelRouter
+from models import (
+    CodeReviewRequest, BatchReviewRequest, ReviewJobRequest, GitHubPRRequest, RuleUploadRequest, CodeReviewResponse, ReviewRule,
+    RuleComplianceBatchRequest
+)
 
 class MainService:
     def __init__(self):
-        self.code_review_service = CodeReviewService()
-        self.github_service = GitHubService()
         self.chroma_service = ChromaService()
-        self.advanced_analysis_service = AdvancedAnalysisService()
+        self.model_router = ModelRouter()
+        self.code_review_service = CodeReviewService(chroma_service=self.chroma_service, router=self.model_router)
+        self.github_service = GitHubService()
+        self.advanced_analysis_service = AdvancedAnalysisService(router=self.model_router)
+        self.job_queue = JobQueue(self._review_job_item)
+        self._prewarm_task: Optional[asyncio.Task] = None
     
-    def upload_rules(self, request: RuleUploadRequest) -> Dict[str, Any]:
+    async def upload_rules(self, request: RuleUploadRequest) -> Dict[str, Any]:
         """Upload new review rules to the system"""
         try:
-            success = self.chroma_service.add_rules(
+            version = self.chroma_service.version
+            counts = await self.chroma_service.aadd_rules(
                 rules_text=request.rules_text,
                 rule_name=request.rule_name,
                 description=request.description
             )
             
-            if success:
+            if counts is not None:
+                # Re-uploading identical rules leaves the search cache valid
+                if self.chroma_service.version != version:
+                    self._schedule_rule_prewarm()
                 return {
                     "success": True,
-                    "message": f"Rules '{request.rule_name}' uploaded successfully",
+                    "message": (
+                        f"Rules '{request.rule_name}' uploaded successfully "
+                        f"({counts['embedded']} chunks embedded, {counts['skipped']} unchanged, "
+                        f"{counts['deleted']} removed)"
+                    ),
                     "rule_name": request.rule_name,
-                    "description": request.description
+                    "description": request.description,
+                    **counts
                 }
             else:
                 return {
@@ -39,60 +61,139 @@ class MainService:
                 "message": f"Error uploading rules: {str(e)}"
             }
     
-    def review_code_snippet(self, request: CodeReviewRequest) -> CodeReviewResponse:
+    async def review_code_snippet(self, request: CodeReviewRequest) -> CodeReviewResponse:
         """Review a code snippet"""
         try:
-            result = self.code_review_service.review_code(
+            result = await self.code_review_service.review_code(
                 code=request.code,
-                language=request.language
+                language=request.language,
+                file_path=request.file_path,
+                summary_mode=request.summary_mode,
+                model_hint=request.model_hint,
+                max_issues=request.max_issues
             )
             
-            # Convert to ReviewRule objects
-            review_rules = []
-            for issue in result.get("review_results", []):
-                review_rule = ReviewRule(
-                    rule=issue.get("rule", "Unknown"),
-                    title=issue.get("title", ""),
-                    description=issue.get("description", ""),
-                    code=issue.get("code", ""),
-                    suggestion=issue.get("suggestion", ""),
-                    lineNumber=issue.get("lineNumber", 0),
-                    type=issue.get("type", "warning")
-                )
-                review_rules.append(review_rule)
-            
-            return CodeReviewResponse(
-                success=result["success"],
-                message=result["message"],
-                review_results=review_rules,
-                positive_aspects=result.get("positive_aspects", []),
-                recommendations=result.get("recommendations", []),
-                overall_assessment=result.get("overall_assessment", {}),
-                summary=result["summary"],
-                language_detected=result["language_detected"],
-                overall_score=result["overall_score"],
-                total_issues=result["total_issues"],
-                critical_count=result["critical_count"],
-                warning_count=result["warning_count"]
-            )
+            return self._to_response(result)
         except Exception as e:
-            return CodeReviewResponse(
-                success=False,
-                message=f"Error during code review: {str(e)}",
-                review_results=[],
-                summary="Code review failed due to an error",
-                language_detected=request.language or "Unknown",
-                overall_score=0,
-                total_issues=0,
-                critical_count=0,
-                warning_count=0
-            )
+            return self._failed_response(e, request.language)
+    
+    async def stream_code_review(self, request: CodeReviewRequest) -> AsyncIterator[Dict[str, Any]]:
+        """Review a code snippet, yielding progress and issue events as they happen"""
+        async for event in self.code_review_service.stream_review(
+            code=request.code,
+            language=request.language,
+            file_path=request.file_path,
+            summary_mode=request.summary_mode,
+            model_hint=request.model_hint,
+            max_issues=request.max_issues
+        ):
+            if event["event"] == "result":
+                event = {"event": "result", "data": self._to_response(event["data"]).model_dump()}
+            yield event
     
-    def review_github_pr(self, request: GitHubPRRequest) -> Dict[str, Any]:
+    async def review_batch(self, request: BatchReviewRequest) -> Dict[str, Any]:
+        """Review many snippets concurrently, sharing rule lookups between items of one language"""
+        if len(request.items) > Config.BATCH_REVIEW_MAX_ITEMS:
+            return {
+                "success": False,
+                "message": f"Batch has {len(request.items)} items; the limit is {Config.BATCH_REVIEW_MAX_ITEMS}"
+            }
+        
+        started = time.perf_counter()
+        concurrency = max(1, min(request.concurrency or Config.BATCH_REVIEW_CONCURRENCY,
+                                 Config.BATCH_REVIEW_MAX_CONCURRENCY))
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        # Items whose language is known without the LLM get their rules from one batched search
+        languages = [
+            self.code_review_service.resolve_language(item.code, item.language, item.file_path)
+            for item in request.items
+        ]
+        distinct = sorted({language for language in languages if language})
+        try:
+            rules_by_language = await self.code_review_service.find_rules_many(distinct) if distinct else {}
+        except Exception as e:
+            print(f"Error looking up rules for batch: {e}")
+            rules_by_language = {}
+        
+        async def review(index: int, item: CodeReviewRequest) -> Dict[str, Any]:
+            async with semaphore:
+                item_started = time.perf_counter()
+                try:
+                    result = await self.code_review_service.review_code(
+                        code=item.code,
+                        language=item.language,
+                        file_path=item.file_path,
+                        summary_mode=item.summary_mode,
+                        model_hint=item.model_hint,
+                        max_issues=item.max_issues,
+                        rules=rules_by_language.get(languages[index])
+                    )
+                    response = self._to_response(result)
+                except Exception as e:
+                    response = self._failed_response(e, item.language)
+                return {
+                    "index": index,
+                    "file_path": item.file_path,
+                    "duration_ms": round((time.perf_counter() - item_started) * 1000, 1),
+                    "result": response.model_dump()
+                }
+        
+        results = await asyncio.gather(*(review(index, item) for index, item in enumerate(request.items)))
+        reviews = [entry["result"] for entry in results]
+        succeeded = sum(1 for review_result in reviews if review_result["success"])
+        
+        return {
+            "success": True,
+            "message": f"Reviewed {len(results)} snippets ({succeeded} succeeded)",
+            "total_items": len(results),
+            "succeeded": succeeded,
+            "failed": len(results) - succeeded,
+            "total_issues": sum(review_result["total_issues"] for review_result in reviews),
+            "critical_count": sum(review_result["critical_count"] for review_result in reviews),
+            "warning_count": sum(review_result["warning_count"] for review_result in reviews),
+            "concurrency": concurrency,
+            "rule_searches": len(distinct),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+            "results": results
+        }
+    
+    async def create_review_job(self, request: ReviewJobRequest) -> Dict[str, Any]:
+        """Queue review items for the background workers"""
+        if not request.items:
+            return {"success": False, "message": "A job needs at least one item"}
+        if len(request.items) > Config.JOB_QUEUE_MAX_ITEMS:
+            return {
+                "success": False,
+                "message": f"Job has {len(request.items)} items; the limit is {Config.JOB_QUEUE_MAX_ITEMS}"
+            }
+        
+        job_id = await self.job_queue.enqueue([item.model_dump() for item in request.items])
+        return {
+            "success": True,
+            "message": f"Queued {len(request.items)} items for review",
+            "job_id": job_id,
+            "total": len(request.items)
+        }
+    
+    async def get_review_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Get progress counts for a queued review job"""
+        return await self.job_queue.get_job(job_id)
+    
+    def stream_review_job_results(self, job_id: str, after: int = 0) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a job's finished items as they complete"""
+        return self.job_queue.stream_results(job_id, after)
+    
+    async def _review_job_item(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Review one queued item; the queue retries it if ``success`` is false"""
+        request = CodeReviewRequest(**item)
+        return (await self.review_code_snippet(request)).model_dump()
+    
+    async def review_github_pr(self, request: GitHubPRRequest) -> Dict[str, Any]:
         """Review code from a GitHub PR"""
         try:
             # Extract code from PR
-            code_changes = self.github_service.extract_code_from_pr(request.pr_url)
+            code_changes = await asyncio.to_thread(self.github_service.extract_code_from_pr, request.pr_url)
             
             if not code_changes:
                 return {
@@ -102,70 +203,199 @@ class MainService:
             
             # Review each file
             all_reviews = []
-            total_issues = 0
-            total_critical = 0
-            total_warnings = 0
-            
             for change in code_changes:
-                review_result = self.code_review_service.review_code(
+                review_result = await self.code_review_service.review_code(
                     code=change["content"],
-                    language=change["language"]
+                    language=change["language"],
+                    file_path=change["filename"]
                 )
-                
-                file_review = {
-                    "filename": change["filename"],
-                    "language": change["language"],
-                    "status": change["status"],
-                    "review": review_result,
-                    "additions": change["additions"],
-                    "deletions": change["deletions"]
-                }
-                
-                all_reviews.append(file_review)
-                total_issues += review_result.get("total_issues", 0)
-                total_critical += review_result.get("critical_count", 0)
-                total_warnings += review_result.get("warning_count", 0)
+                all_reviews.append(self._file_review(change, review_result))
             
-            # Generate overall summary
-            if total_issues == 0:
-                overall_summary = "✅ Excellent! No issues found across all files in the PR."
-            else:
-                overall_summary = f"🔍 PR review completed. Found {total_issues} total issue(s): {total_critical} critical and {total_warnings} warnings across {len(code_changes)} file(s)."
-                
-                if total_critical > 0:
-                    overall_summary += f" ⚠️ {total_critical} critical issue(s) should be addressed before merging."
-                
-                if total_warnings > 0:
-                    overall_summary += f" 💡 {total_warnings} warning(s) are recommendations for improvement."
+            return self._pr_result(request, code_changes, all_reviews)
             
+        except Exception as e:
             return {
-                "success": True,
-                "message": "GitHub PR review completed successfully",
-                "pr_url": request.pr_url,
-                "repository": request.repository,
-                "branch": request.branch,
-                "files_reviewed": len(code_changes),
-                "overall_summary": overall_summary,
-                "total_issues": total_issues,
-                "critical_count": total_critical,
-                "warning_count": total_warnings,
-                "file_reviews": all_reviews
+                "success": False,
+                "message": f"Error during GitHub PR review: {str(e)}"
             }
+    
+    async def stream_github_pr_review(self, request: GitHubPRRequest) -> AsyncIterator[Dict[str, Any]]:
+        """Review a GitHub PR, yielding per-file events and completions before the aggregate"""
+        try:
+            code_changes = await asyncio.to_thread(self.github_service.extract_code_from_pr, request.pr_url)
+            
+            if not code_changes:
+                yield {"event": "result", "data": {
+                    "success": False,
+                    "message": "No code changes found in the PR or failed to extract code"
+                }}
+                return
+            
+            yield {"event": "files_found", "data": {"files": [change["filename"] for change in code_changes]}}
+            
+            all_reviews = []
+            for change in code_changes:
+                async for event in self.code_review_service.stream_review(
+                    code=change["content"],
+                    language=change["language"],
+                    file_path=change["filename"]
+                ):
+                    if event["event"] == "result":
+                        file_review = self._file_review(change, event["data"])
+                        all_reviews.append(file_review)
+                        yield {"event": "file_complete", "data": file_review}
+                    else:
+                        yield {"event": event["event"], "data": {"filename": change["filename"], **event["data"]}}
+            
+            yield {"event": "result", "data": self._pr_result(request, code_changes, all_reviews)}
             
         except Exception as e:
-            return {
+            yield {"event": "result", "data": {
                 "success": False,
                 "message": f"Error during GitHub PR review: {str(e)}"
-            }
+            }}
+    
+    def _to_response(self, result: Dict[str, Any]) -> CodeReviewResponse:
+        """Convert a CodeReviewService result into the API response model"""
+        # Convert to ReviewRule objects
+        review_rules = []
+        for issue in result.get("review_results", []):
+            review_rule = ReviewRule(
+                rule=issue.get("rule", "Unknown"),
+                title=issue.get("title", ""),
+                description=issue.get("description", ""),
+                code=issue.get("code", ""),
+                suggestion=issue.get("suggestion", ""),
+                lineNumber=issue.get("lineNumber", 0),
+                type=issue.get("type", "warning")
+            )
+            review_rules.append(review_rule)
+        
+        return CodeReviewResponse(
+            success=result["success"],
+            message=result["message"],
+            review_results=review_rules,
+            positive_aspects=result.get("positive_aspects", []),
+            recommendations=result.get("recommendations", []),
+            overall_assessment=result.get("overall_assessment", {}),
+            summary=result["summary"],
+            language_detected=result["language_detected"],
+            overall_score=result["overall_score"],
+            total_issues=result["total_issues"],
+            critical_count=result["critical_count"],
+            warning_count=result["warning_count"],
+            metadata=result.get("metadata", {})
+        )
+    
+    def _failed_response(self, error: Exception, language: Optional[str]) -> CodeReviewResponse:
+        """Response for a review that raised before producing a result"""
+        return CodeReviewResponse(
+            success=False,
+            message=f"Error during code review: {str(error)}",
+            review_results=[],
+            summary="Code review failed due to an error",
+            language_detected=language or "Unknown",
+            overall_score=0,
+            total_issues=0,
+            critical_count=0,
+            warning_count=0
+        )
     
-    def get_all_rules(self) -> Dict[str, Any]:
-        """Get all uploaded rules"""
+    def _file_review(self, change: Dict[str, Any], review_result: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "filename": change["filename"],
+            "language": change["language"],
+            "status": change["status"],
+            "review": review_result,
+            "additions": change["additions"],
+            "deletions": change["deletions"]
+        }
+    
+    def _pr_result(self, request: GitHubPRRequest, code_changes: List[Dict[str, Any]],
+                   all_reviews: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Aggregate per-file reviews into the PR review response"""
+        total_issues = sum(file_review["review"].get("total_issues", 0) for file_review in all_reviews)
+        total_critical = sum(file_review["review"].get("critical_count", 0) for file_review in all_reviews)
+        total_warnings = sum(file_review["review"].get("warning_count", 0) for file_review in all_reviews)
+        
+        # Generate overall summary
+        if total_issues == 0:
+            overall_summary = "✅ Excellent! No issues found across all files in the PR."
+        else:
+            overall_summary = f"🔍 PR review completed. Found {total_issues} total issue(s): {total_critical} critical and {total_warnings} warnings across {len(code_changes)} file(s)."
+            
+            if total_critical > 0:
+                overall_summary += f" ⚠️ {total_critical} critical issue(s) should be addressed before merging."
+            
+            if total_warnings > 0:
+                overall_summary += f" 💡 {total_warnings} warning(s) are recommendations for improvement."
+        
+        return {
+            "success": True,
+            "message": "GitHub PR review completed successfully",
+            "pr_url": request.pr_url,
+            "repository": request.repository,
+            "branch": request.branch,
+            "files_reviewed": len(code_changes),
+            "overall_summary": overall_summary,
+            "total_issues": total_issues,
+            "critical_count": total_critical,
+            "warning_count": total_warnings,
+            "file_reviews": all_reviews
+        }
+    
+    def _schedule_rule_prewarm(self) -> None:
+        """Refill the rule search cache for common languages in the background after the rules change"""
+        if self._prewarm_task is not None and not self._prewarm_task.done():
+            self._prewarm_task.cancel()
+        self._prewarm_task = asyncio.create_task(self._prewarm_rules())
+    
+    async def _prewarm_rules(self) -> None:
         try:
-            rules = self.chroma_service.get_all_rules()
+            started = time.perf_counter()
+            count = await self.code_review_service.prewarm_rules()
+            print(f"🔥 Prewarmed rule search cache for {count} languages in {(time.perf_counter() - started) * 1000:.0f}ms")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error prewarming rule search cache: {e}")
+    
+    async def get_all_rules(self, limit: Optional[int] = None, offset: int = 0, rule_name: Optional[str] = None,
+                            language: Optional[str] = None, category: Optional[str] = None,
+                            include: Optional[List[str]] = None) -> Dict[str, Any]:
+        """Get one page of uploaded rules, optionally filtered by rule set, language or category"""
+        limit = Config.RULE_LIST_DEFAULT_LIMIT if limit is None else limit
+        if not 1 <= limit <= Config.RULE_LIST_MAX_LIMIT or offset < 0:
+            return {
+                "success": False,
+                "message": f"limit must be between 1 and {Config.RULE_LIST_MAX_LIMIT} and offset must not be negative",
+                "rules": []
+            }
+        unknown = [field for field in include or [] if field not in ("documents", "metadatas")]
+        if unknown:
+            return {
+                "success": False,
+                "message": f"Unknown include fields: {', '.join(unknown)}; use documents and/or metadatas",
+                "rules": []
+            }
+        
+        where = {
+            field: value
+            for field, value in (("rule_name", rule_name), ("language", language), ("category", category))
+            if value
+        }
+        try:
+            page = await self.chroma_service.aget_rules(limit, offset, where, include)
+            rules = page["rules"]
+            next_offset = offset + len(rules)
             return {
                 "success": True,
-                "message": f"Retrieved {len(rules)} rules",
-                "rules": rules
+                "message": f"Retrieved {len(rules)} of {page['total']} rules",
+                "rules": rules,
+                "total": page["total"],
+                "limit": limit,
+                "offset": offset,
+                "next_offset": next_offset if rules and next_offset < page["total"] else None
             }
         except Exception as e:
             return {
@@ -174,10 +404,10 @@ class MainService:
                 "rules": []
             }
     
-    def search_rules(self, query: str, n_results: int = 10) -> Dict[str, Any]:
+    async def search_rules(self, query: str, n_results: int = 10) -> Dict[str, Any]:
         """Search for specific rules"""
         try:
-            rules = self.chroma_service.search_rules(query, n_results)
+            rules = await self.chroma_service.asearch_rules(query, n_results)
             return {
                 "success": True,
                 "message": f"Found {len(rules)} rules matching '{query}'",
@@ -191,10 +421,10 @@ class MainService:
                 "rules": []
             }
     
-    def clear_rules(self) -> Dict[str, Any]:
+    async def clear_rules(self) -> Dict[str, Any]:
         """Clear all rules from the system"""
         try:
-            success = self.chroma_service.clear_rules()
+            success = await self.chroma_service.aclear_rules()
             if success:
                 return {
                     "success": True,
@@ -210,4 +440,72 @@ class MainService:
                 "success": False,
                 "message": f"Error clearing rules: {str(e)}"
             }
-  
\ No newline at end of file
+      
+    async def analyze_security(self, code: str, language: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze code for security vulnerabilities"""
+        return await self.advanced_analysis_service.analyze_security(code, language or "Unknown")
+    
+    async def analyze_performance(self, code: str, language: Optional[str] = None) -> Dict[str, Any]:
+        """Analyze code for performance issues"""
+        return await self.advanced_analysis_service.analyze_performance(code, language or "Unknown")
+    
+    async def comprehensive_analysis(self, code: str, language: Optional[str] = None) -> Dict[str, Any]:
+        """Perform comprehensive code analysis"""
+        return await self.advanced_analysis_service.comprehensive_analysis(code, language or "Unknown")
+    
+    async def analyze_rule_compliance(self, rule_text: str, code_snippet: str) -> Dict[str, Any]:
+        """Analyze how well code follows a specific rule"""
+        return await self.advanced_analysis_service.analyze_rule_compliance(rule_text, code_snippet)
+    
+    async def analyze_rule_compliance_batch(self, request: RuleComplianceBatchRequest) -> Dict[str, Any]:
+        """Check rules (given as text or stored rule ids) against many snippets in packed LLM calls"""
+        rule_count = len(request.rules) + len(request.rule_ids)
+        if not request.snippets or not rule_count:
+            return {"success": False, "message": "At least one rule and one snippet are required"}
+        if rule_count > Config.RULE_COMPLIANCE_MAX_RULES or len(request.snippets) > Config.RULE_COMPLIANCE_MAX_SNIPPETS:
+            return {
+                "success": False,
+                "message": f"Batch has {rule_count} rules and {len(request.snippets)} snippets; the limits are "
+                           f"{Config.RULE_COMPLIANCE_MAX_RULES} and {Config.RULE_COMPLIANCE_MAX_SNIPPETS}"
+            }
+        
+        rules = [{"id": None, "text": text} for text in request.rules]
+        if request.rule_ids:
+            stored = await self.chroma_service.aget_rules_by_ids(request.rule_ids)
+            if stored is None:
+                # A rule store failure is not the caller's mistake; let the endpoint answer 500
+                raise RuntimeError("Error looking up rule ids in the rule store")
+            documents = {rule["id"]: rule["document"] for rule in stored}
+            missing = [rule_id for rule_id in request.rule_ids if rule_id not in documents]
+            if missing:
+                return {"success": False, "message": f"Unknown rule ids: {', '.join(missing)}"}
+            rules += [{"id": rule_id, "text": documents[rule_id]} for rule_id in request.rule_ids]
+        
+        try:
+            result = await self.advanced_analysis_service.analyze_rule_compliance_batch(rules, request.snippets)
+        except Exception as e:
+            return {"success": False, "message": f"Error during rule compliance analysis: {str(e)}"}
+        result["message"] = (
+            "Rule compliance analysis completed" if result["success"] else "Rule compliance analysis failed"
+        )
+        return result
+    
+    async def get_metrics(self) -> Dict[str, Any]:
+        """Collect runtime metrics from the review services"""
+        review_cache = self.code_review_service.review_cache
+        similarity_cache = self.code_review_service.similarity_cache
+        return {
+            "success": True,
+            "review_cache": await asyncio.to_thread(review_cache.stats) if review_cache else {"enabled": False},
+            "similarity_cache": similarity_cache.stats() if similarity_cache else {"enabled": False},
+            "rule_search_cache": self.chroma_service.search_cache_stats(),
+            "single_flight": {
+                "review_code": self.code_review_service.single_flight.stats(),
+                "advanced_analysis": self.advanced_analysis_service.single_flight.stats()
+            },
+            "llm_pool": LLMClientRegistry.stats(),
+            "llm_limiter": LLMClientRegistry.limiter.stats(),
+            "job_queue": await asyncio.to_thread(self.job_queue.stats),
+            "structured_output": StructuredOutput.stats(),
+            "model_router": self.model_router.stats()
+        }
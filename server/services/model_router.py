@@ -0,0 +1,176 @@
+from typing import Any, Dict, List, Optional, Type
+import re
+import threading
+import time
+from pydantic import BaseModel
+from config import Config
+from services.llm_client import ainvoke, get_llm
+from services.structured_output import StructuredOutput, StructuredOutputError
+from services.token_counter import count_tokens
+
+TIERS = ("fast", "strong")
+
+# Nodes whose output is short and low-stakes enough for the fast model
+AUXILIARY_NODES = {"language_detection", "summary"}
+
+# Nodes that always use the strong model
+STRONG_NODES = {"security"}
+
+# Code touching credentials, dynamic execution, queries or deserialization deserves the strong model
+_SECURITY_SENSITIVE_RE = re.compile(
+    r"passw|secret|api[_-]?key|private[_-]?key|\beval\s*\(|\bexec\s*\(|subprocess|os\.system|"
+    r"\bSELECT\b[\s\S]+?\bFROM\b|innerHTML|dangerouslySetInnerHTML|pickle\.loads?|yaml\.load|Runtime\.getRuntime",
+    re.IGNORECASE
+)
+
+
+class ModelRouter:
+    """Pick a model tier per LLM call and escalate to the strong tier when the fast one fails.
+
+    Auxiliary nodes and small snippets go to the fast model; security
+    analysis, large inputs, security-sensitive code and languages listed in
+    ``Config.ROUTER_STRONG_LANGUAGES`` go to the strong model. A request
+    ``hint`` ("fast" or "strong") overrides the choice. Latency, token
+    (including provider prefix-cache hits) and escalation counters are kept
+    per tier.
+    """
+
+    def __init__(self):
+        self.models = {"fast": Config.FAST_MODEL_NAME or Config.MODEL_NAME, "strong": Config.MODEL_NAME}
+        self.fast_max_tokens = Config.ROUTER_FAST_MAX_TOKENS
+        self.strong_languages = {
+            language.strip().lower() for language in Config.ROUTER_STRONG_LANGUAGES.split(",") if language.strip()
+        }
+        self._lock = threading.Lock()
+        self._stats = {
+            tier: {"calls": 0, "failures": 0, "escalations": 0, "latency_ms_total": 0.0,
+                   "input_tokens": 0, "cached_input_tokens": 0, "output_tokens": 0}
+            for tier in TIERS
+        }
+
+    def choose(self, node: str, code: str = "", language: Optional[str] = None, hint: Optional[str] = None) -> str:
+        """Return the tier for a call to ``node`` with this input"""
+        if hint in TIERS:
+            return hint
+        if node in AUXILIARY_NODES:
+            return "fast"
+        if node in STRONG_NODES:
+            return "strong"
+        if language and language.lower() in self.strong_languages:
+            return "strong"
+        if _SECURITY_SENSITIVE_RE.search(code):
+            return "strong"
+        return "fast" if count_tokens(code) <= self.fast_max_tokens else "strong"
+
+    def model_for(self, tier: str) -> str:
+        """Model name configured for a tier"""
+        return self.models[tier]
+
+    def llm_for(self, tier: str) -> Any:
+        """Shared chat model client for a tier"""
+        return get_llm(model=self.models[tier])
+
+    async def invoke(self, tier: str, messages: List[Any], schema: Optional[Type[BaseModel]] = None,
+                     config: Optional[Dict[str, Any]] = None, max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Call the tier's model, escalating a failed fast call to the strong tier.
+
+        With ``schema`` the response is requested in and validated against that
+        model; a fast-tier response that fails validation is retried on the
+        strong tier. ``max_tokens`` overrides the client's output limit for this
+        call. Returns ``response``, ``data`` (validated dict or None), ``tier``
+        (the tier that answered), ``escalated``, ``truncated`` (the output hit
+        the token limit) and ``usage`` (model, input, cached input and output
+        tokens, latency).
+        """
+        try:
+            return await self._invoke_tier(tier, messages, schema, config, max_tokens, escalated=False)
+        except Exception as e:
+            if tier == "strong" or self.models["fast"] == self.models["strong"] or not self._should_escalate(e):
+                raise
+            with self._lock:
+                self._stats["fast"]["escalations"] += 1
+            reason = "invalid output" if isinstance(e, StructuredOutputError) else e.__class__.__name__
+            print(f"⬆️ Escalating to the strong model after fast model {reason}: {e}")
+            return await self._invoke_tier("strong", messages, schema, config, max_tokens, escalated=True)
+
+    @staticmethod
+    def _should_escalate(error: Exception) -> bool:
+        """Escalate on invalid output or a request the fast model rejects, not on rate limits or outages"""
+        if isinstance(error, StructuredOutputError):
+            return True
+        return getattr(error, "status_code", None) in (400, 404, 422)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return per-tier call, latency, token and escalation counters"""
+        with self._lock:
+            result = {}
+            for tier, counters in self._stats.items():
+                successes = counters["calls"] - counters["failures"]
+                result[tier] = {
+                    "model": self.models[tier],
+                    "calls": counters["calls"],
+                    "failures": counters["failures"],
+                    "escalations": counters["escalations"],
+                    "avg_latency_ms": round(counters["latency_ms_total"] / successes, 1) if successes else 0.0,
+                    "input_tokens": counters["input_tokens"],
+                    "cached_input_tokens": counters["cached_input_tokens"],
+                    "cache_hit_ratio": (
+                        round(counters["cached_input_tokens"] / counters["input_tokens"], 4)
+                        if counters["input_tokens"] else 0.0
+                    ),
+                    "output_tokens": counters["output_tokens"]
+                }
+            return result
+
+    async def _invoke_tier(self, tier: str, messages: List[Any], schema: Optional[Type[BaseModel]],
+                           config: Optional[Dict[str, Any]], max_tokens: Optional[int],
+                           escalated: bool) -> Dict[str, Any]:
+        llm = self.llm_for(tier)
+        if schema is not None:
+            llm = StructuredOutput.bind(llm, schema)
+        if max_tokens:
+            llm = llm.bind(max_tokens=max_tokens)
+
+        started = time.perf_counter()
+        try:
+            response = await ainvoke(llm, messages, config=config)
+            data = StructuredOutput.parse(response.content, schema) if schema is not None else None
+        except Exception:
+            with self._lock:
+                self._stats[tier]["calls"] += 1
+                self._stats[tier]["failures"] += 1
+            raise
+
+        usage = self._usage(response, tier, (time.perf_counter() - started) * 1000)
+        with self._lock:
+            counters = self._stats[tier]
+            counters["calls"] += 1
+            counters["latency_ms_total"] += usage["latency_ms"]
+            counters["input_tokens"] += usage["input_tokens"]
+            counters["cached_input_tokens"] += usage["cached_input_tokens"]
+            counters["output_tokens"] += usage["output_tokens"]
+        return {
+            "response": response,
+            "data": data,
+            "tier": tier,
+            "escalated": escalated,
+            "truncated": usage["finish_reason"] == "length",
+            "usage": usage
+        }
+
+    def _usage(self, response: Any, tier: str, latency_ms: float) -> Dict[str, Any]:
+        """Token usage of one call, including prompt tokens served from the provider's prefix cache"""
+        usage = getattr(response, "usage_metadata", None) or {}
+        cached = (usage.get("input_token_details") or {}).get("cache_read")
+        if cached is None:
+            # Older langchain-openai releases only expose the raw OpenAI usage block
+            token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+            cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        return {
+            "model": self.models[tier],
+            "input_tokens": usage.get("input_tokens", 0),
+            "cached_input_tokens": cached or 0,
+            "output_tokens": usage.get("output_tokens", 0),
+            "finish_reason": (getattr(response, "response_metadata", None) or {}).get("finish_reason"),
+            "latency_ms": round(latency_ms, 1)
+        }
@@ -0,0 +1,25 @@
+from typing import Optional
+from config import Config
+
+# Prompts whose answer has a small, known size regardless of input
+_FIXED_BUDGETS = {"language_detection": 16, "summary_generation": 300}
+
+# Prompts that answer with a list of findings, so an item cap bounds the output
+_LIST_PROMPTS = {
+    "code_review", "code_review_continuation", "security_analysis", "performance_analysis", "rule_compliance_batch"
+}
+
+
+def output_budget(prompt_name: str, input_tokens: int = 0, max_items: Optional[int] = None) -> int:
+    """Return the max output tokens for a prompt given the size of its variable input.
+
+    Short answers get a fixed budget; findings grow with the reviewed code and
+    are further bounded by ``max_items``. ``Config.MAX_TOKENS`` is the ceiling.
+    """
+    if prompt_name in _FIXED_BUDGETS:
+        return min(Config.MAX_TOKENS, _FIXED_BUDGETS[prompt_name])
+
+    budget = Config.OUTPUT_BUDGET_BASE_TOKENS + int(input_tokens * Config.OUTPUT_BUDGET_INPUT_RATIO)
+    if max_items is not None and prompt_name in _LIST_PROMPTS:
+        budget = min(budget, Config.OUTPUT_BUDGET_BASE_TOKENS + max_items * Config.OUTPUT_TOKENS_PER_ISSUE)
+    return max(1, min(Config.MAX_TOKENS, budget))
@@ -1,19 +1,24 @@
 from langchain.prompts import PromptTemplate
 from typing import Dict
+from config import Config
 
 class PromptService:
     """Service for managing all prompt templates used in the AI agent"""
     
+    # Bump whenever a template changes so cached reviews from older prompts are not reused
+    PROMPT_VERSION = "3"
+    
+    # Templates put static instructions first, then per-rule-set text, then per-request
+    # input, so the provider can reuse its cached prefix across requests
+    
     @staticmethod
     def get_prompts() -> Dict[str, PromptTemplate]:
         """Get all prompt templates"""
         return {
             "code_review": PromptTemplate(
                 input_variables=["language", "rules_text", "code"],
-                template="""You are an expert code reviewer. Analyze the following {language} code.
-
-Coding Rules:
-{rules_text}
+                partial_variables={"max_issues": str(Config.REVIEW_MAX_ISSUES)},
+                template="""You are an expert code reviewer. Analyze the code at the end of this message against the coding rules below.
 
 Return JSON with:
 1. Issues found (problems to fix)
@@ -45,15 +50,26 @@ Format:
     "overall_score": 80
 }}
 
+Coding Rules:
+{rules_text}
+
+Language: {language}
+Report at most {max_issues} issues, most severe first.
+
 Code to review:
 ```{language}
 {code}
 ```"""
             ),
             
+            "code_review_continuation": PromptTemplate(
+                input_variables=["remaining"],
+                template="""Your previous response was cut off by the output limit. Return the same JSON format again with only the issues you have not reported yet, at most {remaining}, most severe first. Leave good_points and recommendations empty."""
+            ),
+            
             "language_detection": PromptTemplate(
                 input_variables=["code"],
-                template="""Analyze the following code and identify the programming language. 
+                template="""Analyze the code at the end of this message and identify the programming language.
 
 Consider:
 - Syntax patterns and keywords
@@ -61,20 +77,15 @@ Consider:
 - Language-specific constructs
 - Common libraries and frameworks
 
-Code:
-{code}
+Return only the language name (e.g., Python, JavaScript, Java, C++, C#, TypeScript, Go, Rust, Swift, etc.). If you cannot determine the language with confidence, return "Unknown".
 
-Return only the language name (e.g., Python, JavaScript, Java, C++, C#, TypeScript, Go, Rust, Swift, etc.). If you cannot determine the language with confidence, return "Unknown"."""
+Code:
+{code}"""
             ),
             
             "summary_generation": PromptTemplate(
                 input_variables=["language", "total_issues", "critical_count", "warning_count"],
-                template="""Generate a concise, friendly summary of the code review results for {language} code.
-
-Review Statistics:
-- Total issues found: {total_issues}
-- Critical issues: {critical_count}
-- Warnings: {warning_count}
+                template="""Generate a concise, friendly summary of the code review results described at the end of this message.
 
 Generate a summary that:
 1. Acknowledges the completion of the review
@@ -83,36 +94,69 @@ Generate a summary that:
 4. Uses appropriate emojis for visual appeal
 5. Maintains a positive, encouraging tone
 
-Keep it concise (2-3 sentences) but helpful and actionable."""
+Keep it concise (2-3 sentences) but helpful and actionable.
+
+Language: {language}
+
+Review Statistics:
+- Total issues found: {total_issues}
+- Critical issues: {critical_count}
+- Warnings: {warning_count}"""
             ),
             
             "rule_analysis": PromptTemplate(
                 input_variables=["rule_text", "code_snippet"],
-                template="""Analyze how well the following code snippet follows the given coding rule.
+                template="""Analyze how well the code snippet at the end of this message follows the given coding rule.
+
+Evaluate:
+1. Does the code follow this rule? (Yes/No/Partially)
+2. If not, what specific violations exist?
+3. What would be the impact of not following this rule?
+4. How can the code be improved to better follow this rule?
+
+Provide a brief, focused analysis.
 
 Coding Rule:
 {rule_text}
 
 Code Snippet:
-{code_snippet}
+{code_snippet}"""
+            ),
+            
+            "rule_compliance_batch": PromptTemplate(
+                input_variables=["rules_text", "snippets_text"],
+                template="""You are an expert code reviewer. Check every code snippet at the end of this message against every coding rule listed before it.
 
-Evaluate:
-1. Does the code follow this rule? (Yes/No/Partially)
+For each rule and snippet pair decide:
+1. Does the snippet follow the rule? ("Yes", "No" or "Partially"; answer "Yes" when the rule does not apply to the snippet)
 2. If not, what specific violations exist?
-3. What would be the impact of not following this rule?
-4. How can the code be improved to better follow this rule?
+3. How can the snippet be changed to follow the rule? (empty when it already does)
+
+Return JSON with exactly one entry per rule and snippet pair, using the rule and snippet numbers shown in brackets:
+{{
+    "results": [
+        {{
+            "rule": rule_number,
+            "snippet": snippet_number,
+            "compliance": "Yes" or "No" or "Partially",
+            "violations": [
+                "Violation 1"
+            ],
+            "suggestion": "How to follow the rule"
+        }}
+    ]
+}}
+
+Coding Rules:
+{rules_text}
 
-Provide a brief, focused analysis."""
+Code Snippets:
+{snippets_text}"""
             ),
             
             "security_analysis": PromptTemplate(
                 input_variables=["language", "code"],
-                template="""You are a security expert specializing in {language} code analysis. Review the following code for security vulnerabilities.
-
-Code:
-```{language}
-{code}
-```
+                template="""You are a security expert specializing in code analysis. Review the code at the end of this message for security vulnerabilities.
 
 Focus on:
 1. Input validation and sanitization
@@ -136,17 +180,19 @@ Return findings in this format:
     ]
 }}
 
-If no security issues are found, return an empty security_issues array."""
-            ),
-            
-            "performance_analysis": PromptTemplate(
-                input_variables=["language", "code"],
-                template="""You are a performance optimization expert for {language} code. Analyze the following code for performance issues and optimization opportunities.
+If no security issues are found, return an empty security_issues array.
+
+Language: {language}
 
 Code:
 ```{language}
 {code}
-```
+```"""
+            ),
+            
+            "performance_analysis": PromptTemplate(
+                input_variables=["language", "code"],
+                template="""You are a performance optimization expert. Analyze the code at the end of this message for performance issues and optimization opportunities.
 
 Focus on:
 1. Algorithm efficiency and complexity
@@ -170,7 +216,14 @@ Return findings in this format:
     ]
 }}
 
-If no performance issues are found, return an empty performance_issues array."""
+If no performance issues are found, return an empty performance_issues array.
+
+Language: {language}
+
+Code:
+```{language}
+{code}
+```"""
             )
         }
     
@@ -0,0 +1,160 @@
+from collections import OrderedDict
+from typing import Dict, List, Any, Optional
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from config import Config
+
+class ReviewCache:
+    """Content-addressed cache for review results with an in-memory LRU tier and a SQLite tier"""
+
+    def __init__(self, max_entries: int = None, max_disk_entries: int = None, db_path: str = None):
+        self.max_entries = max_entries if max_entries is not None else Config.REVIEW_CACHE_SIZE
+        self.max_disk_entries = max_disk_entries if max_disk_entries is not None else Config.REVIEW_CACHE_DISK_SIZE
+        self.db_path = db_path or Config.REVIEW_CACHE_PATH
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.db_path:
+            try:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._conn.execute(
+                    """CREATE TABLE IF NOT EXISTS review_cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        last_access REAL NOT NULL
+                    )"""
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error opening review cache database: {e}")
+                self._conn = None
+
+    @staticmethod
+    def make_key(code: str, language: str, rules: List[Dict[str, Any]], prompt_version: str, model_name: str,
+                 max_issues: Optional[int] = None) -> str:
+        """Build the content hash that identifies a review"""
+        payload = json.dumps({
+            "code": code,
+            "language": language,
+            "rules": [rule.get("document", "") for rule in rules],
+            "prompt_version": prompt_version,
+            "model": model_name,
+            "max_issues": max_issues
+        }, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up a cached review, promoting disk hits into memory"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return self._entries[key]
+
+            value = self._disk_get(key)
+            if value is None:
+                self.misses += 1
+                return None
+
+            self.disk_hits += 1
+            self._memory_set(key, value)
+            return value
+
+    def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a review result in both tiers"""
+        with self._lock:
+            self._memory_set(key, value)
+            self._disk_set(key, value)
+
+    def clear(self) -> None:
+        """Drop every cached review"""
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                try:
+                    self._conn.execute("DELETE FROM review_cache")
+                    self._conn.commit()
+                except sqlite3.Error as e:
+                    print(f"Error clearing review cache: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss/eviction counters for sizing the cache"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "disk_evictions": self.disk_evictions,
+                "memory_entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "disk_entries": self._disk_count(),
+                "max_disk_entries": self.max_disk_entries
+            }
+
+    def _memory_set(self, key: str, value: Dict[str, Any]) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _disk_get(self, key: str) -> Optional[Dict[str, Any]]:
+        if self._conn is None:
+            return None
+        try:
+            row = self._conn.execute("SELECT value FROM review_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE review_cache SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return json.loads(row[0])
+        except (sqlite3.Error, json.JSONDecodeError) as e:
+            print(f"Error reading review cache: {e}")
+            return None
+
+    def _disk_set(self, key: str, value: Dict[str, Any]) -> None:
+        if self._conn is None:
+            return
+        try:
+            now = time.time()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO review_cache (key, value, created_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now)
+            )
+            overflow = self._disk_count() - self.max_disk_entries
+            if overflow > 0:
+                cursor = self._conn.execute(
+                    "DELETE FROM review_cache WHERE key IN "
+                    "(SELECT key FROM review_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,)
+                )
+                self.disk_evictions += cursor.rowcount
+            self._conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"Error writing review cache: {e}")
+
+    def _disk_count(self) -> int:
+        if self._conn is None:
+            return 0
+        try:
+            return self._conn.execute("SELECT COUNT(*) FROM review_cache").fetchone()[0]
+        except sqlite3.Error:
+            return 0
@@ -0,0 +1,300 @@
+from typing import Any, Dict, List, Optional, Tuple
+import re
+from config import Config
+from services.token_counter import count_tokens
+
+_MD_HEADING_RE = re.compile(r"^ {0,3}(#{1,6})\s+(.+?)(?:\s+#+)?\s*$")
+_RST_ADORNMENT_RE = re.compile(r"^([=\-~^\"'`#*+:.])\1{2,}\s*$")
+_NUMBERED_TITLE_RE = re.compile(r"^(\d+(?:\.\d+)*[.)]|\d+(?:\.\d+)+)\s+(\S.*)$")
+_BULLET_RE = re.compile(r"^(\s*)(?:[-*+•]|\d+[.)])\s+")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+_SENTENCE_END_RE = re.compile(r"[.!?;)\]\"'`*]$")
+_SENTENCE_SPLIT_RE = re.compile(r"(?<=[.!?])\s+")
+
+# Plain-text titles are short lines standing on their own without closing punctuation
+_PLAIN_TITLE_MAX_WORDS = 10
+
+# Programming languages recognised anywhere a title names one, in LanguageDetector's spelling
+_LANGUAGES = (
+    "Objective-C++", "Objective-C", "JavaScript", "TypeScript", "PowerShell", "Python", "Kotlin", "Scala",
+    "Java", "SCSS", "HTML", "CSS", "SQL", "PHP", "C++", "C#"
+)
+# Names that are also everyday words or single letters; trusted only in the document title
+# (with this exact capitalisation) or the rule set name, never in section titles
+_AMBIGUOUS_LANGUAGES = ("Swift", "Shell", "Ruby", "Rust", "Bash", "Sass", "Go", "C", "R")
+
+
+def _language_pattern(names: Tuple[str, ...], ignore_case: bool) -> "re.Pattern[str]":
+    """Match any of ``names`` as a whole word, longest first so "C++" wins over "C" """
+    alternatives = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+    return re.compile(rf"(?<![\w+#-])(?:{alternatives})(?![\w+#-])", re.IGNORECASE if ignore_case else 0)
+
+
+_LANGUAGE_RE = _language_pattern(_LANGUAGES, ignore_case=True)
+_AMBIGUOUS_LANGUAGE_RE = _language_pattern(_AMBIGUOUS_LANGUAGES, ignore_case=False)
+_RULE_NAME_LANGUAGE_RE = _language_pattern(_LANGUAGES + _AMBIGUOUS_LANGUAGES, ignore_case=True)
+_LANGUAGE_NAMES = {name.lower(): name for name in _LANGUAGES + _AMBIGUOUS_LANGUAGES}
+
+# Checked in order against the section title, then the rule text, then the enclosing sections
+_CATEGORY_KEYWORDS = [
+    ("security", ("security", "secret", "injection", "xss", "csrf", "authentication", "sanitiz", "credential")),
+    ("performance", ("performance", "optimiz", "memoiz", "caching", "latency")),
+    ("error_handling", ("error", "exception", "try/catch")),
+    ("testing", ("test",)),
+    ("naming", ("naming", "name ")),
+    ("accessibility", ("accessibility", "a11y", "aria")),
+    ("typing", ("type safety", "typing", "type hint", "typescript")),
+    ("documentation", ("documentation", "docstring", "comment")),
+    ("state_management", ("state management", "state")),
+    ("formatting", ("format", "indent", "styl", "lint", "whitespace")),
+    ("structure", ("structure", "architecture", "organiz", "import", "module", "component")),
+]
+
+
+class RuleChunker:
+    """Split rule documents into one chunk per rule, keeping the section each came from.
+
+    Markdown headings, reStructuredText underlined titles and, in documents
+    with neither, plain-text titles ("Rules", "1. Naming Conventions") open
+    sections. Inside a section every bullet item, numbered item or standalone
+    sentence line becomes its own chunk; sub-items, indented continuations and
+    code examples stay with the rule they follow. Each chunk carries its
+    section path, a language (from the section titles, the document title or
+    the rule set name) and a category. Anything larger than ``max_tokens`` is
+    split on line, then (for prose) sentence, then word boundaries.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = None):
+        self.max_tokens = max_tokens if max_tokens is not None else Config.RULE_CHUNK_MAX_TOKENS
+
+    def split(self, text: str, rule_name: str = "") -> List[Dict[str, Any]]:
+        """Return chunks as dicts with ``document``, ``section_path``, ``section``, ``language`` and ``category``"""
+        lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+        headings = self._headings(lines)
+        # The document title is its first heading, or its first line in plain text
+        first_line = next((line.strip("#= \t") for line in lines if line.strip()), "")
+        first_title = next((title for _, (level, title) in sorted(headings.items()) if level), "")
+        fallback_language = (
+            detect_language(f"{first_line} {first_title}", ambiguous=True)
+            or _first_language(_RULE_NAME_LANGUAGE_RE, re.sub(r"[_\s]+", " ", rule_name))
+            or "General"
+        )
+
+        chunks = []
+        for path, item in self._items(lines, headings):
+            section = path[-1] if path else ""
+            section_path = " > ".join(path)
+            language = next(
+                (language for language in map(detect_language, reversed(path)) if language), fallback_language
+            )
+            category = classify(section) or classify(item) or classify(section_path) or "general"
+            for piece in self._fit(item):
+                chunks.append({
+                    "document": f"[{section}] {piece}" if section else piece,
+                    "section_path": section_path,
+                    "section": section,
+                    "language": language,
+                    "category": category
+                })
+        return chunks
+
+    def _headings(self, lines: List[str]) -> Dict[int, Tuple[int, str]]:
+        """Map line indexes that hold a title to (level, title); RST underlines map to level 0"""
+        headings: Dict[int, Tuple[int, str]] = {}
+        rst_levels: List[Tuple[str, bool]] = []
+        in_fence = False
+        for index, line in enumerate(lines):
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+                continue
+            if in_fence or index in headings:
+                continue
+            match = _MD_HEADING_RE.match(line)
+            if match:
+                headings[index] = (len(match.group(1)), match.group(2).strip())
+                continue
+            following = lines[index + 1] if index + 1 < len(lines) else ""
+            if (line.strip() and not line[0].isspace() and not _RST_ADORNMENT_RE.match(line)
+                    and _RST_ADORNMENT_RE.match(following) and len(following.rstrip()) >= len(line.rstrip())):
+                overlined = index > 0 and lines[index - 1].strip() == following.strip()
+                style = (following.strip()[0], overlined)
+                if style not in rst_levels:
+                    rst_levels.append(style)
+                headings[index] = (rst_levels.index(style) + 1, line.strip())
+                headings[index + 1] = (0, "")
+                if overlined:
+                    headings[index - 1] = (0, "")
+        if headings:
+            return headings
+
+        # Plain text: numbered titles nest by their numbering depth below unnumbered titles
+        for index, line in enumerate(lines):
+            stripped = line.strip()
+            alone = (index == 0 or not lines[index - 1].strip()) and (
+                index + 1 == len(lines) or not lines[index + 1].strip()
+            )
+            if (not alone or not stripped or line[0].isspace() or _SENTENCE_END_RE.search(stripped)
+                    or stripped.endswith(":") or len(stripped.split()) > _PLAIN_TITLE_MAX_WORDS):
+                continue
+            match = _NUMBERED_TITLE_RE.match(stripped)
+            if match:
+                headings[index] = (match.group(1).rstrip(".)").count(".") + 2, match.group(2).strip())
+            elif not _BULLET_RE.match(line):
+                headings[index] = (1, stripped)
+        return headings
+
+    def _items(self, lines: List[str], headings: Dict[int, Tuple[int, str]]) -> List[Tuple[List[str], str]]:
+        """(section path, rule text) for every rule in document order"""
+        items: List[Tuple[List[str], str]] = []
+        stack: List[Tuple[int, str]] = []
+        section_start = 0
+
+        def path() -> List[str]:
+            return [title for _, title in stack]
+
+        for block in self._blocks(lines, headings):
+            if isinstance(block, tuple):
+                level, title = block
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, _NUMBERED_TITLE_RE.sub(r"\2", title)))
+                section_start = len(items)
+                continue
+
+            first = block[0]
+            continues_rule = _FENCE_RE.match(first) or (first[0].isspace() and not _BULLET_RE.match(first))
+            if continues_rule and len(items) > section_start:
+                # Code examples and indented continuations belong to the rule above them
+                items[-1] = (items[-1][0], items[-1][1] + "\n\n" + "\n".join(block))
+                continue
+            items.extend((path(), text) for text in self._block_rules(block))
+        return items
+
+    def _blocks(self, lines: List[str], headings: Dict[int, Tuple[int, str]]) -> List[Any]:
+        """Blank-line separated blocks of lines, with (level, title) tuples where sections open"""
+        blocks: List[Any] = []
+        current: List[str] = []
+        in_fence = False
+        for index, line in enumerate(lines):
+            if not in_fence and index in headings:
+                if current:
+                    blocks.append(current)
+                    current = []
+                if headings[index][0]:
+                    blocks.append(headings[index])
+                continue
+            if _FENCE_RE.match(line):
+                if not in_fence and current:
+                    blocks.append(current)
+                    current = []
+                in_fence = not in_fence
+                current.append(line)
+                if not in_fence:
+                    blocks.append(current)
+                    current = []
+                continue
+            if in_fence or line.strip():
+                current.append(line.rstrip())
+            elif current:
+                blocks.append(current)
+                current = []
+        if current:
+            blocks.append(current)
+        return blocks
+
+    def _block_rules(self, block: List[str]) -> List[str]:
+        """Split one block into rules: list items, sentence lines, or the whole paragraph"""
+        if _FENCE_RE.match(block[0]):
+            return ["\n".join(block)]
+
+        bullet_indents = [len(match.group(1)) for match in map(_BULLET_RE.match, block) if match]
+        if bullet_indents:
+            top = min(bullet_indents)
+            rules: List[List[str]] = []
+            for line in block:
+                match = _BULLET_RE.match(line)
+                if match and len(match.group(1)) == top:
+                    rules.append([line[match.end():].strip()])
+                elif rules:
+                    rules[-1].append(line)
+                else:
+                    # Lead-in text before the first item is a rule of its own
+                    rules.append([line.strip()])
+            return ["\n".join(rule) for rule in rules]
+
+        # One rule per line when every line is a complete sentence; a line ending in ":"
+        # introduces the lines after it. Wrapped paragraphs stay together.
+        rules = []
+        for index, line in enumerate(block):
+            stripped = line.strip()
+            if stripped.endswith(":"):
+                rules.append("\n".join([stripped] + [rest.strip() for rest in block[index + 1:]]))
+                return rules
+            if not _SENTENCE_END_RE.search(stripped):
+                return [" ".join(part.strip() for part in block)]
+            rules.append(stripped)
+        return rules
+
+    def _fit(self, text: str) -> List[str]:
+        """Split text over the token budget on line boundaries, then prose on sentences, then on words.
+
+        Lines are rejoined with their newlines, so embedded code examples keep
+        their layout; only lines outside code fences and indented blocks are
+        split into sentences.
+        """
+        if count_tokens(text) <= self.max_tokens:
+            return [text]
+        # (part, separator placed before it when it joins the previous part)
+        parts: List[Tuple[str, str]] = []
+        in_fence = False
+        for line in text.split("\n"):
+            is_code = in_fence or _FENCE_RE.match(line) is not None or line.startswith(("    ", "\t"))
+            if _FENCE_RE.match(line):
+                in_fence = not in_fence
+            if count_tokens(line) <= self.max_tokens:
+                parts.append((line, "\n"))
+                continue
+            pieces = [line] if is_code else _SENTENCE_SPLIT_RE.split(line)
+            for index, piece in enumerate(pieces):
+                words = [piece] if count_tokens(piece) <= self.max_tokens else piece.split(" ")
+                for word_index, word in enumerate(words):
+                    parts.append((word, "\n" if index == 0 and word_index == 0 else " "))
+        return self._pack(parts)
+
+    def _pack(self, parts: List[Tuple[str, str]]) -> List[str]:
+        """Greedily join parts, each after its separator, while the joined text stays within the token budget"""
+        packed: List[str] = []
+        current = ""
+        for part, separator in parts:
+            joined = f"{current}{separator}{part}" if current else part
+            if current and count_tokens(joined) > self.max_tokens:
+                packed.append(current)
+                joined = part
+            current = joined
+        if current:
+            packed.append(current)
+        return packed
+
+
+def detect_language(text: str, ambiguous: bool = False) -> Optional[str]:
+    """First programming language named in ``text``; ``ambiguous`` also accepts names like Go, C or Rust"""
+    if ambiguous:
+        matches = [match for match in (_LANGUAGE_RE.search(text or ""), _AMBIGUOUS_LANGUAGE_RE.search(text or ""))
+                   if match]
+        match = min(matches, key=lambda match: match.start()) if matches else None
+        return _LANGUAGE_NAMES[match.group(0).lower()] if match else None
+    return _first_language(_LANGUAGE_RE, text)
+
+
+def _first_language(pattern: "re.Pattern[str]", text: str) -> Optional[str]:
+    match = pattern.search(text or "")
+    return _LANGUAGE_NAMES[match.group(0).lower()] if match else None
+
+
+def classify(text: str) -> Optional[str]:
+    """Rule category suggested by keywords in ``text``"""
+    lowered = f" {text.lower()} "
+    for category, keywords in _CATEGORY_KEYWORDS:
+        if any(keyword in lowered for keyword in keywords):
+            return category
+    return None
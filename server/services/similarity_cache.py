@@ -0,0 +1,414 @@
+from collections import OrderedDict, defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+import copy
+import difflib
+import functools
+import hashlib
+import keyword
+import re
+import threading
+import numpy as np
+from config import Config
+
+# Comment syntax per detected language; languages not listed keep every token
+_HASH_COMMENTS = r"#[^\n]*"
+_SLASH_COMMENTS = r"//[^\n]*|/\*[\s\S]*?\*/"
+_COMMENT_SYNTAX = {
+    **dict.fromkeys(
+        ("Python", "Ruby", "R", "Shell", "Bash", "Zsh", "Fish", "YAML", "TOML", "Dockerfile", "Makefile",
+         "Configuration"),
+        _HASH_COMMENTS
+    ),
+    **dict.fromkeys(
+        ("JavaScript", "TypeScript", "React JSX", "React TSX", "Java", "C", "C++", "C#", "Go", "Rust", "Swift",
+         "Kotlin", "Scala", "Objective-C", "Objective-C++", "SCSS", "Sass"),
+        _SLASH_COMMENTS
+    ),
+    "PHP": f"{_SLASH_COMMENTS}|{_HASH_COMMENTS}",
+    "PowerShell": rf"<#[\s\S]*?#>|{_HASH_COMMENTS}",
+    "CSS": r"/\*[\s\S]*?\*/",
+    "SQL": r"--[^\n]*|/\*[\s\S]*?\*/",
+    "HTML": r"<!--[\s\S]*?-->",
+    "XML": r"<!--[\s\S]*?-->",
+    "INI": r"[;#][^\n]*",
+    "Batch": r"(?:(?<=\n)|^)[ \t]*(?:[Rr][Ee][Mm]\b|::)[^\n]*"
+}
+# Strings are matched before comments can start inside them, so "http://x" stays one token
+_STRING_PATTERN = (
+    r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`'
+)
+
+# Local binding names (assigned names and parameters) collapse to one placeholder so renamed variables
+# still match; callees, attributes, imported modules and keywords stay verbatim and keep the meaning
+_IDENTIFIER = "ID"
+_WORD_RE = re.compile(r"[A-Za-z_]\w*")
+_KEYWORDS = set(keyword.kwlist) | {
+    "abstract", "auto", "bool", "boolean", "byte", "case", "catch", "chan", "char", "const", "default", "defer",
+    "delete", "do", "double", "enum", "export", "extends", "extern", "fallthrough", "final", "float", "fn", "func",
+    "function", "go", "goto", "impl", "implements", "instanceof", "int", "interface", "let", "long", "map",
+    "match", "mod", "mut", "namespace", "new", "null", "nil", "operator", "override", "package", "private",
+    "protected", "pub", "public", "select", "short", "signed", "sizeof", "static", "struct", "super", "switch",
+    "template", "throw", "throws", "trait", "true", "false", "typedef", "typeof", "typename", "union",
+    "unsigned", "use", "using", "var", "virtual", "void", "volatile", "when", "where", "fun", "val", "of"
+}
+# Keywords that may stand in for a type before a declared name ("int count = 0", "let user")
+_TYPE_KEYWORDS = {
+    "auto", "bool", "boolean", "byte", "char", "const", "double", "float", "int", "let", "long", "mut", "short",
+    "signed", "unsigned", "val", "var"
+}
+# Keywords whose next parenthesised list holds parameters ("def name(", "function (", "func (")
+_DEFINERS = {"def", "function", "fn", "fun", "func"}
+# Words that start an import statement, whose names are never local bindings
+_IMPORT_KEYWORDS = {"import", "from", "include", "using", "use", "package"}
+# Operators that assign when followed by "=" ("+=", "//=", ":=")
+_AUGMENTED = {"+", "-", "*", "/", "%", "&", "|", "^", ":", "@", "//", "**", "<<", ">>"}
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+class SimilarityCache:
+    """Near-duplicate review cache keyed by MinHash signatures of normalized code.
+
+    Code is reduced to a token stream (whitespace and comments removed,
+    local variable names replaced by a placeholder) and cut into overlapping shingles; a MinHash signature estimates the Jaccard
+    similarity of two shingle sets. Signatures are indexed in LSH bands so a
+    lookup only compares against entries that share at least one band within
+    the same scope (language, rules, prompt version and model).
+    """
+
+    def __init__(self, threshold: Optional[float] = None, max_entries: Optional[int] = None,
+                 num_perm: Optional[int] = None, bands: Optional[int] = None, shingle_size: Optional[int] = None):
+        self.threshold = threshold if threshold is not None else Config.SIMILARITY_CACHE_THRESHOLD
+        self.max_entries = max_entries if max_entries is not None else Config.SIMILARITY_CACHE_SIZE
+        self.num_perm = num_perm if num_perm is not None else Config.SIMILARITY_CACHE_NUM_PERM
+        self.bands = bands if bands is not None else Config.SIMILARITY_CACHE_BANDS
+        self.shingle_size = shingle_size if shingle_size is not None else Config.SIMILARITY_CACHE_SHINGLE_SIZE
+        if self.num_perm % self.bands:
+            raise ValueError("SIMILARITY_CACHE_NUM_PERM must be a multiple of SIMILARITY_CACHE_BANDS")
+        self.rows = self.num_perm // self.bands
+
+        # a < 2**31 and hashes < 2**32 keep a * h + b inside uint64 before the modulo
+        generator = np.random.RandomState(1)
+        self._a = generator.randint(1, 1 << 31, size=self.num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 31, size=self.num_perm, dtype=np.uint64)
+
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, bytes], Set[str]] = defaultdict(set)
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.candidates_checked = 0
+        self.evictions = 0
+
+    def lookup(self, code: str, scope: str, language: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return the closest cached review above the threshold, re-anchored to ``code``.
+
+        The result carries ``value`` (the review, with line numbers mapped to
+        the new code), ``similarity`` and ``source_key``. ``language`` selects
+        the comment syntax ignored when comparing code.
+        """
+        signature = self.signature(code, language)
+        with self._lock:
+            candidates = set()
+            for band, band_hash in self._band_hashes(signature):
+                candidates |= self._buckets.get((scope, band, band_hash), set())
+
+            best_key, best_score = None, 0.0
+            for key in candidates:
+                self.candidates_checked += 1
+                score = float(np.mean(self._entries[key]["signature"] == signature))
+                if score > best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None or best_score < self.threshold:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            entry = self._entries[best_key]
+            value = copy.deepcopy(entry["value"])
+            source_code = entry["code"]
+
+        value["review_results"] = reanchor_issues(value.get("review_results", []), source_code, code, language)
+        return {"value": value, "similarity": round(best_score, 4), "source_key": best_key}
+
+    def add(self, key: str, code: str, scope: str, value: Dict[str, Any], language: Optional[str] = None) -> None:
+        """Index a finished review under its exact cache key"""
+        signature = self.signature(code, language)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = {"code": code, "scope": scope, "signature": signature, "value": copy.deepcopy(value)}
+            for band, band_hash in self._band_hashes(signature):
+                self._buckets[(scope, band, band_hash)].add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every indexed review"""
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and index size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "candidates_checked": self.candidates_checked,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "evictions": self.evictions,
+                "threshold": self.threshold
+            }
+
+    def signature(self, code: str, language: Optional[str] = None) -> np.ndarray:
+        """MinHash signature of the code's normalized token shingles"""
+        tokens = normalize_tokens(code, language)
+        size = self.shingle_size
+        shingles = {" ".join(tokens[i:i + size]) for i in range(max(1, len(tokens) - size + 1))}
+        hashes = np.fromiter(
+            (int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=4).digest(), "little")
+             for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0)
+
+    def _band_hashes(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _remove(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        for band, band_hash in self._band_hashes(entry["signature"]):
+            bucket = self._buckets.get((entry["scope"], band, band_hash))
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[(entry["scope"], band, band_hash)]
+
+
+def normalize_tokens(code: str, language: Optional[str] = None) -> List[str]:
+    """Tokenize code ignoring whitespace, layout, comments and local variable names.
+
+    Strings are tokenized first, so comment markers inside them are kept, and
+    comments are only recognised in the syntax of ``language``. Names the code
+    binds itself (assignments, parameters, loop and ``as`` targets) are
+    replaced by a placeholder, also inside strings; everything else, such as
+    called functions, attributes, keyword arguments and imported modules, is
+    kept so code that calls different APIs does not match.
+    """
+    return [token for _, token in _normalized(code, language)]
+
+
+def _normalized(code: str, language: Optional[str]) -> List[Tuple[int, str]]:
+    """(line number, normalized token) for every code token"""
+    tokens: List[Tuple[str, str]] = []
+    lines: List[int] = []
+    # Import statements run to the end of their line (or of their parentheses) or a ";"
+    in_import: List[bool] = []
+    line, depth, importing = 1, 0, False
+    for match in _token_re(language).finditer(code):
+        kind, text = match.lastgroup, match.group(0)
+        if (kind == "newline" and not depth) or text == ";":
+            importing = False
+        elif kind == "symbol" and text in "([{":
+            depth += 1
+        elif kind == "symbol" and text in ")]}":
+            depth = max(0, depth - 1)
+        elif kind == "word" and text in _IMPORT_KEYWORDS:
+            importing = True
+        if kind not in ("comment", "newline"):
+            tokens.append((kind, text))
+            lines.append(line)
+            in_import.append(importing)
+        line += text.count("\n")
+
+    bindings, verbatim = _local_bindings(tokens, in_import)
+    normalized = []
+    for index, (kind, text) in enumerate(tokens):
+        if kind == "word" and text in bindings and index not in verbatim:
+            text = _IDENTIFIER
+        elif kind == "string" and bindings:
+            # Messages, docstrings and f-string fields that mention a local follow its renames
+            text = _WORD_RE.sub(lambda word: _IDENTIFIER if word.group(0) in bindings else word.group(0), text)
+        normalized.append((lines[index], text))
+    return normalized
+
+
+def _local_bindings(tokens: List[Tuple[str, str]], in_import: List[bool]) -> Tuple[Set[str], Set[int]]:
+    """Names the code binds itself, and indexes of attribute and keyword-argument names that stay verbatim.
+
+    A heuristic over the token stream shared by all languages: a name is bound
+    when it is assigned (``x =``, ``x +=``, ``a, b =``), declared (``let x``,
+    ``int x``, ``String s :``), a parameter of a ``def``/``function``, lambda
+    or arrow function (``x =>``), a loop target or an ``as`` target outside imports.
+    """
+    def text_at(index: int) -> str:
+        return tokens[index][1] if 0 <= index < len(tokens) else ""
+
+    def kind_at(index: int) -> str:
+        return tokens[index][0] if 0 <= index < len(tokens) else ""
+
+    closing: Dict[int, int] = {}
+    opened: List[int] = []
+    for index, (kind, text) in enumerate(tokens):
+        if kind == "symbol" and text in "([{":
+            opened.append(index)
+        elif kind == "symbol" and text in ")]}" and opened:
+            closing[opened.pop()] = index
+
+    bindings: Set[str] = set()
+    verbatim: Set[int] = set()
+    # Open brackets as (bracket, holds parameters)
+    stack: List[Tuple[str, bool]] = []
+    in_loop_header = False
+    lambda_depth: Optional[int] = None
+    for index, (kind, text) in enumerate(tokens):
+        previous, following = text_at(index - 1), text_at(index + 1)
+        if kind == "symbol":
+            if text in "([{":
+                close = closing.get(index, -2)
+                stack.append((text, text == "(" and (
+                    previous in _DEFINERS or text_at(index - 2) in _DEFINERS
+                    or (text_at(close + 1), text_at(close + 2)) == ("=", ">")
+                )))
+            elif text in ")]}" and stack:
+                stack.pop()
+            elif text == ":" and lambda_depth == len(stack):
+                lambda_depth = None
+            if text in (":", ";", "="):
+                in_loop_header = False
+            continue
+        if kind != "word":
+            continue
+        if text == "for":
+            in_loop_header = True
+        elif text == "lambda":
+            lambda_depth = len(stack)
+        elif text in ("in", "of"):
+            in_loop_header = False
+        if text in _KEYWORDS:
+            continue
+
+        # obj.name, ptr->name and Type::name are attributes, never local names
+        if previous == "." or (text_at(index - 2), previous) in (("-", ">"), (":", ":")):
+            verbatim.add(index)
+            continue
+        if in_import[index]:
+            continue
+
+        # "=", or an augmented operator such as "+=", "//=" or ":=", after the name
+        end = index + 1
+        while end < index + 3 and kind_at(end) == "symbol" and text_at(end) in "+-*/%&|^:@<>":
+            end += 1
+        operator = "".join(text_at(i) for i in range(index + 1, end))
+        assigns = (text_at(end) == "=" and text_at(end + 1) not in ("=", ">")
+                   and (not operator or operator in _AUGMENTED))
+        in_call = bool(stack) and stack[-1] == ("(", False)
+        in_params = bool(stack) and stack[-1][1]
+        typed = (kind_at(index - 1) == "word" and previous not in _DEFINERS
+                 and (previous not in _KEYWORDS or previous in _TYPE_KEYWORDS))
+
+        if assigns and in_call and not typed:
+            # f(key=value) names a keyword argument of the callee
+            verbatim.add(index)
+            continue
+        # a, b = ...
+        last_target = index
+        while text_at(last_target + 1) == "," and kind_at(last_target + 2) == "word":
+            last_target += 2
+        unpacked = (last_target > index and not in_call and text_at(last_target + 1) == "="
+                    and text_at(last_target + 2) not in ("=", ">"))
+
+        if (assigns or unpacked
+                or (previous in _TYPE_KEYWORDS and following != "(")
+                or (following, text_at(index + 2)) == ("=", ">")
+                or (in_params and previous in ("(", ",", "*")
+                    and (following in (",", ")", "=", ":", "*") or kind_at(index + 1) == "word"))
+                or (lambda_depth == len(stack) and previous in ("lambda", ",", "*"))
+                or (in_loop_header and following in (",", "in", "of", ")", ":"))
+                or (previous == "as" and following in (":", ","))
+                or (typed and following in (",", ")", "=", ";", ":") and text_at(index + 2) != "=")):
+            bindings.add(text)
+    return bindings, verbatim
+
+
+@functools.lru_cache(maxsize=None)
+def _token_re(language: Optional[str]) -> "re.Pattern[str]":
+    """Tokenizer for a language: strings, then its comments, words, numbers, newlines and single symbols"""
+    comment = _COMMENT_SYNTAX.get(language or "")
+    return re.compile(
+        rf"(?P<string>{_STRING_PATTERN})|"
+        + (rf"(?P<comment>{comment})|" if comment else "")
+        + r"(?P<word>[A-Za-z_]\w*)|(?P<number>\d+(?:\.\d+)?)|(?P<newline>\n)|(?P<symbol>\S)"
+    )
+
+
+def reanchor_issues(issues: List[Dict[str, Any]], old_code: str, new_code: str,
+                    language: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Move issue line numbers from ``old_code`` to the matching lines of ``new_code``"""
+    line_map = _line_map(old_code, new_code, language)
+    new_line_count = max(1, len(new_code.splitlines()))
+    reanchored = []
+    for issue in issues:
+        issue = dict(issue)
+        line_number = issue.get("lineNumber")
+        if isinstance(line_number, int) and line_number > 0:
+            issue["lineNumber"] = min(line_map.get(line_number, line_number), new_line_count)
+        reanchored.append(issue)
+    return reanchored
+
+
+def _line_map(old_code: str, new_code: str, language: Optional[str] = None) -> Dict[int, int]:
+    """Map 1-based old line numbers to new ones.
+
+    Lines are compared by their normalized tokens, so re-indented or
+    reformatted lines still match; blank and comment-only lines are skipped
+    and follow the next line that has code.
+    """
+    old_lines = _code_lines(old_code, language)
+    new_lines = _code_lines(new_code, language)
+    matcher = difflib.SequenceMatcher(None, [key for _, key in old_lines], [key for _, key in new_lines], autojunk=False)
+
+    line_map = {}
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        for offset, old_index in enumerate(range(i1, i2)):
+            # Lines of a replaced block pair up in order; extra or deleted lines anchor to the block start
+            new_index = j1 + offset if offset < j2 - j1 else j1
+            if new_index < len(new_lines):
+                line_map[old_lines[old_index][0]] = new_lines[new_index][0]
+            elif new_lines:
+                line_map[old_lines[old_index][0]] = new_lines[-1][0]
+
+    # Lines without code inherit the mapping of the next line that has some
+    next_mapped = None
+    for line_number in range(len(old_code.splitlines()), 0, -1):
+        if line_number in line_map:
+            next_mapped = line_map[line_number]
+        elif next_mapped is not None:
+            line_map[line_number] = next_mapped
+    return line_map
+
+
+def _code_lines(code: str, language: Optional[str] = None) -> List[Tuple[int, str]]:
+    """(line number, normalized tokens) for every line that contains code.
+
+    The whole code is normalized at once so a name bound on one line is
+    recognised on every other line; multi-line tokens belong to the line they start on.
+    """
+    keys: Dict[int, List[str]] = defaultdict(list)
+    for line_number, token in _normalized(code, language):
+        keys[line_number].append(token)
+    return [(line_number, " ".join(tokens)) for line_number, tokens in sorted(keys.items())]
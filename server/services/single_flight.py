@@ -0,0 +1,68 @@
+from typing import Any, Awaitable, Callable, Dict
+import asyncio
+import copy
+import hashlib
+import json
+
+
+class SingleFlight:
+    """Coalesce concurrent calls that share a key into one in-flight computation.
+
+    The first caller starts the work; callers arriving while it runs await the
+    same task and receive a copy of its result. The task is shielded, so a
+    caller that disconnects or times out does not cancel the work for the
+    others; once the last waiter is gone the task is cancelled.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.calls = 0
+        self.executions = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash the call arguments into a content key"""
+        payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``func`` unless an identical call is already in flight, then share its result"""
+        self.calls += 1
+        task = self._inflight.get(key)
+        shared = task is not None
+        if shared:
+            self.coalesced += 1
+        else:
+            task = asyncio.ensure_future(func())
+            self.executions += 1
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            result = await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Nobody is waiting any more (timeouts, cancelled deadlines): stop spending tokens on it
+                    self._forget(key, task)
+                    task.cancel()
+        return copy.deepcopy(result) if shared else result
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        """Drop ``task`` from the in-flight map unless a newer call already replaced it"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many calls ran and how many were coalesced"""
+        return {
+            "calls": self.calls,
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
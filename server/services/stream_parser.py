@@ -0,0 +1,213 @@
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import json
+import re
+
+_TOKEN_RE = re.compile(r'[{}\[\]":,]')
+_STRING_END_RE = re.compile(r'["\\]')
+_CLOSERS = {"{": "}", "[": "]"}
+_decoder = json.JSONDecoder()
+
+# How many "{" positions to try with the C decoder before scanning the whole text
+_MAX_CANDIDATES = 8
+
+
+def parse_json_response(text: str, array_keys: Iterable[str] = ("issues",)) -> Optional[Dict[str, Any]]:
+    """Extract the JSON object from an LLM response.
+
+    Replaces the greedy ``re.search(r'\\{.*\\}')`` + ``json.loads`` path: the
+    object carrying one of ``array_keys`` is decoded with ``raw_decode`` so
+    prose or code fences around it do not matter, and truncated output is
+    repaired by the incremental parser instead of being thrown away. Returns
+    None if nothing usable is found.
+    """
+    keys = set(array_keys)
+    start = text.find("{")
+    candidates = 0
+    while start != -1 and candidates < _MAX_CANDIDATES:
+        try:
+            value, _ = _decoder.raw_decode(text, start)
+            if isinstance(value, dict) and keys & value.keys():
+                return value
+        except json.JSONDecodeError:
+            pass
+        candidates += 1
+        start = text.find("{", start + 1)
+
+    parser = IncrementalJSONParser(array_keys)
+    parser.feed(text)
+    return parser.finish()
+
+
+class IncrementalJSONParser:
+    """Pull complete objects out of top-level JSON arrays while the text is still streaming.
+
+    Feed LLM tokens as they arrive; every object inside one of ``array_keys``
+    (e.g. ``"issues"``) is returned as soon as its closing brace is seen, so
+    callers do not have to wait for the whole completion. ``finish()`` returns
+    the whole document, closing any containers left open by truncated output.
+    """
+
+    def __init__(self, array_keys: Iterable[str] = ("issues",)):
+        self.array_keys = set(array_keys)
+        self.items: Dict[str, List[Dict[str, Any]]] = {key: [] for key in self.array_keys}
+        self._chunks: List[str] = []
+        self._buffer = ""
+        self._offset = 0          # absolute position of _buffer[0] in the stream
+        self._pos = 0             # absolute position of the next character to scan
+        self._stack: List[str] = []
+        self._in_string = False
+        self._string_start: Optional[int] = None
+        self._last_string: Optional[str] = None
+        self._pending_key: Optional[str] = None
+        self._array_key: Optional[str] = None
+        self._array_depth = 0
+        self._object_start: Optional[int] = None
+        self._root_start: Optional[int] = None
+        self._roots: List[Tuple[int, int]] = []
+        # Last position where the document can be cut and closed into valid JSON
+        self._checkpoint: Optional[Tuple[int, Tuple[str, ...]]] = None
+
+    def feed(self, chunk: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk of text and return any ``(array_key, object)`` pairs it completed"""
+        self._chunks.append(chunk)
+        self._buffer += chunk
+        completed = []
+        end = self._offset + len(self._buffer)
+
+        while self._pos < end:
+            local = self._pos - self._offset
+
+            if self._in_string:
+                match = _STRING_END_RE.search(self._buffer, local)
+                if match is None:
+                    self._pos = end
+                    break
+                position = self._offset + match.start()
+                if match.group() == "\\":
+                    # Skip the escaped character; wait for it if it has not arrived yet
+                    if position + 1 >= end:
+                        break
+                    self._pos = position + 2
+                    continue
+                self._in_string = False
+                self._last_string = self._text(self._string_start + 1, position)
+                self._string_start = None
+                self._pos = position + 1
+                continue
+
+            match = _TOKEN_RE.search(self._buffer, local)
+            stop = match.start() if match else len(self._buffer)
+            if self._buffer[local:stop].strip():
+                self._pending_key = None
+            if match is None:
+                self._pos = end
+                break
+
+            char = match.group()
+            position = self._offset + match.start()
+            self._pos = position + 1
+            depth = len(self._stack)
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = position
+                self._pending_key = None
+            elif char == ":":
+                # Only keys of the top-level object can open a tracked array
+                self._pending_key = self._last_string if depth == 1 else None
+            elif char == ",":
+                self._pending_key = None
+                if depth and self._object_start is None:
+                    self._checkpoint = (position, tuple(self._stack))
+            elif char in "{[":
+                if depth == 0:
+                    if char == "[":
+                        continue
+                    self._root_start = position
+                self._stack.append(char)
+                depth += 1
+                if char == "[" and self._array_key is None and depth == 2 and self._pending_key in self.array_keys:
+                    self._array_key = self._pending_key
+                    self._array_depth = depth
+                elif char == "{" and self._array_key is not None and depth == self._array_depth + 1:
+                    self._object_start = position
+                self._pending_key = None
+                # Never cut inside an array element: a half-written issue is worse than none
+                if self._object_start is None and not (char == "{" and depth > 1 and self._stack[-2] == "["):
+                    self._checkpoint = (position + 1, tuple(self._stack))
+            else:
+                if not self._stack or _CLOSERS[self._stack[-1]] != char:
+                    continue
+                if char == "}" and self._object_start is not None and depth == self._array_depth + 1:
+                    item = self._decode(self._text(self._object_start, position + 1))
+                    if item is not None:
+                        self.items[self._array_key].append(item)
+                        completed.append((self._array_key, item))
+                    self._object_start = None
+                elif char == "]" and self._array_key is not None and depth == self._array_depth:
+                    self._array_key = None
+                self._stack.pop()
+                self._pending_key = None
+                if self._object_start is None:
+                    self._checkpoint = (position + 1, tuple(self._stack))
+                if not self._stack:
+                    self._roots.append((self._root_start, position + 1))
+                    self._root_start = None
+
+        self._trim()
+        return completed
+
+    def finish(self) -> Optional[Dict[str, Any]]:
+        """Return the parsed document, repairing it if the stream was cut off"""
+        text = "".join(self._chunks)
+        documents = []
+        for start, stop in self._roots:
+            value = self._decode(text[start:stop])
+            if value is not None:
+                documents.append(value)
+
+        # Prefer the object that carries the arrays we track over stray braces in prose
+        for value in documents:
+            if self.array_keys & value.keys():
+                return value
+
+        if self.truncated and self._checkpoint is not None:
+            cut, stack = self._checkpoint
+            closers = "".join(_CLOSERS[opener] for opener in reversed(stack))
+            value = self._decode(text[self._root_start:cut] + closers)
+            if value is not None:
+                return value
+
+        if documents:
+            return documents[0]
+
+        # Last resort: whatever array items were complete
+        if any(self.items.values()):
+            return {key: list(items) for key, items in self.items.items()}
+        return None
+
+    @property
+    def truncated(self) -> bool:
+        """True if a top-level object was opened but never closed"""
+        return self._root_start is not None
+
+    def _text(self, start: int, stop: int) -> str:
+        return self._buffer[start - self._offset:stop - self._offset]
+
+    def _trim(self) -> None:
+        """Drop scanned text that no open object or string still needs"""
+        keep_from = self._pos
+        if self._object_start is not None:
+            keep_from = min(keep_from, self._object_start)
+        if self._string_start is not None:
+            keep_from = min(keep_from, self._string_start)
+        self._buffer = self._buffer[keep_from - self._offset:]
+        self._offset = keep_from
+
+    @staticmethod
+    def _decode(text: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return value if isinstance(value, dict) else None
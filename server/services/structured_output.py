@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Optional, Type, get_args, get_origin
+import copy
+import threading
+from pydantic import BaseModel, ValidationError
+from config import Config
+from services.stream_parser import parse_json_response
+
+
+class StructuredOutputError(ValueError):
+    """Raised when an LLM response cannot be parsed into the expected schema"""
+
+
+class StructuredOutput:
+    """Ask the provider for schema-shaped JSON and validate responses through one path.
+
+    ``bind`` attaches a ``response_format`` derived from a pydantic model to a
+    chat model, so the provider returns bare JSON instead of prose wrapped
+    around it. ``parse`` decodes the response (repairing truncation) and
+    validates it against the same model. Invalid array items are dropped and
+    counted rather than failing the whole response; a response with nothing
+    usable raises ``StructuredOutputError`` instead of becoming an empty review.
+    """
+
+    _lock = threading.Lock()
+    _stats: Dict[str, Dict[str, int]] = {}
+
+    @classmethod
+    def bind(cls, llm: Any, model: Type[BaseModel]) -> Any:
+        """Return ``llm`` configured to answer in ``model``'s shape, per Config.LLM_RESPONSE_FORMAT"""
+        response_format = cls.response_format(model)
+        return llm.bind(response_format=response_format) if response_format else llm
+
+    @staticmethod
+    def response_format(model: Type[BaseModel]) -> Optional[Dict[str, Any]]:
+        """Build the OpenAI ``response_format`` for a model, or None if structured output is off"""
+        mode = Config.LLM_RESPONSE_FORMAT
+        if mode == "json_object":
+            return {"type": "json_object"}
+        if mode != "json_schema":
+            return None
+        return {
+            "type": "json_schema",
+            "json_schema": {
+                "name": model.__name__,
+                "schema": _strict_schema(model.model_json_schema()),
+                "strict": True
+            }
+        }
+
+    @classmethod
+    def parse(cls, text: str, model: Type[BaseModel]) -> Dict[str, Any]:
+        """Decode and validate a response, returning the model's data as a dict"""
+        list_fields = _list_fields(model)
+        data = parse_json_response(text, array_keys=tuple(list_fields) or ("items",))
+        if data is None:
+            cls._count(model, "failed")
+            raise StructuredOutputError(f"No JSON object found in {model.__name__} response")
+
+        try:
+            result = model.model_validate(data).model_dump()
+            cls._count(model, "parsed")
+            return result
+        except ValidationError:
+            pass
+
+        # Keep the valid items of each array instead of discarding the whole response
+        cleaned = dict(data)
+        dropped = 0
+        for name, item_model in list_fields.items():
+            items = data.get(name)
+            if not isinstance(items, list):
+                continue
+            kept = [item for item in items if cls.validate_item(item_model, item) is not None]
+            dropped += len(items) - len(kept)
+            cleaned[name] = kept
+
+        try:
+            result = model.model_validate(cleaned).model_dump()
+        except ValidationError as e:
+            cls._count(model, "failed")
+            raise StructuredOutputError(f"Invalid {model.__name__} response: {e.error_count()} validation errors") from e
+
+        cls._count(model, "salvaged")
+        cls._count(model, "dropped_items", dropped)
+        print(f"⚠️ Dropped {dropped} invalid items from {model.__name__} response")
+        return result
+
+    @staticmethod
+    def validate_item(item_model: Optional[Type[BaseModel]], item: Any) -> Optional[Any]:
+        """Validate one array item, returning its normalised value or None if invalid"""
+        if item_model is None:
+            return item if isinstance(item, str) else None
+        try:
+            return item_model.model_validate(item).model_dump()
+        except ValidationError:
+            return None
+
+    @classmethod
+    def stats(cls) -> Dict[str, Dict[str, int]]:
+        """Return parse outcome counters per schema"""
+        with cls._lock:
+            return copy.deepcopy(cls._stats)
+
+    @classmethod
+    def _count(cls, model: Type[BaseModel], outcome: str, amount: int = 1) -> None:
+        with cls._lock:
+            counters = cls._stats.setdefault(
+                model.__name__, {"parsed": 0, "salvaged": 0, "dropped_items": 0, "failed": 0}
+            )
+            counters[outcome] += amount
+
+
+def _list_fields(model: Type[BaseModel]) -> Dict[str, Optional[Type[BaseModel]]]:
+    """Map each list field of a model to its item model (None for lists of plain values)"""
+    fields = {}
+    for name, field in model.model_fields.items():
+        if get_origin(field.annotation) in (list, List):
+            item_type = get_args(field.annotation)[0]
+            fields[name] = item_type if isinstance(item_type, type) and issubclass(item_type, BaseModel) else None
+    return fields
+
+
+def _strict_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Adapt a pydantic JSON schema to strict structured-output rules.
+
+    Strict mode needs every property listed as required, no extra properties
+    and no defaults on each object.
+    """
+    schema = copy.deepcopy(schema)
+
+    def visit(node: Any) -> None:
+        if isinstance(node, dict):
+            node.pop("default", None)
+            if node.get("type") == "object" and "properties" in node:
+                node["required"] = list(node["properties"])
+                node["additionalProperties"] = False
+            for value in node.values():
+                visit(value)
+        elif isinstance(node, list):
+            for value in node:
+                visit(value)
+
+    visit(schema)
+    return schema
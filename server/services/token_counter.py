@@ -0,0 +1,25 @@
+from functools import lru_cache
+from typing import Optional
+from config import Config
+
+# Rough characters-per-token ratio used when the tiktoken encoding cannot be loaded
+_CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(name: str):
+    """Load a tiktoken encoding once; None if tiktoken or its BPE file is unavailable"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except Exception as e:
+        print(f"Token encoding '{name}' unavailable, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, encoding_name: Optional[str] = None) -> int:
+    """Count tokens with tiktoken, falling back to a character-based estimate"""
+    encoding = _get_encoding(encoding_name or Config.TOKEN_ENCODING)
+    if encoding is None:
+        return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
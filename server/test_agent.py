@@ -54,7 +54,7 @@ async def test_agent():
     - Profile code before optimization
     """
     
-    upload_result = main_service.upload_rules(
+    upload_result = await main_service.upload_rules(
         RuleUploadRequest(
             rules_text=sample_rules,
             rule_name="Python Standards",
@@ -115,7 +115,7 @@ def main():
     return True
 """
     
-    review_result = main_service.review_code_snippet(
+    review_result = await main_service.review_code_snippet(
         CodeReviewRequest(
             code=sample_python_code,
             language="Python"
@@ -142,14 +142,14 @@ def main():
     # Test 3: Search rules
     print("\n🔎 Test 3: Searching for rules...")
     
-    search_result = main_service.search_rules("Python naming conventions", n_results=5)
+    search_result = await main_service.search_rules("Python naming conventions", n_results=5)
     print(f"Search completed: {search_result['success']}")
     print(f"Found {len(search_result['rules'])} rules")
     
     # Test 4: Get all rules
     print("\n📚 Test 4: Getting all rules...")
     
-    all_rules = main_service.get_all_rules()
+    all_rules = await main_service.get_all_rules()
     print(f"Retrieved {len(all_rules['rules'])} total rules")
     
     print("\n" + "=" * 50)
@@ -2,6 +2,7 @@
 """
 Test enhanced code review with comprehensive evaluation
 """
+import asyncio
 import os
 import sys
 sys.path.append('.')
@@ -37,7 +38,7 @@ if __name__ == "__main__":
     
     try:
         # Review code
-        result = review_service.review_code(test_code, "Python")
+        result = asyncio.run(review_service.review_code(test_code, "Python"))
         
         if result["success"]:
             print("✅ Review completed successfully!")
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Test the adaptive LLM concurrency limiter
+"""
+import asyncio
+import sys
+sys.path.append('.')
+
+from services.llm_limiter import AdaptiveLimiter
+
+
+def make_limiter(limit: int = 1, **kwargs) -> AdaptiveLimiter:
+    return AdaptiveLimiter(initial_limit=limit, min_limit=1, max_limit=4, latency_threshold=10, max_retries=0,
+                           **kwargs)
+
+
+class RateLimited(Exception):
+    status_code = 429
+
+
+def test_cancel_while_queued():
+    print("🧪 Testing cancellation of queued callers...")
+
+    async def scenario():
+        limiter = make_limiter()
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+            return "held"
+
+        holder = asyncio.create_task(limiter.run(hold))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(limiter.run(hold))
+        await asyncio.sleep(0)
+        assert limiter.stats()["queue_depth"] == 1
+
+        # Cancelled after the slot is freed but before the waiter runs: _wake() skips it
+        gate.set()
+        waiter.cancel()
+        assert await holder == "held"
+        try:
+            await waiter
+            raise AssertionError("cancelled waiter completed")
+        except asyncio.CancelledError:
+            pass
+        assert limiter.in_flight == 0 and limiter.stats()["queue_depth"] == 0
+
+        # Cancelled while still queued: the waiter leaves the queue
+        gate.clear()
+        holder = asyncio.create_task(limiter.run(hold))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(limiter.run(hold))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert limiter.stats()["queue_depth"] == 0
+        gate.set()
+        await holder
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+    print("✅ Cancelled callers raise CancelledError and leave no slot or queue entry behind")
+
+
+def test_slot_handoff():
+    print("🧪 Testing slot hand-off in arrival order...")
+
+    async def scenario():
+        limiter = make_limiter()
+        order = []
+
+        async def call(name):
+            order.append(name)
+            await asyncio.sleep(0)
+            return name
+
+        results = await asyncio.gather(*(limiter.run(lambda name=name: call(name)) for name in "abcd"))
+        assert results == list("abcd")
+        assert order == list("abcd")
+        assert limiter.stats()["max_queue_depth"] >= 3
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+    print("✅ Queued callers get freed slots in order")
+
+
+def test_aimd():
+    print("🧪 Testing additive increase and multiplicative decrease...")
+
+    async def scenario():
+        limiter = make_limiter(limit=2, cooldown=60)
+
+        async def ok():
+            return True
+
+        await limiter.run(ok)
+        assert limiter.limit == 2.5
+        await limiter.run(ok)
+        assert limiter.limit == 2.9
+
+        async def rate_limited():
+            raise RateLimited()
+
+        for _ in range(2):
+            try:
+                await limiter.run(rate_limited)
+                raise AssertionError("429 was not raised")
+            except RateLimited:
+                pass
+        # A burst of 429s inside the cooldown halves the limit once
+        assert limiter.limit == 1.45
+        assert limiter.stats()["rate_limited"] == 2
+
+        for _ in range(10):
+            await limiter.run(ok)
+        assert limiter.limit <= limiter.max_limit
+
+    asyncio.run(scenario())
+    print("✅ Successes grow the limit by 1/limit; 429 bursts halve it once per cooldown")
+
+
+if __name__ == "__main__":
+    test_cancel_while_queued()
+    test_slot_handoff()
+    test_aimd()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Test near-duplicate matching of the review similarity cache
+"""
+import re
+import sys
+sys.path.append('.')
+
+from services.similarity_cache import SimilarityCache, normalize_tokens
+
+REVIEW = {"review_results": [{"rule": "Naming", "lineNumber": 27}]}
+
+SPLIT_SECONDS = """
+def split_seconds(total):
+    hours = total // 3600
+    minutes = total % 3600 // 60
+    return hours, minutes
+"""
+
+def test_similarity_cache():
+    print("🧪 Testing similarity cache...")
+
+    with open("good_code_example.py") as f:
+        source = f.read()
+
+    cache = SimilarityCache(threshold=0.9)
+    cache.add("good_code_example", source, "python-scope", REVIEW, "Python")
+
+    # The same file with a renamed local variable or parameter reuses the cached review
+    for old, new in (("self", "this"), ("user_data", "payload"), ("response", "resp")):
+        renamed = re.sub(rf"\b{old}\b", new, source)
+        match = cache.lookup(renamed, "python-scope", "Python")
+        assert match is not None, f"renaming {old} to {new} missed the cache"
+        print(f"✅ {old} -> {new}: similarity {match['similarity']}")
+
+    # Floor division is not a comment: different operands must not match
+    cache.add("split_seconds", SPLIT_SECONDS, "python-scope", REVIEW, "Python")
+    changed = SPLIT_SECONDS.replace("// 3600", "// 86400").replace("// 60", "// 24")
+    assert cache.lookup(changed, "python-scope", "Python") is None, "floor division operands were ignored"
+    print("✅ Different floor division operands do not match")
+
+    # Code calling a different API is not a near duplicate, whatever its variables are called
+    for old, new in (("json.loads", "pickle.loads"), ("hashlib.md5", "hashlib.sha256")):
+        call = f"def fingerprint(data):\n    payload = {old}(data)\n    return payload\n"
+        cache.add(old, call, "python-scope", REVIEW, "Python")
+        assert cache.lookup(call.replace(old, new), "python-scope", "Python") is None, f"{new} matched {old}"
+        print(f"✅ {new} does not match {old}")
+
+    # Comment markers inside strings and C preprocessor lines are kept
+    assert normalize_tokens('url = "http://x.com"  # home', "Python") == ["ID", "=", '"http://x.com"']
+    assert normalize_tokens("#include <stdio.h>", "C")[0] == "#"
+    assert normalize_tokens("x = a // b", "Python") == ["ID", "=", "a", "/", "/", "b"]
+    print("✅ Comments are stripped per language, after strings")
+
+    # Only local names are normalized; callees, attributes and keyword arguments are kept
+    assert normalize_tokens("def f(items):\n    return sorted(items, key=len)", "Python") == [
+        "def", "f", "(", "ID", ")", ":", "return", "sorted", "(", "ID", ",", "key", "=", "len", ")"
+    ]
+    print("✅ Callees and keyword arguments stay verbatim")
+
+if __name__ == "__main__":
+    test_similarity_cache()